@@ -0,0 +1,79 @@
+"""/leaderboard latency: indexed top-k vs the old full scan and sort
+
+    python -m benchmarks.leaderboard [10000,100000,1000000]
+
+"indexed" is Database.get_leaderboard with the utils.leaderboard indexes,
+"scan" the previous implementation (list every player, sort, slice).
+"settle" is the cost of one settle_bet including the index updates and
+"rank" one get_rank (position plus the players around it).
+"""
+import asyncio
+import gc
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("DISCORD_TOKEN", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.player_memory import make_players
+from utils.manager import Database
+
+def scan_leaderboard(players, metric, limit):
+    """get_leaderboard before the indexes"""
+    players_list = []
+    for user_id, data in players.items():
+        if metric in data:
+            players_list.append({
+                "user_id": int(user_id),
+                "value": data[metric],
+                "balance": data.get("balance", 0),
+                "games_played": data.get("games_played", 0)
+            })
+    players_list.sort(key=lambda x: x["value"], reverse=True)
+    return players_list[:limit]
+
+async def per_call(func, calls):
+    gc.collect()
+    started = time.perf_counter()
+    for i in range(calls):
+        await func(i)
+    return (time.perf_counter() - started) / calls
+
+async def run(count):
+    db = Database.in_memory(make_players(count))
+    ids = [int(key) for key in db._players_cache]
+    rng = random.Random(2)
+    
+    async def indexed(i):
+        await db.get_leaderboard("balance", limit=10)
+    
+    async def scan(i):
+        scan_leaderboard(db._players_cache, "balance", 10)
+    
+    async def rank(i):
+        await db.get_rank(rng.choice(ids), "balance", span=2)
+    
+    async def settle(i):
+        await db.settle_bet(rng.choice(ids), 10, rng.choice((0, 20)))
+    
+    assert await db.get_leaderboard("balance", 10) == scan_leaderboard(db._players_cache, "balance", 10)
+    indexed_seconds = await per_call(indexed, 2000)
+    scan_seconds = await per_call(scan, max(3, 200_000 // count))
+    settle_seconds = await per_call(settle, 20000)
+    rank_seconds = await per_call(rank, 20000)
+    print(
+        f"{count:>9,} {indexed_seconds * 1e6:>12.1f} {scan_seconds * 1e6:>14.1f} "
+        f"{settle_seconds * 1e6:>11.1f} {rank_seconds * 1e6:>9.1f}",
+        flush=True
+    )
+
+def main(sizes):
+    print(f"{'players':>9} {'indexed us':>12} {'scan us':>14} {'settle us':>11} {'rank us':>9}")
+    for count in sizes:
+        asyncio.run(run(count))
+
+if __name__ == "__main__":
+    sizes = [int(size) for size in sys.argv[1].split(",")] if len(sys.argv) > 1 else [10_000, 100_000, 1_000_000]
+    main(sizes)
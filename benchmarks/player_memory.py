@@ -0,0 +1,62 @@
+"""Bytes per player: plain dicts (as loaded from players.json) vs PlayerRecord
+
+    python -m benchmarks.player_memory [players]
+"""
+import json
+import os
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DISCORD_TOKEN", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.manager import default_player
+from utils.records import PlayerRecord
+
+def make_players(count: int) -> dict:
+    """Player dicts with a realistic mix of active and idle players"""
+    rng = random.Random(1)
+    now = datetime.now()
+    players = {}
+    for i in range(count):
+        player = default_player()
+        player["balance"] = rng.randint(0, 10 ** 7)
+        player["total_won"] = rng.randint(0, 10 ** 7)
+        player["total_lost"] = rng.randint(0, 10 ** 7)
+        player["games_played"] = rng.randint(0, 5000)
+        if i % 2:
+            for field in ("last_daily", "last_weekly", "last_work"):
+                player[field] = (now - timedelta(seconds=rng.randint(0, 10 ** 6))).isoformat()
+        if i % 10 == 0:
+            player["boosts"] = {"lucky_charm": {"expires": now.isoformat(), "multiplier": 1.5}}
+        players[str(10 ** 17 + i)] = player
+    return players
+
+def make_snapshot(count: int) -> str:
+    """players.json text for ``make_players(count)``"""
+    return json.dumps(make_players(count), separators=(",", ":"))
+
+def measure(build) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    data = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del data
+    return after - before
+
+def main(count: int):
+    text = make_snapshot(count)
+    # Only the values are measured: the key strings are the same in both layouts
+    dict_bytes = measure(lambda: list(json.loads(text).values()))
+    record_bytes = measure(lambda: [PlayerRecord.from_dict(data) for data in json.loads(text).values()])
+    
+    print(f"{count:,} players")
+    print(f"dict:         {dict_bytes / count:7.1f} bytes/player")
+    print(f"PlayerRecord: {record_bytes / count:7.1f} bytes/player")
+    print(f"saved:        {100 * (1 - record_bytes / dict_bytes):6.1f}%")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
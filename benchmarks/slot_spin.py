@@ -0,0 +1,99 @@
+"""One /slots spin: the old per-call path vs the precompiled SlotMachine
+
+    python -m benchmarks.slot_spin [spins]
+
+"old" is what /slots used to do per spin: three ``random.choices`` calls
+that rebuild the symbol and weight lists each time, then a payout from a
+per-spin count dict. "new" is ``SlotMachine.spin()`` (three alias-table
+draws) plus ``SlotMachine.payout()`` (one table lookup). Before timing,
+checks that both give the same payout and winning lines for every outcome
+at several bets, and that the alias table's reel frequencies match
+``SLOT_WEIGHTS``.
+"""
+import os
+import random
+import sys
+import time
+from itertools import product
+
+os.environ.setdefault("DISCORD_TOKEN", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import SLOT_SYMBOLS, SLOT_WEIGHTS
+from utils.slots import SlotMachine
+
+def old_symbol():
+    """How /slots drew one reel symbol before the SlotMachine"""
+    symbols = list(SLOT_SYMBOLS.keys())
+    weights = [SLOT_WEIGHTS[symbol] for symbol in symbols]
+    return random.choices(symbols, weights=weights)[0]
+
+def old_payout(symbols, bet_amount):
+    """How /slots scored a spin before the SlotMachine"""
+    symbol_counts = {}
+    for symbol in symbols:
+        symbol_counts[symbol] = symbol_counts.get(symbol, 0) + 1
+    
+    total_payout = 0
+    winning_lines = []
+    for symbol, count in symbol_counts.items():
+        if count >= 2 and symbol in SLOT_SYMBOLS:
+            payouts = SLOT_SYMBOLS[symbol]["payouts"]
+            if count in payouts:
+                multiplier = payouts[count]
+                payout = int(bet_amount * multiplier)
+                total_payout += payout
+                winning_lines.append({
+                    "symbol": symbol,
+                    "count": count,
+                    "multiplier": multiplier,
+                    "payout": payout
+                })
+    return total_payout, winning_lines
+
+def old_spin(bet_amount):
+    symbols = [old_symbol(), old_symbol(), old_symbol()]
+    return old_payout(symbols, bet_amount)
+
+def check(machine):
+    """Same results as the old path for every outcome, and the configured reel odds"""
+    for bet in (1, 7, 10, 99, 1000, 12345):
+        for reels in product(range(len(machine.names)), repeat=3):
+            symbols = [machine.names[i] for i in reels]
+            assert machine.payout(reels, bet) == old_payout(symbols, bet), (symbols, bet)
+    
+    draws = 2_000_000
+    counts = [0] * len(machine.names)
+    for _ in range(draws):
+        counts[machine.reel.draw()] += 1
+    total = sum(SLOT_WEIGHTS.values())
+    for name, count in zip(machine.names, counts):
+        expected = SLOT_WEIGHTS[name] / total
+        assert abs(count / draws - expected) < 0.002, (name, count / draws, expected)
+
+def timed(label, spin, spins):
+    started = time.perf_counter()
+    for _ in range(spins):
+        spin()
+    elapsed = time.perf_counter() - started
+    print(f"{label:>5} {elapsed / spins * 1e9:>10,.0f}")
+    return elapsed
+
+def main(spins):
+    started = time.perf_counter()
+    machine = SlotMachine()
+    print(f"compiled in {(time.perf_counter() - started) * 1e3:.2f} ms ({len(machine.lines)} outcomes)")
+    check(machine)
+    print("payouts match for every outcome, reel frequencies match SLOT_WEIGHTS\n")
+    
+    bet = 100
+    def new_spin():
+        return machine.payout(machine.spin(), bet)
+    
+    print(f"{'path':>5} {'ns/spin':>10}")
+    old = timed("old", lambda: old_spin(bet), spins)
+    new = timed("new", new_spin, spins)
+    print(f"\n{old / new:.1f}x faster")
+
+if __name__ == "__main__":
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,86 @@
+"""Players snapshot formats: load time, save time and file size
+
+    python -m benchmarks.snapshot_formats [10000,100000,1000000] [--memory]
+
+"json (indent=2)" is the original pretty-printed file, "json" the compact
+file the store writes today and "binary" utils.binary_snapshot. Load times
+include building the PlayerRecord objects the store keeps in memory.
+--memory also reports peak traced memory while loading (slower).
+"""
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("DISCORD_TOKEN", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.player_memory import make_players
+from utils.binary_snapshot import BinarySnapshot
+from utils.records import PlayerRecord
+from utils.snapshots import SnapshotWriter
+
+def save_pretty(path, players):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({key: dict(record) for key, record in players.items()}, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+
+def load_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return {key: PlayerRecord.from_dict(data) for key, data in json.load(f).items()}
+
+def load_binary(path):
+    with open(path, "rb") as f:
+        return BinarySnapshot.load(f)
+
+def timed(func, *args):
+    gc.collect()
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+def peak(func, *args):
+    gc.collect()
+    tracemalloc.start()
+    result = func(*args)
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return peak_bytes
+
+def main(sizes, memory):
+    writer = SnapshotWriter(generations=1)
+    directory = tempfile.mkdtemp(prefix="snapshot-bench-")
+    formats = [
+        ("json (indent=2)", "players.pretty.json", save_pretty, load_json),
+        ("json", "players.json", lambda path, players: writer.write(path, players), load_json),
+        ("binary", "players.bin", lambda path, players: writer.write(path, players, codec=BinarySnapshot), load_binary),
+    ]
+    
+    header = f"{'players':>9} {'format':<16} {'save s':>8} {'load s':>8} {'size MB':>9}"
+    if memory:
+        header += f" {'load peak MB':>13}"
+    print(header)
+    for count in sizes:
+        players = {key: PlayerRecord.from_dict(data) for key, data in make_players(count).items()}
+        for name, filename, save, load in formats:
+            path = os.path.join(directory, filename)
+            save_seconds, _ = timed(save, path, players)
+            load_seconds, loaded = timed(load, path)
+            assert len(loaded) == count
+            del loaded
+            line = f"{count:>9,} {name:<16} {save_seconds:>8.2f} {load_seconds:>8.2f} {os.path.getsize(path) / 1e6:>9.1f}"
+            if memory:
+                line += f" {peak(load, path) / 1e6:>13.1f}"
+            print(line, flush=True)
+            os.remove(path)
+    os.rmdir(directory)
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    sizes = [int(size) for size in args[0].split(",")] if args else [10_000, 100_000, 1_000_000]
+    main(sizes, "--memory" in sys.argv)
@@ -0,0 +1,91 @@
+"""/send under concurrency: store-level transfer() vs the old three-step send
+
+    python -m benchmarks.transfers [transfers] [players]
+
+Runs ``transfers`` concurrent random transfers between ``players`` players
+(few players, small balances: most transfers contend and many overdraw) on
+the JSON and SQLite stores. "old" is what /send used to do (check the
+balance, subtract_balance ignoring its result, add_balance), "transfer" is
+the store's atomic transfer(). Reports the time per transfer, how much money
+appeared or vanished and how many balances went negative; transfer() must
+conserve the total exactly.
+
+The old path only loses the race when a store call yields between the check
+and the debit: always on SQLite (every call waits for the database thread),
+on the JSON store only while a player is still loading or a stripe is busy.
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DISCORD_TOKEN", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.manager import Database
+from utils.sqlite_store import SQLiteDatabase
+
+START_BALANCE = 100
+
+async def old_send(db, sender_id, recipient_id, amount):
+    """/send before transfer(): three separate store calls"""
+    sender = await db.peek_player(sender_id)
+    if amount > sender["balance"]:
+        return
+    await db.subtract_balance(sender_id, amount)
+    await db.add_balance(recipient_id, amount)
+
+async def new_send(db, sender_id, recipient_id, amount):
+    await db.transfer(sender_id, recipient_id, amount)
+
+async def open_store(backend, directory):
+    if backend == "sqlite":
+        db = SQLiteDatabase(os.path.join(directory, "transfers.db"))
+        await db.start()
+        return db
+    
+    return Database.in_memory()
+
+async def run(backend, mode, transfers, players):
+    with tempfile.TemporaryDirectory() as directory:
+        db = await open_store(backend, directory)
+        ids = list(range(1, players + 1))
+        for user_id in ids:
+            await db.update_player(user_id, {"balance": START_BALANCE})
+        
+        rng = random.Random(4)
+        moves = []
+        for _ in range(transfers):
+            sender_id, recipient_id = rng.sample(ids, 2)
+            moves.append((sender_id, recipient_id, rng.randint(1, START_BALANCE)))
+        send = old_send if mode == "old" else new_send
+        
+        started = time.perf_counter()
+        await asyncio.gather(*[send(db, *move) for move in moves])
+        elapsed = time.perf_counter() - started
+        
+        balances = [(await db.peek_player(user_id))["balance"] for user_id in ids]
+        drift = sum(balances) - START_BALANCE * players
+        negative = sum(1 for balance in balances if balance < 0)
+        if backend == "sqlite":
+            await db.close()
+    
+    print(
+        f"{backend:>7} {mode:>9} {elapsed / transfers * 1e6:>12.1f} {drift:>+10,} {negative:>9}",
+        flush=True
+    )
+    if mode == "transfer":
+        assert drift == 0 and negative == 0, f"{backend} transfer() did not conserve money"
+
+async def main(transfers, players):
+    print(f"{'store':>7} {'mode':>9} {'us/transfer':>12} {'drift':>10} {'negative':>9}")
+    for backend in ("json", "sqlite"):
+        for mode in ("old", "transfer"):
+            await run(backend, mode, transfers, players)
+
+if __name__ == "__main__":
+    transfers = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    players = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    asyncio.run(main(transfers, players))
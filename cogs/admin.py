@@ -1,23 +1,22 @@
 import discord
+import time
 from discord.ext import commands
 from discord import app_commands
-from utils.manager import Database
+from config import LEDGER_QUERY_LIMIT
 from utils.currency import CurrencyUtils
 from typing import Optional
 
 class Admin(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = bot.db
     
     async def is_admin(self, interaction: discord.Interaction) -> bool:
         """Check if user is bot admin or has manage server permission"""
         if interaction.user.guild_permissions.manage_guild:
             return True
         
-        guild_data = await self.db.get_guild(interaction.guild.id)
-        admin_ids = guild_data.get("admin_ids", [])
-        return interaction.user.id in admin_ids
+        return await self.db.is_guild_admin(interaction.guild.id, interaction.user.id)
     
     @app_commands.command(name="config", description="Configure bot settings for this server")
     async def config(self, interaction: discord.Interaction):
@@ -59,9 +58,12 @@ class Admin(commands.Cog):
         admin_ids = guild_data.get("admin_ids", [])
         admin_info = ""
         for admin_id in admin_ids:
-            member = interaction.guild.get_member(admin_id)
-            if member:
-                admin_info += f"• {member.display_name}\n"
+            known, display_name = self.bot.names.lookup(admin_id, interaction.guild)
+            if not known:
+                # Mentions render without the member being cached
+                admin_info += f"• <@{admin_id}>\n"
+            elif display_name:
+                admin_info += f"• {display_name}\n"
         
         if not admin_info:
             admin_info = "No additional admins configured"
@@ -158,8 +160,8 @@ class Admin(commands.Cog):
             await interaction.response.send_message(f"❌ {user.display_name} is already a bot admin!", ephemeral=True)
             return
         
-        admin_ids.append(user.id)
-        await self.db.update_guild(interaction.guild.id, {"admin_ids": admin_ids})
+        # The stored config is shared: build a new list instead of changing it in place
+        await self.db.update_guild(interaction.guild.id, {"admin_ids": admin_ids + [user.id]})
         
         embed = discord.Embed(
             title="✅ Admin Added",
@@ -184,7 +186,7 @@ class Admin(commands.Cog):
             await interaction.response.send_message(f"❌ {user.display_name} is not a bot admin!", ephemeral=True)
             return
         
-        admin_ids.remove(user.id)
+        admin_ids = [admin_id for admin_id in admin_ids if admin_id != user.id]
         await self.db.update_guild(interaction.guild.id, {"admin_ids": admin_ids})
         
         embed = discord.Embed(
@@ -213,7 +215,7 @@ class Admin(commands.Cog):
             return
         
         # Give money
-        new_balance = await self.db.add_balance(user.id, give_amount)
+        new_balance = await self.db.add_balance(user.id, give_amount, "give-money", interaction_id=interaction.id)
         
         embed = discord.Embed(
             title="💰 Money Given",
@@ -243,9 +245,9 @@ class Admin(commands.Cog):
             return
         
         # Take money
-        player = await self.db.get_player(user.id)
+        player = await self.db.peek_player(user.id)
         actual_taken = min(take_amount, player["balance"])
-        new_balance = await self.db.add_balance(user.id, -actual_taken)
+        new_balance = await self.db.add_balance(user.id, -actual_taken, "take-money", interaction_id=interaction.id)
         
         embed = discord.Embed(
             title="💸 Money Taken",
@@ -268,25 +270,8 @@ class Admin(commands.Cog):
             await interaction.response.send_message("❌ You need Manage Server permissions or be a bot admin!", ephemeral=True)
             return
         
-        # Reset user data
-        await self.db.update_player(user.id, {
-            "balance": 1000,  # Starting balance
-            "crypto": 0,
-            "total_won": 0,
-            "total_lost": 0,
-            "games_played": 0,
-            "last_daily": None,
-            "last_weekly": None,
-            "last_monthly": None,
-            "last_yearly": None,
-            "last_work": None,
-            "last_overtime": None,
-            "last_spin": None,
-            "last_vote": None,
-            "vote_count": 0,
-            "boosts": {},
-            "achievements": []
-        })
+        # Reset user data (the store records the balance change in the ledger)
+        await self.db.reset_player(user.id, "reset-user", interaction_id=interaction.id)
         
         embed = discord.Embed(
             title="🔄 User Data Reset",
@@ -296,6 +281,129 @@ class Admin(commands.Cog):
         
         await interaction.response.send_message(embed=embed)
     
+    @app_commands.command(name="ledger", description="Audit recent balance changes (Admin only)")
+    @app_commands.describe(
+        user="Only show this user's changes",
+        hours="How far back to look (default: everything)"
+    )
+    async def ledger(self, interaction: discord.Interaction, user: Optional[discord.Member] = None,
+                     hours: Optional[app_commands.Range[float, 0]] = None):
+        """List the newest ledger entries for a user and/or time range"""
+        if not await self.is_admin(interaction):
+            await interaction.response.send_message("❌ You need Manage Server permissions or be a bot admin!", ephemeral=True)
+            return
+        
+        since = time.time() - hours * 3600 if hours is not None else None
+        entries = await self.bot.ledger.history(
+            user_id=user.id if user is not None else None,
+            since=since,
+            limit=LEDGER_QUERY_LIMIT
+        )
+        
+        title = f"📒 Ledger - {user.display_name}" if user is not None else "📒 Ledger"
+        embed = discord.Embed(title=title, color=discord.Color.blue())
+        if hours is not None:
+            embed.description = f"Last {hours:g} hour(s)"
+        
+        if not entries:
+            embed.add_field(name="Entries", value="No balance changes found", inline=False)
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+        
+        lines = []
+        for entry in entries:
+            sign = "+" if entry["delta"] > 0 else "-"
+            line = f"<t:{int(entry['ts'])}:f> "
+            if user is None:
+                line += f"<@{entry['user_id']}> "
+            line += f"**{sign}{CurrencyUtils.format_amount(abs(entry['delta']))}** {entry['reason']}"
+            if entry["game"]:
+                line += f" ({entry['game']})"
+            if entry["interaction_id"]:
+                line += f" `#{entry['interaction_id']}`"
+            lines.append(line)
+        
+        # Stay under the embed field limit
+        text = ""
+        for line in lines:
+            if len(text) + len(line) + 1 > 1024:
+                break
+            text += line + "\n"
+        embed.add_field(name=f"Newest {len(entries)} Entries", value=text, inline=False)
+        
+        if user is not None:
+            net = sum(entry["delta"] for entry in entries)
+            sign = "+" if net >= 0 else "-"
+            embed.add_field(name="Net Change (shown)", value=f"{sign}{CurrencyUtils.format_amount(abs(net))}", inline=True)
+        
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+    
+    @app_commands.command(name="db-stats", description="Show store lock and cache stats (Admin only)")
+    async def db_stats(self, interaction: discord.Interaction):
+        """Display per-stripe lock wait times for the player store and cache hit rates"""
+        if not await self.is_admin(interaction):
+            await interaction.response.send_message("❌ You need Manage Server permissions or be a bot admin!", ephemeral=True)
+            return
+        
+        lock_stats = getattr(self.db, "lock_stats", None)
+        stripes = lock_stats() if lock_stats else []
+        
+        embed = discord.Embed(
+            title="📊 Store Lock Stats",
+            color=discord.Color.blue()
+        )
+        
+        for name, cache in (("Leaderboard Cache", self.bot.leaderboard_cache.stats()), ("Name Cache", self.bot.names.stats())):
+            lookups = cache["hits"] + cache["misses"]
+            hit_rate = f"{100 * cache['hits'] / lookups:.1f}%" if lookups else "n/a"
+            value = (
+                f"{cache['hits']:,} hits / {cache['misses']:,} misses ({hit_rate}), "
+                f"{cache['size']:,}/{cache['maxsize']:,} entries\n"
+                f"{cache['stale']:,} changed, {cache['expired']:,} expired, {cache['evicted']:,} evicted"
+            )
+            if "pending" in cache:
+                value += f", {cache['pending']:,} being fetched"
+            embed.add_field(name=name, value=value, inline=False)
+        
+        idempotency_stats = getattr(self.db, "idempotency_stats", None)
+        if idempotency_stats:
+            idempotency = idempotency_stats()
+            embed.add_field(
+                name="Repeated Interactions",
+                value=f"{idempotency['replayed']:,} answered from {idempotency['size']:,}/{idempotency['maxsize']:,} stored results",
+                inline=False
+            )
+        
+        ledger = self.bot.ledger.stats()
+        embed.add_field(
+            name="Ledger",
+            value=f"{ledger['recorded']:,} recorded, {ledger['written']:,} written, {ledger['pending']:,} buffered",
+            inline=False
+        )
+        
+        if not stripes:
+            embed.description = "No lock statistics available for this storage backend."
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+        
+        acquired = sum(stripe["acquired"] for stripe in stripes)
+        contended = sum(stripe["contended"] for stripe in stripes)
+        wait_total = sum(stripe["wait_total"] for stripe in stripes)
+        embed.add_field(name="Acquisitions", value=f"{acquired:,}", inline=True)
+        embed.add_field(name="Contended", value=f"{contended:,}", inline=True)
+        embed.add_field(name="Total Wait", value=f"{wait_total * 1000:.1f} ms", inline=True)
+        
+        hottest = sorted(stripes, key=lambda stripe: stripe["wait_total"], reverse=True)[:5]
+        hot_text = ""
+        for stripe in hottest:
+            hot_text += (
+                f"**#{stripe['stripe']}** - {stripe['contended']:,}/{stripe['acquired']:,} waited, "
+                f"total {stripe['wait_total'] * 1000:.1f} ms, max {stripe['wait_max'] * 1000:.1f} ms\n"
+            )
+        embed.add_field(name="Hottest Stripes", value=hot_text, inline=False)
+        
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+    
     @app_commands.command(name="help", description="Show available commands")
     async def help(self, interaction: discord.Interaction):
         """Display help information"""
@@ -322,7 +430,8 @@ class Admin(commands.Cog):
             "`/monthly` - Claim monthly reward",
             "`/vote` - Claim vote reward",
             "`/send <user> <amount>` - Send money",
-            "`/leaderboard [metric]` - View leaderboards"
+            "`/leaderboard [metric]` - View leaderboards",
+            "`/rank [metric] [global_board] [user]` - See a leaderboard position"
         ]
         embed.add_field(name="👤 Player", value="\n".join(player_commands), inline=False)
         
@@ -336,7 +445,9 @@ class Admin(commands.Cog):
                 "`/admin-remove <user>` - Remove bot admin",
                 "`/give-money <user> <amount>` - Give money",
                 "`/take-money <user> <amount>` - Take money",
-                "`/reset-user <user>` - Reset user data"
+                "`/reset-user <user>` - Reset user data",
+                "`/ledger [user] [hours]` - Audit balance changes",
+                "`/db-stats` - Show store lock and cache stats"
             ]
             embed.add_field(name="⚙️ Admin", value="\n".join(admin_commands), inline=False)
         
@@ -3,7 +3,6 @@ from discord.ext import commands
 from discord import app_commands
 from datetime import datetime, timedelta
 import random
-from utils.manager import Database
 from utils.currency import CurrencyUtils
 from utils.cooldowns import CooldownManager
 from config import DAILY_REWARD
@@ -11,7 +10,7 @@ from config import DAILY_REWARD
 class Economy(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = bot.db
         
         # Shop items configuration
         self.shop_items = {
@@ -129,7 +128,7 @@ class Economy(commands.Cog):
             return
         
         item = self.shop_items[item_id]
-        player = await self.db.get_player(user_id)
+        player = await self.db.peek_player(user_id)
         
         # Check if user can afford item
         if player["balance"] < item["price"]:
@@ -140,12 +139,14 @@ class Economy(commands.Cog):
             )
             return
         
-        # Process purchase
-        await self.db.subtract_balance(user_id, item["price"])
+        # Process purchase (the debit re-checks the balance atomically)
+        if not await self.db.subtract_balance(user_id, item["price"], "buy", game=item_id, interaction_id=interaction.id):
+            await interaction.response.send_message("❌ Insufficient funds!", ephemeral=True)
+            return
         
         if item["type"] == "boost":
             # Add boost to player's active boosts
-            current_boosts = player.get("boosts", {})
+            current_boosts = dict(player.get("boosts", {}))
             expiry_time = (datetime.now() + timedelta(seconds=item["duration"])).isoformat()
             current_boosts[item_id] = {
                 "name": item["name"],
@@ -156,9 +157,10 @@ class Economy(commands.Cog):
             
         elif item["type"] == "consumable":
             if item_id == "loot_box":
-                # Open loot box immediately
-                reward = random.randint(10000, 1000000)
-                await self.db.add_balance(user_id, reward)
+                # Open loot box immediately; the roll is seeded by the interaction so a
+                # retried interaction shows the reward that was actually credited
+                reward = random.Random(interaction.id).randint(10000, 1000000)
+                new_balance = await self.db.add_balance(user_id, reward, "loot-box", interaction_id=interaction.id)
                 
                 embed = discord.Embed(
                     title="📦 Loot Box Opened!",
@@ -168,9 +170,7 @@ class Economy(commands.Cog):
                 embed.add_field(name="Item Purchased", value=f"{item['emoji']} {item['name']}", inline=True)
                 embed.add_field(name="Cost", value=CurrencyUtils.format_amount(item["price"]), inline=True)
                 embed.add_field(name="Reward", value=CurrencyUtils.format_amount(reward), inline=True)
-                
-                updated_player = await self.db.get_player(user_id)
-                embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(updated_player["balance"]), inline=False)
+                embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(new_balance), inline=False)
                 
                 await interaction.response.send_message(embed=embed)
                 return
@@ -189,7 +189,7 @@ class Economy(commands.Cog):
             embed.add_field(name="Duration", value=f"{item['duration'] // 60} minutes", inline=True)
             embed.add_field(name="Tip", value="Use `/boosts` to see your active boosts!", inline=False)
         
-        updated_player = await self.db.get_player(user_id)
+        updated_player = await self.db.peek_player(user_id)
         embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(updated_player["balance"]), inline=False)
         
         await interaction.response.send_message(embed=embed)
@@ -198,7 +198,7 @@ class Economy(commands.Cog):
     async def boosts(self, interaction: discord.Interaction):
         """Display user's active boosts"""
         user_id = interaction.user.id
-        player = await self.db.get_player(user_id)
+        player = await self.db.peek_player(user_id)
         
         current_boosts = player.get("boosts", {})
         active_boosts = {}
@@ -243,7 +243,7 @@ class Economy(commands.Cog):
     async def work(self, interaction: discord.Interaction):
         """Work for money with cooldown"""
         user_id = interaction.user.id
-        player = await self.db.get_player(user_id)
+        player = await self.db.peek_player(user_id)
         
         # Check cooldown
         can_work, error_msg = CooldownManager.check_cooldown(player.get("last_work"), "work")
@@ -276,7 +276,7 @@ class Economy(commands.Cog):
             boost_text = ""
         
         # Add money and update cooldown
-        await self.db.add_balance(user_id, final_pay)
+        await self.db.add_balance(user_id, final_pay, "work", interaction_id=interaction.id)
         await self.db.update_player(user_id, {
             "last_work": CooldownManager.set_cooldown_used("work")
         })
@@ -295,7 +295,7 @@ class Economy(commands.Cog):
             embed.add_field(name="Earned", value=CurrencyUtils.format_amount(final_pay), inline=True)
         
         # Show new balance
-        updated_player = await self.db.get_player(user_id)
+        updated_player = await self.db.peek_player(user_id)
         embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(updated_player["balance"]), inline=False)
         embed.add_field(name="Next Work", value="<t:{}:R>".format(int((datetime.now().timestamp() + 3600))), inline=True)
         
@@ -305,7 +305,7 @@ class Economy(commands.Cog):
     async def overtime(self, interaction: discord.Interaction):
         """Work overtime for higher pay but longer cooldown"""
         user_id = interaction.user.id
-        player = await self.db.get_player(user_id)
+        player = await self.db.peek_player(user_id)
         
         # Check cooldown
         can_work, error_msg = CooldownManager.check_cooldown(player.get("last_overtime"), "overtime")
@@ -346,7 +346,7 @@ class Economy(commands.Cog):
             boost_text = ""
         
         # Add money and update cooldown
-        await self.db.add_balance(user_id, final_pay)
+        await self.db.add_balance(user_id, final_pay, "overtime", interaction_id=interaction.id)
         await self.db.update_player(user_id, {
             "last_overtime": CooldownManager.set_cooldown_used("overtime")
         })
@@ -365,7 +365,7 @@ class Economy(commands.Cog):
             embed.add_field(name="Earned", value=CurrencyUtils.format_amount(final_pay), inline=True)
         
         # Show new balance
-        updated_player = await self.db.get_player(user_id)
+        updated_player = await self.db.peek_player(user_id)
         embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(updated_player["balance"]), inline=False)
         embed.add_field(name="Next Overtime", value="<t:{}:R>".format(int((datetime.now().timestamp() + 7200))), inline=True)
         
@@ -3,15 +3,17 @@ from discord.ext import commands
 from discord import app_commands
 import random
 import asyncio
-from utils.manager import Database
 from utils.currency import CurrencyUtils
 from utils.cooldowns import CooldownManager
-from config import MIN_BET, MAX_BET, HOUSE_EDGE, SLOT_SYMBOLS, SLOT_WEIGHTS
+from utils.slots import SlotMachine
+from config import MIN_BET, MAX_BET, HOUSE_EDGE, SLOT_SYMBOLS, SLOT_WEIGHTS, SLOTS_MAX_SPINS
 
 class Games(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = bot.db
+        # Slot config compiled once: alias-table reels and a payout table per outcome
+        self.slot_machine = SlotMachine(SLOT_SYMBOLS, SLOT_WEIGHTS)
     
     @app_commands.command(name="coinflip", description="Flip a coin and bet on the outcome")
     @app_commands.describe(
@@ -33,7 +35,7 @@ class Games(commands.Cog):
             return
         
         # Get player data
-        player = await self.db.get_player(user_id)
+        player = await self.db.peek_player(user_id)
         
         # Handle "all" bet
         if bet_amount == -1:
@@ -45,12 +47,6 @@ class Games(commands.Cog):
             await interaction.response.send_message(f"❌ {error_msg}", ephemeral=True)
             return
         
-        # Subtract bet from balance
-        success = await self.db.subtract_balance(user_id, bet_amount)
-        if not success:
-            await interaction.response.send_message("❌ Insufficient funds!", ephemeral=True)
-            return
-        
         # Flip the coin
         result = random.choice(["heads", "tails"])
         won = prediction.lower() == result
@@ -58,18 +54,16 @@ class Games(commands.Cog):
         # Calculate winnings (2x payout minus house edge)
         if won:
             payout = int(bet_amount * (2 - HOUSE_EDGE))
-            await self.db.add_balance(user_id, payout)
             profit = payout - bet_amount
         else:
             payout = 0
             profit = -bet_amount
         
-        # Update stats
-        await self.db.update_player(user_id, {
-            "games_played": player["games_played"] + 1,
-            "total_won": player["total_won"] + (profit if profit > 0 else 0),
-            "total_lost": player["total_lost"] + (abs(profit) if profit < 0 else 0)
-        })
+        # Debit the bet, credit the payout and update stats in one step
+        new_balance = await self.db.settle_bet(user_id, bet_amount, payout, game="coinflip", interaction_id=interaction.id)
+        if new_balance is None:
+            await interaction.response.send_message("❌ Insufficient funds!", ephemeral=True)
+            return
         
         # Create response embed
         embed = discord.Embed(
@@ -89,9 +83,8 @@ class Games(commands.Cog):
         else:
             embed.add_field(name="Lost", value=f"-{CurrencyUtils.format_amount(bet_amount)}", inline=True)
         
-        # Get updated balance
-        updated_player = await self.db.get_player(user_id)
-        embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(updated_player["balance"]), inline=False)
+        # Show new balance
+        embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(new_balance), inline=False)
         
         await interaction.response.send_message(embed=embed)
     
@@ -122,7 +115,7 @@ class Games(commands.Cog):
             return
         
         # Get player data
-        player = await self.db.get_player(user_id)
+        player = await self.db.peek_player(user_id)
         
         # Handle "all" bet
         if bet_amount == -1:
@@ -134,12 +127,6 @@ class Games(commands.Cog):
             await interaction.response.send_message(f"❌ {error_msg}", ephemeral=True)
             return
         
-        # Subtract bet from balance
-        success = await self.db.subtract_balance(user_id, bet_amount)
-        if not success:
-            await interaction.response.send_message("❌ Insufficient funds!", ephemeral=True)
-            return
-        
         # Roll the dice
         result = random.randint(1, dice_type)
         won = prediction == result
@@ -148,18 +135,16 @@ class Games(commands.Cog):
         if won:
             multiplier = dice_type * (1 - HOUSE_EDGE)
             payout = int(bet_amount * multiplier)
-            await self.db.add_balance(user_id, payout)
             profit = payout - bet_amount
         else:
             payout = 0
             profit = -bet_amount
         
-        # Update stats
-        await self.db.update_player(user_id, {
-            "games_played": player["games_played"] + 1,
-            "total_won": player["total_won"] + (profit if profit > 0 else 0),
-            "total_lost": player["total_lost"] + (abs(profit) if profit < 0 else 0)
-        })
+        # Debit the bet, credit the payout and update stats in one step
+        new_balance = await self.db.settle_bet(user_id, bet_amount, payout, game="roll", interaction_id=interaction.id)
+        if new_balance is None:
+            await interaction.response.send_message("❌ Insufficient funds!", ephemeral=True)
+            return
         
         # Create response embed
         embed = discord.Embed(
@@ -178,9 +163,8 @@ class Games(commands.Cog):
         else:
             embed.add_field(name="Lost", value=f"-{CurrencyUtils.format_amount(bet_amount)}", inline=True)
         
-        # Get updated balance
-        updated_player = await self.db.get_player(user_id)
-        embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(updated_player["balance"]), inline=False)
+        # Show new balance
+        embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(new_balance), inline=False)
         
         await interaction.response.send_message(embed=embed)
     
@@ -220,7 +204,7 @@ class Games(commands.Cog):
             return
         
         # Get player data
-        player = await self.db.get_player(user_id)
+        player = await self.db.peek_player(user_id)
         
         # Handle "all" bet
         if bet_amount == -1:
@@ -232,12 +216,6 @@ class Games(commands.Cog):
             await interaction.response.send_message(f"❌ {error_msg}", ephemeral=True)
             return
         
-        # Subtract bet from balance
-        success = await self.db.subtract_balance(user_id, bet_amount)
-        if not success:
-            await interaction.response.send_message("❌ Insufficient funds!", ephemeral=True)
-            return
-        
         # Spin the wheel
         result_number = random.randint(0, 36)
         
@@ -269,18 +247,16 @@ class Games(commands.Cog):
         # Calculate winnings
         if won:
             payout = int(bet_amount * multiplier)
-            await self.db.add_balance(user_id, payout)
             profit = payout - bet_amount
         else:
             payout = 0
             profit = -bet_amount
         
-        # Update stats
-        await self.db.update_player(user_id, {
-            "games_played": player["games_played"] + 1,
-            "total_won": player["total_won"] + (profit if profit > 0 else 0),
-            "total_lost": player["total_lost"] + (abs(profit) if profit < 0 else 0)
-        })
+        # Debit the bet, credit the payout and update stats in one step
+        new_balance = await self.db.settle_bet(user_id, bet_amount, payout, game="roulette", interaction_id=interaction.id)
+        if new_balance is None:
+            await interaction.response.send_message("❌ Insufficient funds!", ephemeral=True)
+            return
         
         # Create response embed
         embed = discord.Embed(
@@ -299,48 +275,18 @@ class Games(commands.Cog):
         else:
             embed.add_field(name="Lost", value=f"-{CurrencyUtils.format_amount(bet_amount)}", inline=True)
         
-        # Get updated balance
-        updated_player = await self.db.get_player(user_id)
-        embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(updated_player["balance"]), inline=False)
+        # Show new balance
+        embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(new_balance), inline=False)
         
         await interaction.response.send_message(embed=embed)
     
-    def get_random_symbol(self):
-        """Get a random slot symbol based on weights"""
-        symbols = list(SLOT_SYMBOLS.keys())
-        weights = [SLOT_WEIGHTS[symbol] for symbol in symbols]
-        return random.choices(symbols, weights=weights)[0]
-    
-    def calculate_payout(self, symbols, bet_amount):
-        """Calculate payout based on slot result"""
-        # Count occurrences of each symbol
-        symbol_counts = {}
-        for symbol in symbols:
-            symbol_counts[symbol] = symbol_counts.get(symbol, 0) + 1
-        
-        total_payout = 0
-        winning_lines = []
-        
-        # Check for winning combinations
-        for symbol, count in symbol_counts.items():
-            if count >= 2 and symbol in SLOT_SYMBOLS:
-                payouts = SLOT_SYMBOLS[symbol]["payouts"]
-                if count in payouts:
-                    multiplier = payouts[count]
-                    payout = int(bet_amount * multiplier)
-                    total_payout += payout
-                    winning_lines.append({
-                        "symbol": symbol,
-                        "count": count,
-                        "multiplier": multiplier,
-                        "payout": payout
-                    })
-        
-        return total_payout, winning_lines
-    
     @app_commands.command(name="slots", description="Play the slot machine!")
-    @app_commands.describe(bet="Amount to bet (supports k, m, g, t notation)")
-    async def slots(self, interaction: discord.Interaction, bet: str):
+    @app_commands.describe(
+        bet="Amount to bet per spin (supports k, m, g, t notation)",
+        spins=f"Number of spins, settled together (1-{SLOTS_MAX_SPINS})"
+    )
+    async def slots(self, interaction: discord.Interaction, bet: str,
+                    spins: app_commands.Range[int, 1, SLOTS_MAX_SPINS] = 1):
         """Slot machine game with authentic payouts"""
         user_id = interaction.user.id
         
@@ -351,46 +297,32 @@ class Games(commands.Cog):
             return
         
         # Get player data
-        player = await self.db.get_player(user_id)
+        player = await self.db.peek_player(user_id)
         
-        # Handle "all" bet
+        # Handle "all" bet (split across the spins)
         if bet_amount == -1:
-            bet_amount = player["balance"]
+            bet_amount = player["balance"] // spins
         
-        # Validate bet
-        is_valid, error_msg = CurrencyUtils.validate_bet(bet_amount, player["balance"], MIN_BET, MAX_BET)
+        # Validate bet: each spin's bet within limits, all of them covered by the balance
+        is_valid, error_msg = CurrencyUtils.validate_bet(bet_amount, player["balance"] // spins, MIN_BET, MAX_BET)
         if not is_valid:
             await interaction.response.send_message(f"❌ {error_msg}", ephemeral=True)
             return
         
-        # Subtract bet from balance
-        success = await self.db.subtract_balance(user_id, bet_amount)
-        if not success:
-            await interaction.response.send_message("❌ Insufficient funds!", ephemeral=True)
+        if spins > 1:
+            await self.play_slots_batch(interaction, bet_amount, spins)
             return
         
-        # Spin the reels
-        reel1 = self.get_random_symbol()
-        reel2 = self.get_random_symbol()
-        reel3 = self.get_random_symbol()
-        symbols = [reel1, reel2, reel3]
-        
-        # Calculate payout
-        total_payout, winning_lines = self.calculate_payout(symbols, bet_amount)
-        
-        # Add winnings to balance
-        if total_payout > 0:
-            await self.db.add_balance(user_id, total_payout)
-            profit = total_payout - bet_amount
-        else:
-            profit = -bet_amount
+        # Spin the reels (three alias-table draws) and look the outcome up
+        reels = self.slot_machine.spin()
+        total_payout, winning_lines = self.slot_machine.payout(reels, bet_amount)
+        profit = total_payout - bet_amount
         
-        # Update stats
-        await self.db.update_player(user_id, {
-            "games_played": player["games_played"] + 1,
-            "total_won": player["total_won"] + (profit if profit > 0 else 0),
-            "total_lost": player["total_lost"] + (abs(profit) if profit < 0 else 0)
-        })
+        # Debit the bet, credit the payout and update stats in one step
+        new_balance = await self.db.settle_bet(user_id, bet_amount, total_payout, game="slots", interaction_id=interaction.id)
+        if new_balance is None:
+            await interaction.response.send_message("❌ Insufficient funds!", ephemeral=True)
+            return
         
         # Create response embed
         embed = discord.Embed(
@@ -399,9 +331,7 @@ class Games(commands.Cog):
         )
         
         # Show the slot result
-        slot_display = ""
-        for symbol in symbols:
-            slot_display += SLOT_SYMBOLS[symbol]["emoji"]
+        slot_display = "".join(self.slot_machine.emojis[reel] for reel in reels)
         
         embed.add_field(name="Result", value=f"**{slot_display}**", inline=False)
         
@@ -422,15 +352,64 @@ class Games(commands.Cog):
         
         embed.add_field(name="Bet Amount", value=CurrencyUtils.format_amount(bet_amount), inline=True)
         
-        # Get updated balance
-        updated_player = await self.db.get_player(user_id)
-        embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(updated_player["balance"]), inline=False)
+        # Show new balance
+        embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(new_balance), inline=False)
         
         # Add payout table as footer for reference
         embed.set_footer(text="💡 Use /slots-help for payout information")
         
         await interaction.response.send_message(embed=embed)
     
+    async def play_slots_batch(self, interaction: discord.Interaction, bet_amount: int, spins: int):
+        """Resolve ``spins`` slot spins in one draw and settle their net result once"""
+        outcomes, payouts = self.slot_machine.spin_many(spins, bet_amount)
+        total_bet = bet_amount * spins
+        total_payout = int(payouts.sum())
+        profit = total_payout - total_bet
+        
+        new_balance = await self.db.settle_bet(
+            interaction.user.id, total_bet, total_payout, stats_delta={"games_played": spins},
+            game="slots", interaction_id=interaction.id
+        )
+        if new_balance is None:
+            await interaction.response.send_message("❌ Insufficient funds!", ephemeral=True)
+            return
+        
+        embed = discord.Embed(
+            title=f"🎰 Slot Machine x{spins}",
+            color=discord.Color.gold() if profit >= 0 else discord.Color.red()
+        )
+        
+        # Hits per winning line
+        lines = self.slot_machine.hits(outcomes, bet_amount)
+        if lines:
+            hit_text = ""
+            for line in lines:
+                emoji = SLOT_SYMBOLS[line["symbol"]]["emoji"]
+                hit_text += f"{emoji} x{line['count']} ({line['multiplier']}:1) × {line['hits']} = +{CurrencyUtils.format_amount(line['payout'])}\n"
+            embed.add_field(name="🎉 Hits", value=hit_text, inline=False)
+        
+        hit_count = sum(line["hits"] for line in lines)
+        embed.add_field(name="Spins", value=f"{spins} ({hit_count} hits, {spins - hit_count} misses)", inline=True)
+        
+        # Biggest single win, shown with its reels
+        best = int(payouts.argmax())
+        if payouts[best] > 0:
+            reels = self.slot_machine.reels(int(outcomes[best]))
+            slot_display = "".join(self.slot_machine.emojis[reel] for reel in reels)
+            embed.add_field(name="Biggest Win", value=f"{slot_display} +{CurrencyUtils.format_amount(int(payouts[best]))}", inline=True)
+        else:
+            embed.add_field(name="Biggest Win", value="💀 None", inline=True)
+        
+        embed.add_field(name="Total Bet", value=CurrencyUtils.format_amount(total_bet), inline=True)
+        embed.add_field(name="Total Payout", value=CurrencyUtils.format_amount(total_payout), inline=True)
+        sign = "+" if profit >= 0 else "-"
+        embed.add_field(name="Net Profit", value=f"{sign}{CurrencyUtils.format_amount(abs(profit))}", inline=True)
+        embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(new_balance), inline=False)
+        embed.set_footer(text="💡 Use /slots-help for payout information")
+        
+        await interaction.response.send_message(embed=embed)
+    
     @app_commands.command(name="slots-help", description="Show slot machine payout table")
     async def slots_help(self, interaction: discord.Interaction):
         """Display slot machine payout information"""
@@ -466,7 +445,7 @@ class Games(commands.Cog):
             payout_text += line + "\n"
         
         embed.add_field(name="Payout Table", value=f"```{payout_text}```", inline=False)
-        embed.add_field(name="How to Play", value="• Use `/slots <bet>` to spin\n• Match 2 or 3 symbols to win\n• Higher value symbols = bigger payouts", inline=False)
+        embed.add_field(name="How to Play", value=f"• Use `/slots <bet>` to spin\n• Add `spins` to play up to {SLOTS_MAX_SPINS} spins at once\n• Match 2 or 3 symbols to win\n• Higher value symbols = bigger payouts", inline=False)
         embed.add_field(name="Bet Formats", value="• Numbers: `100`, `1000`\n• Shorthand: `1k`, `5m`, `10g`\n• All-in: `all` or `max`", inline=False)
         
         await interaction.response.send_message(embed=embed)
@@ -484,7 +463,7 @@ class Games(commands.Cog):
             return
         
         # Get player data
-        player = await self.db.get_player(user_id)
+        player = await self.db.peek_player(user_id)
         
         # Handle "all" bet
         if bet_amount == -1:
@@ -496,12 +475,6 @@ class Games(commands.Cog):
             await interaction.response.send_message(f"❌ {error_msg}", ephemeral=True)
             return
         
-        # Subtract bet from balance
-        success = await self.db.subtract_balance(user_id, bet_amount)
-        if not success:
-            await interaction.response.send_message("❌ Insufficient funds!", ephemeral=True)
-            return
-        
         # Create deck and deal cards
         suits = ['♠', '♥', '♦', '♣']
         ranks = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
@@ -550,7 +523,6 @@ class Games(commands.Cog):
         # Determine outcome
         if player_blackjack and dealer_blackjack:
             # Push (tie)
-            await self.db.add_balance(user_id, bet_amount)
             embed.color = discord.Color.orange()
             embed.add_field(name="Result", value="🤝 **PUSH!** Both have blackjack", inline=False)
             payout = bet_amount
@@ -558,7 +530,6 @@ class Games(commands.Cog):
         elif player_blackjack:
             # Player blackjack wins 3:2
             payout = int(bet_amount * 2.5)
-            await self.db.add_balance(user_id, payout)
             profit = payout - bet_amount
             embed.color = discord.Color.gold()
             embed.add_field(name="Result", value="🎉 **BLACKJACK!** You win!", inline=False)
@@ -585,7 +556,6 @@ class Games(commands.Cog):
             if dealer_value > 21:
                 # Dealer bust, player wins
                 payout = bet_amount * 2
-                await self.db.add_balance(user_id, payout)
                 profit = payout - bet_amount
                 embed.color = discord.Color.green()
                 embed.add_field(name="Result", value="🎉 **DEALER BUST!** You win!", inline=False)
@@ -598,24 +568,21 @@ class Games(commands.Cog):
             elif player_value > dealer_value:
                 # Player wins
                 payout = bet_amount * 2
-                await self.db.add_balance(user_id, payout)
                 profit = payout - bet_amount
                 embed.color = discord.Color.green()
                 embed.add_field(name="Result", value="🎉 **YOU WIN!**", inline=False)
             else:
                 # Push (tie)
-                await self.db.add_balance(user_id, bet_amount)
                 embed.color = discord.Color.orange()
                 embed.add_field(name="Result", value="🤝 **PUSH!** It's a tie", inline=False)
                 payout = bet_amount
                 profit = 0
         
-        # Update stats
-        await self.db.update_player(user_id, {
-            "games_played": player["games_played"] + 1,
-            "total_won": player["total_won"] + (profit if profit > 0 else 0),
-            "total_lost": player["total_lost"] + (abs(profit) if profit < 0 else 0)
-        })
+        # Debit the bet, credit the payout and update stats in one step
+        new_balance = await self.db.settle_bet(user_id, bet_amount, payout, game="blackjack", interaction_id=interaction.id)
+        if new_balance is None:
+            await interaction.response.send_message("❌ Insufficient funds!", ephemeral=True)
+            return
         
         # Show payout info
         if profit > 0:
@@ -625,8 +592,7 @@ class Games(commands.Cog):
             embed.add_field(name="Lost", value=f"-{CurrencyUtils.format_amount(bet_amount)}", inline=True)
         
         # Show new balance
-        updated_player = await self.db.get_player(user_id)
-        embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(updated_player["balance"]), inline=False)
+        embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(new_balance), inline=False)
         
         await interaction.response.send_message(embed=embed)
     
@@ -650,7 +616,7 @@ class Games(commands.Cog):
             return
         
         # Get player data
-        player = await self.db.get_player(user_id)
+        player = await self.db.peek_player(user_id)
         
         # Handle "all" bet
         if bet_amount == -1:
@@ -662,12 +628,6 @@ class Games(commands.Cog):
             await interaction.response.send_message(f"❌ {error_msg}", ephemeral=True)
             return
         
-        # Subtract bet from balance
-        success = await self.db.subtract_balance(user_id, bet_amount)
-        if not success:
-            await interaction.response.send_message("❌ Insufficient funds!", ephemeral=True)
-            return
-        
         # Generate cards
         card_values = list(range(1, 14))  # A=1, 2-10, J=11, Q=12, K=13
         card_names = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
@@ -696,18 +656,16 @@ class Games(commands.Cog):
         if won:
             # 1.9:1 payout (with house edge)
             payout = int(bet_amount * 1.9)
-            await self.db.add_balance(user_id, payout)
             profit = payout - bet_amount
         else:
             payout = 0
             profit = -bet_amount
         
-        # Update stats
-        await self.db.update_player(user_id, {
-            "games_played": player["games_played"] + 1,
-            "total_won": player["total_won"] + (profit if profit > 0 else 0),
-            "total_lost": player["total_lost"] + (abs(profit) if profit < 0 else 0)
-        })
+        # Debit the bet, credit the payout and update stats in one step
+        new_balance = await self.db.settle_bet(user_id, bet_amount, payout, game="higherorlower", interaction_id=interaction.id)
+        if new_balance is None:
+            await interaction.response.send_message("❌ Insufficient funds!", ephemeral=True)
+            return
         
         # Create response embed
         embed = discord.Embed(
@@ -734,9 +692,8 @@ class Games(commands.Cog):
         else:
             embed.add_field(name="Lost", value=f"-{CurrencyUtils.format_amount(bet_amount)}", inline=True)
         
-        # Get updated balance
-        updated_player = await self.db.get_player(user_id)
-        embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(updated_player["balance"]), inline=False)
+        # Show new balance
+        embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(new_balance), inline=False)
         
         await interaction.response.send_message(embed=embed)
 
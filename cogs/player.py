@@ -2,21 +2,27 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 from datetime import datetime
-from utils.manager import Database
 from utils.currency import CurrencyUtils
 from utils.cooldowns import CooldownManager
-from config import DAILY_REWARD, WEEKLY_REWARD, MONTHLY_REWARD, YEARLY_REWARD, VOTE_MULTIPLIERS
+from config import DAILY_REWARD, WEEKLY_REWARD, MONTHLY_REWARD, YEARLY_REWARD, VOTE_MULTIPLIERS, LEADERBOARD_PENDING_TTL
+
+LEADERBOARD_CHOICES = [
+    app_commands.Choice(name="Balance", value="balance"),
+    app_commands.Choice(name="Total Won", value="total_won"),
+    app_commands.Choice(name="Games Played", value="games_played"),
+    app_commands.Choice(name="Vote Count", value="vote_count")
+]
 
 class Player(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = bot.db
     
     @app_commands.command(name="balance", description="Check your current balance")
     async def balance(self, interaction: discord.Interaction, user: discord.Member = None):
         """Display user balance and stats"""
         target_user = user or interaction.user
-        player = await self.db.get_player(target_user.id)
+        player = await self.db.peek_player(target_user.id)
         
         embed = discord.Embed(
             title=f"💰 {target_user.display_name}'s Balance",
@@ -61,7 +67,7 @@ class Player(commands.Cog):
     async def daily(self, interaction: discord.Interaction):
         """Claim daily reward"""
         user_id = interaction.user.id
-        player = await self.db.get_player(user_id)
+        player = await self.db.peek_player(user_id)
         
         # Check cooldown
         can_use, error_msg = CooldownManager.check_cooldown(player.get("last_daily"), "daily")
@@ -70,7 +76,7 @@ class Player(commands.Cog):
             return
         
         # Give reward
-        await self.db.add_balance(user_id, DAILY_REWARD)
+        await self.db.add_balance(user_id, DAILY_REWARD, "daily", interaction_id=interaction.id)
         await self.db.update_player(user_id, {
             "last_daily": CooldownManager.set_cooldown_used("daily")
         })
@@ -82,7 +88,7 @@ class Player(commands.Cog):
         )
         
         # Show new balance
-        updated_player = await self.db.get_player(user_id)
+        updated_player = await self.db.peek_player(user_id)
         embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(updated_player["balance"]), inline=True)
         embed.add_field(name="Next Daily", value="<t:{}:R>".format(int((datetime.now().timestamp() + 86400))), inline=True)
         
@@ -92,7 +98,7 @@ class Player(commands.Cog):
     async def weekly(self, interaction: discord.Interaction):
         """Claim weekly reward"""
         user_id = interaction.user.id
-        player = await self.db.get_player(user_id)
+        player = await self.db.peek_player(user_id)
         
         # Check cooldown
         can_use, error_msg = CooldownManager.check_cooldown(player.get("last_weekly"), "weekly")
@@ -101,7 +107,7 @@ class Player(commands.Cog):
             return
         
         # Give reward
-        await self.db.add_balance(user_id, WEEKLY_REWARD)
+        await self.db.add_balance(user_id, WEEKLY_REWARD, "weekly", interaction_id=interaction.id)
         await self.db.update_player(user_id, {
             "last_weekly": CooldownManager.set_cooldown_used("weekly")
         })
@@ -113,7 +119,7 @@ class Player(commands.Cog):
         )
         
         # Show new balance
-        updated_player = await self.db.get_player(user_id)
+        updated_player = await self.db.peek_player(user_id)
         embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(updated_player["balance"]), inline=True)
         embed.add_field(name="Next Weekly", value="<t:{}:R>".format(int((datetime.now().timestamp() + 604800))), inline=True)
         
@@ -123,7 +129,7 @@ class Player(commands.Cog):
     async def monthly(self, interaction: discord.Interaction):
         """Claim monthly reward"""
         user_id = interaction.user.id
-        player = await self.db.get_player(user_id)
+        player = await self.db.peek_player(user_id)
         
         # Check cooldown
         can_use, error_msg = CooldownManager.check_cooldown(player.get("last_monthly"), "monthly")
@@ -132,7 +138,7 @@ class Player(commands.Cog):
             return
         
         # Give reward
-        await self.db.add_balance(user_id, MONTHLY_REWARD)
+        await self.db.add_balance(user_id, MONTHLY_REWARD, "monthly", interaction_id=interaction.id)
         await self.db.update_player(user_id, {
             "last_monthly": CooldownManager.set_cooldown_used("monthly")
         })
@@ -144,7 +150,7 @@ class Player(commands.Cog):
         )
         
         # Show new balance
-        updated_player = await self.db.get_player(user_id)
+        updated_player = await self.db.peek_player(user_id)
         embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(updated_player["balance"]), inline=True)
         embed.add_field(name="Next Monthly", value="<t:{}:R>".format(int((datetime.now().timestamp() + 2592000))), inline=True)
         
@@ -154,7 +160,7 @@ class Player(commands.Cog):
     async def vote(self, interaction: discord.Interaction):
         """Claim vote reward with multiplier system"""
         user_id = interaction.user.id
-        player = await self.db.get_player(user_id)
+        player = await self.db.peek_player(user_id)
         
         # Check cooldown
         can_use, error_msg = CooldownManager.check_cooldown(player.get("last_vote"), "vote")
@@ -186,7 +192,7 @@ class Player(commands.Cog):
         total_reward = base_reward * multiplier
         
         # Give reward
-        await self.db.add_balance(user_id, total_reward)
+        await self.db.add_balance(user_id, total_reward, "vote", interaction_id=interaction.id)
         await self.db.update_player(user_id, {
             "last_vote": CooldownManager.set_cooldown_used("vote"),
             "vote_count": vote_count
@@ -202,7 +208,7 @@ class Player(commands.Cog):
         embed.add_field(name="Reward", value=CurrencyUtils.format_amount(total_reward), inline=True)
         
         # Show new balance
-        updated_player = await self.db.get_player(user_id)
+        updated_player = await self.db.peek_player(user_id)
         embed.add_field(name="New Balance", value=CurrencyUtils.format_amount(updated_player["balance"]), inline=False)
         embed.add_field(name="Next Vote", value="<t:{}:R>".format(int((datetime.now().timestamp() + 43200))), inline=True)
         
@@ -238,7 +244,7 @@ class Player(commands.Cog):
             return
         
         # Get sender data
-        sender = await self.db.get_player(sender_id)
+        sender = await self.db.peek_player(sender_id)
         
         # Handle "all" amount
         if send_amount == -1:
@@ -253,9 +259,11 @@ class Player(commands.Cog):
             await interaction.response.send_message("❌ Insufficient funds!", ephemeral=True)
             return
         
-        # Transfer money
-        await self.db.subtract_balance(sender_id, send_amount)
-        await self.db.add_balance(recipient_id, send_amount)
+        # Transfer money (checked again atomically: the balance may have changed since)
+        new_balance = await self.db.transfer(sender_id, recipient_id, send_amount, "send", interaction_id=interaction.id)
+        if new_balance is None:
+            await interaction.response.send_message("❌ Insufficient funds!", ephemeral=True)
+            return
         
         embed = discord.Embed(
             title="💸 Money Transfer",
@@ -264,8 +272,7 @@ class Player(commands.Cog):
         )
         
         # Show updated balances
-        updated_sender = await self.db.get_player(sender_id)
-        embed.add_field(name="Your New Balance", value=CurrencyUtils.format_amount(updated_sender["balance"]), inline=True)
+        embed.add_field(name="Your New Balance", value=CurrencyUtils.format_amount(new_balance), inline=True)
         
         await interaction.response.send_message(embed=embed)
     
@@ -274,36 +281,48 @@ class Player(commands.Cog):
         metric="What to rank by",
         global_board="Show global leaderboard (default: this server only)"
     )
-    @app_commands.choices(metric=[
-        app_commands.Choice(name="Balance", value="balance"),
-        app_commands.Choice(name="Total Won", value="total_won"),
-        app_commands.Choice(name="Games Played", value="games_played"),
-        app_commands.Choice(name="Vote Count", value="vote_count")
-    ])
+    @app_commands.choices(metric=LEADERBOARD_CHOICES)
     async def leaderboard(self, interaction: discord.Interaction, metric: str = "balance", global_board: bool = False):
         """Display leaderboard"""
-        leaderboard_data = await self.db.get_leaderboard(metric, limit=10)
+        guild_id = None if global_board or interaction.guild is None else interaction.guild.id
+        leaderboard_data = await self.db.get_leaderboard(metric, limit=10, guild_id=guild_id)
         
         if not leaderboard_data:
             await interaction.response.send_message("❌ No leaderboard data available!", ephemeral=True)
             return
         
+        # Identical requests reuse the rendered embed until the TTL runs out or the top entries change
+        cache_key = (guild_id, metric, "global" if global_board else "guild")
+        version = tuple((entry["user_id"], entry["value"]) for entry in leaderboard_data)
+        embed = self.bot.leaderboard_cache.get(cache_key, version=version)
+        if embed is None:
+            embed, complete = self.leaderboard_embed(interaction, metric, global_board, leaderboard_data)
+            # Names still being fetched show up on a render a few seconds later
+            ttl = None if complete else LEADERBOARD_PENDING_TTL
+            self.bot.leaderboard_cache.set(cache_key, embed, version=version, ttl=ttl)
+        
+        await interaction.response.send_message(embed=embed)
+    
+    def leaderboard_embed(self, interaction: discord.Interaction, metric: str, global_board: bool,
+                          leaderboard_data: list) -> tuple:
+        """Render leaderboard entries, return the embed and whether every name was known"""
         embed = discord.Embed(
             title=f"🏆 {'Global ' if global_board else ''}Leaderboard - {metric.replace('_', ' ').title()}",
             color=discord.Color.gold()
         )
         
         leaderboard_text = ""
+        complete = True
+        guild = None if global_board else interaction.guild
         for i, entry in enumerate(leaderboard_data):
             try:
-                if global_board:
-                    user = self.bot.get_user(entry["user_id"])
-                    display_name = user.display_name if user else f"User #{entry['user_id']}"
-                else:
-                    member = interaction.guild.get_member(entry["user_id"])
-                    if not member:
-                        continue
-                    display_name = member.display_name
+                known, display_name = self.bot.names.lookup(entry["user_id"], guild)
+                if not known:
+                    complete = False
+                    display_name = f"User #{entry['user_id']}"
+                elif display_name is None:
+                    # Deleted account, or no longer a member of this server
+                    continue
                 
                 rank_emoji = ["🥇", "🥈", "🥉"][i] if i < 3 else f"{i+1}."
                 value = CurrencyUtils.format_amount(entry["value"]) if metric in ["balance", "total_won"] else f"{entry['value']:,}"
@@ -318,6 +337,45 @@ class Player(commands.Cog):
             embed.description = leaderboard_text
         
         embed.set_footer(text=f"Showing top {len(leaderboard_data)} players")
+        return embed, complete
+    
+    @app_commands.command(name="rank", description="See your leaderboard position")
+    @app_commands.describe(
+        metric="What to rank by",
+        global_board="Rank against everyone (default: this server only)",
+        user="Whose rank to show (default: you)"
+    )
+    @app_commands.choices(metric=LEADERBOARD_CHOICES)
+    async def rank(self, interaction: discord.Interaction, metric: str = "balance",
+                   global_board: bool = False, user: discord.Member = None):
+        """Display a player's rank and the players around them"""
+        target_user = user or interaction.user
+        guild_id = None if global_board or interaction.guild is None else interaction.guild.id
+        rank = await self.db.get_rank(target_user.id, metric, guild_id=guild_id, span=2)
+        
+        if rank is None:
+            await interaction.response.send_message(
+                f"❌ {target_user.display_name} isn't on this leaderboard yet - play a game first!",
+                ephemeral=True
+            )
+            return
+        
+        embed = discord.Embed(
+            title=f"📊 {'Global ' if guild_id is None else ''}Rank - {metric.replace('_', ' ').title()}",
+            description=f"**{target_user.display_name}** is **#{rank['rank']:,}** of {rank['total']:,}",
+            color=discord.Color.blue()
+        )
+        
+        nearby_text = ""
+        for entry in rank["nearby"]:
+            _, display_name = self.bot.names.lookup(entry["user_id"], None if guild_id is None else interaction.guild)
+            display_name = display_name or f"User #{entry['user_id']}"
+            value = CurrencyUtils.format_amount(entry["value"]) if metric in ["balance", "total_won"] else f"{entry['value']:,}"
+            marker = "➡️ " if entry["user_id"] == target_user.id else ""
+            nearby_text += f"{marker}{entry['rank']:,}. **{display_name}** - {value}\n"
+        
+        embed.add_field(name="Nearby", value=nearby_text, inline=False)
+        embed.set_thumbnail(url=target_user.display_avatar.url)
         
         await interaction.response.send_message(embed=embed)
 
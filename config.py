@@ -9,6 +9,8 @@ if not TOKEN or TOKEN == "your_bot_token_here":
     raise RuntimeError("DISCORD_TOKEN environment variable is not set or is invalid. Please set it in your .env file or environment.")
 
 COMMAND_PREFIX = os.getenv("COMMAND_PREFIX", "/")
+# Privileged members intent; leaderboard names are fetched on demand, so it can be turned off
+MEMBERS_INTENT = os.getenv("MEMBERS_INTENT", "true").lower() == "true"
 
 # Default currency settings
 DEFAULT_CURRENCY_NAME = "coins"
@@ -68,6 +70,7 @@ SLOT_WEIGHTS = {
 MIN_BET = 1
 MAX_BET = 1000000000  # 1 billion
 HOUSE_EDGE = 0.02  # 2% house edge for most games
+SLOTS_MAX_SPINS = 100  # Most spins one /slots command can resolve (settled together)
 
 # Cooldowns (in seconds)
 COOLDOWNS = {
@@ -80,3 +83,47 @@ COOLDOWNS = {
     "spin": 300,       # 5 minutes
     "vote": 43200      # 12 hours
 }
+
+# Database settings
+DB_WRITE_BEHIND = os.getenv("DB_WRITE_BEHIND", "true").lower() == "true"  # Batch writes in the background
+DB_FLUSH_INTERVAL = 5      # Seconds between background flushes
+DB_FLUSH_THRESHOLD = 500   # Flush early once this many records are dirty
+DB_JOURNAL = os.getenv("DB_JOURNAL", "true").lower() == "true"  # Append mutations to data/journal.jsonl
+DB_JOURNAL_COMMIT_INTERVAL = 0.5  # Seconds between journal group commits (fsync)
+DB_COMPACT_RECORDS = 100000       # Fold the journal into a snapshot after this many records
+DB_COMPACT_INTERVAL = 900         # ...or after this many seconds
+DB_SNAPSHOT_GENERATIONS = 3       # Snapshot files kept (players.json, players.json.1, ...)
+DB_SNAPSHOT_FORMAT = os.getenv("DB_SNAPSHOT_FORMAT", "json").lower()  # "json" or "binary" (data/players.bin)
+DATABASE_BACKEND = os.getenv("DATABASE_BACKEND", "json")  # "json", "sqlite" or "postgres"
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data/casino.db")
+DATABASE_URL = os.getenv("DATABASE_URL")  # Required for DATABASE_BACKEND=postgres
+DB_POOL_MIN_SIZE = 1
+DB_POOL_MAX_SIZE = 10
+DB_HOT_FIELDS = os.getenv("DB_HOT_FIELDS", "false").lower() == "true"  # Keep balances/counters in data/hotfields.bin (mmap)
+DB_LOCK_STRIPES = 256             # Per-user lock stripes for player operations
+DB_STREAM_LOAD = os.getenv("DB_STREAM_LOAD", "true").lower() == "true"  # Load players in the background at startup
+DB_LOAD_BATCH = 5000              # Players parsed per background load step
+DB_LOAD_PROGRESS_INTERVAL = 5     # Seconds between load progress messages
+
+# Cache settings
+LEADERBOARD_CACHE_TTL = 10        # Seconds a rendered leaderboard is reused while its top entries are unchanged
+LEADERBOARD_CACHE_SIZE = 1000     # Rendered leaderboards kept (least recently used dropped first)
+LEADERBOARD_PENDING_TTL = 3       # ...or this many seconds while some names are still being fetched
+NAME_CACHE_TTL = 3600             # Seconds a fetched display name is kept
+NAME_CACHE_SIZE = 50000           # Display names kept (least recently used dropped first)
+MEMBER_QUERY_LIMIT = 100          # Most user ids Discord resolves in one member query
+NAME_FETCH_BATCH = min(100, MEMBER_QUERY_LIMIT)  # Guild members looked up per gateway request (at most MEMBER_QUERY_LIMIT)
+NAME_FETCH_INTERVAL = 0.5         # Seconds between name lookups sent to Discord
+NAME_FETCH_MAX_BACKOFF = 60       # Longest pause after repeated failed lookups
+GUILD_CACHE_TTL = 60              # Seconds a PostgreSQL guild config is cached (bounds changes from other processes)
+GUILD_LEADERBOARD_CACHE_SIZE = 1000  # Guilds whose per-guild leaderboard indexes are kept (least recently used dropped first)
+
+# Ledger settings
+LEDGER_PATH = os.getenv("LEDGER_PATH", "data/ledger.db")  # Append-only record of every balance change
+LEDGER_FLUSH_INTERVAL = 2         # Seconds between ledger batch writes
+LEDGER_FLUSH_THRESHOLD = 1000     # Write early once this many entries are buffered
+LEDGER_QUERY_LIMIT = 25           # Entries shown by /ledger
+
+# Idempotency settings
+IDEMPOTENCY_TTL = 900             # Seconds a money-moving interaction is remembered (replays return the first result)
+IDEMPOTENCY_SIZE = 100000         # Interaction results kept in memory (oldest dropped first)
@@ -3,8 +3,11 @@ from discord.ext import commands
 import asyncio
 import os
 import json
-from config import TOKEN, COMMAND_PREFIX
-from utils.manager import create_tables 
+from config import TOKEN, COMMAND_PREFIX, MEMBERS_INTENT, LEADERBOARD_CACHE_SIZE, LEADERBOARD_CACHE_TTL
+from utils.manager import open_database
+from utils.cache import TTLCache
+from utils.ledger import Ledger
+from utils.names import NameResolver
 from flask import Flask
 import threading
 
@@ -12,7 +15,7 @@ import threading
 intents = discord.Intents.default()
 intents.message_content = True
 intents.guilds = True
-intents.members = True
+intents.members = MEMBERS_INTENT
 
 class CasinoBot(commands.Bot):
     def __init__(self):
@@ -21,9 +24,22 @@ class CasinoBot(commands.Bot):
             intents=intents,
             help_command=None
         )
+        # Append-only record of every balance change, written in batches
+        self.ledger = Ledger()
+        # Single store shared by every cog (the only in-memory copy of the data)
+        self.db = open_database(ledger=self.ledger)
+        # Rendered leaderboard embeds keyed by (guild, metric, scope), see cogs.player
+        self.leaderboard_cache = TTLCache(LEADERBOARD_CACHE_SIZE, LEADERBOARD_CACHE_TTL)
+        # Display names for leaderboards, fetched in the background when not cached
+        self.names = NameResolver(self)
         
     async def setup_hook(self):
         """Load all cogs when bot starts"""
+        # Load player/guild data once and start the background flusher
+        await self.db.start()
+        self.ledger.start()
+        self.names.start()
+        
         cogs = [
             'cogs.games',
             'cogs.player',
@@ -50,23 +66,26 @@ class CasinoBot(commands.Bot):
         print(f'{self.user} has connected to Discord!')
         print(f'Bot is in {len(self.guilds)} guilds')
         
-        # Initialize PostgreSQL database
-        try:
-            create_tables()
-            print("✅ PostgreSQL database initialized successfully")
-        except Exception as e:
-            print(f"⚠️ Database initialization warning: {e}")
-        
         # Set bot status
         await self.change_presence(
             activity=discord.Game(name="🎰 Casino Games | /help")
         )
     
+    async def close(self):
+        """Flush pending data before shutting down"""
+        await self.names.close()
+        await self.db.close()
+        await self.ledger.close()
+        await super().close()
+    
+    async def on_app_command_completion(self, interaction, command):
+        """Remember which servers each player plays in (for server leaderboards)"""
+        if interaction.guild is not None:
+            await self.db.add_guild_member(interaction.guild.id, interaction.user.id)
+    
     async def on_guild_join(self, guild):
         """Initialize guild data when joining"""
-        from utils.manager import Database
-        db = Database()
-        await db.initialize_guild(guild.id)
+        await self.db.initialize_guild(guild.id)
         print(f"Joined guild: {guild.name}")
 
 # Create bot instance
@@ -0,0 +1,210 @@
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, BinaryIO, Dict, Iterator, List, Tuple
+from utils.records import PlayerRecord, FIXED_FIELDS, TIME_FIELDS
+
+MAGIC = b"CASINOP1"
+HEADER = struct.Struct("<QI")  # player count, length of the column-name list
+TRAILER = struct.Struct("<I")  # CRC32 of everything before it
+NO_TIME = -2 ** 63             # Stored for timestamps that are unset
+READ_SIZE = 1 << 20            # Bytes per read while verifying the checksum
+READ_ROWS = 8192               # Players decoded per read while loading
+
+class BinarySnapshot:
+    """Columnar binary encoding of the players snapshot
+    
+    Layout (little endian)::
+        
+        MAGIC | count, names_len | column names (JSON)
+        user ids             int64[count]
+        one column per field int64[count]   (FIXED_FIELDS; NO_TIME = unset)
+        variable lengths     uint32[count]
+        variable data        compact JSON per player with a non-zero length
+        CRC32
+    
+    Numeric fields are written and read as whole ``array`` columns, so
+    loading is a few ``frombytes`` calls plus one record per player instead
+    of parsing every key and number as text. Boosts, achievements, unknown
+    keys and values that don't fit in int64 go to the per-player JSON part.
+    """
+    
+    @staticmethod
+    def dump(f: BinaryIO, items: List[Tuple[str, Any]]):
+        """Write ``(user_id, record)`` pairs to a binary file"""
+        count = len(items)
+        rows = []
+        variables = []
+        for key, record in items:
+            if not isinstance(record, PlayerRecord):
+                record = PlayerRecord.from_dict(record)
+            rows.append(record.fixed_values())
+            variables.append(record.variable_fields())
+        
+        names = json.dumps(list(FIXED_FIELDS)).encode("utf-8")
+        crc = 0
+        def write(data):
+            nonlocal crc
+            crc = zlib.crc32(data, crc)
+            f.write(data)
+        
+        write(MAGIC)
+        write(HEADER.pack(count, len(names)))
+        write(names)
+        write(_to_le(array("q", [int(key) for key, _ in items])).tobytes())
+        
+        columns = list(zip(*rows)) if rows else [()] * len(FIXED_FIELDS)
+        for name, column in zip(FIXED_FIELDS, columns):
+            write(_to_le(_pack_column(name, column, variables)).tobytes())
+        
+        dumps = json.JSONEncoder(separators=(",", ":")).encode
+        blobs = [dumps(data).encode("utf-8") if data else b"" for data in variables]
+        write(_to_le(array("I", [len(blob) for blob in blobs])).tobytes())
+        write(b"".join(blobs))
+        f.write(TRAILER.pack(crc))
+    
+    @staticmethod
+    def load(f: BinaryIO) -> Dict[str, PlayerRecord]:
+        """Read a binary snapshot into ``{user_id: PlayerRecord}``"""
+        return dict(BinarySnapshot.iter_load(f))
+    
+    @staticmethod
+    def iter_load(f: BinaryIO) -> Iterator[Tuple[str, PlayerRecord]]:
+        """Yield ``(user_id, PlayerRecord)`` pairs once the file has been verified
+        
+        The file is never read whole: the checksum is computed over
+        ``READ_SIZE`` chunks, then ``READ_ROWS`` players at a time are read
+        from each column (plus their JSON part), so memory stays bounded by
+        one batch rather than the size of the snapshot.
+        """
+        size = f.seek(0, os.SEEK_END)
+        f.seek(0)
+        prefix = f.read(len(MAGIC) + HEADER.size)
+        if size < len(MAGIC) + HEADER.size + TRAILER.size or not prefix.startswith(MAGIC):
+            raise ValueError("not a binary players snapshot")
+        body_size = size - TRAILER.size
+        crc = zlib.crc32(prefix)
+        pos = len(prefix)
+        while pos < body_size:
+            chunk = f.read(min(READ_SIZE, body_size - pos))
+            if not chunk:
+                raise ValueError("binary players snapshot is truncated")
+            crc = zlib.crc32(chunk, crc)
+            pos += len(chunk)
+        if crc != TRAILER.unpack(f.read(TRAILER.size))[0]:
+            raise ValueError("binary players snapshot failed its checksum")
+        
+        count, names_len = HEADER.unpack_from(prefix, len(MAGIC))
+        f.seek(len(prefix))
+        names = json.loads(f.read(names_len))
+        ids_at = len(prefix) + names_len
+        columns_at = ids_at + 8 * count
+        lengths_at = columns_at + 8 * count * len(names)
+        variable_at = lengths_at + 4 * count
+        if variable_at > body_size:
+            raise ValueError("binary players snapshot is truncated")
+        
+        def read_column(typecode, at, first, rows):
+            """``rows`` values of a column starting at row ``first``"""
+            column = array(typecode)
+            f.seek(at + first * column.itemsize)
+            data = f.read(rows * column.itemsize)
+            if len(data) != rows * column.itemsize:
+                raise ValueError("binary players snapshot is truncated")
+            column.frombytes(data)
+            return _to_le(column)
+        
+        batches = [(first, min(READ_ROWS, count - first)) for first in range(0, count, READ_ROWS)]
+        variable_size = sum(sum(read_column("I", lengths_at, first, rows)) for first, rows in batches)
+        if variable_at + variable_size != body_size:
+            raise ValueError("binary players snapshot is truncated")
+        
+        from_fixed = PlayerRecord.from_fixed
+        loads = json.loads
+        variable_pos = variable_at
+        for first, rows in batches:
+            ids = read_column("q", ids_at, first, rows)
+            columns = {
+                name: read_column("q", columns_at + 8 * count * index, first, rows)
+                for index, name in enumerate(names)
+            }
+            lengths = read_column("I", lengths_at, first, rows)
+            
+            fixed = []
+            for name in FIXED_FIELDS:
+                column = columns.get(name)
+                if column is None:
+                    fixed.append([None if name in TIME_FIELDS else 0] * rows)
+                elif name in TIME_FIELDS:
+                    fixed.append([None if value == NO_TIME else value for value in column])
+                else:
+                    fixed.append(column)
+            
+            f.seek(variable_pos)
+            blob = f.read(sum(lengths))
+            variable_pos += len(blob)
+            # Every read seeks first, so leave tell() proportional to the rows
+            # decoded: callers report loading progress from it
+            f.seek(size * (first + rows) // count)
+            offset = 0
+            for user_id, values, length in zip(ids, zip(*fixed), lengths):
+                variable = None
+                if length:
+                    variable = loads(blob[offset:offset + length])
+                    offset += length
+                yield str(user_id), from_fixed(values, variable)
+
+def _pack_column(name: str, column: Tuple, variables: List) -> array:
+    """Pack one field column, moving values that don't fit into the JSON part"""
+    if name in TIME_FIELDS:
+        column = [NO_TIME if value is None else value for value in column]
+    try:
+        return array("q", column)
+    except (OverflowError, TypeError):
+        pass
+    
+    packed = array("q")
+    for index, value in enumerate(column):
+        if isinstance(value, int) and not isinstance(value, bool) and -2 ** 63 < value < 2 ** 63:
+            packed.append(value)
+            continue
+        packed.append(NO_TIME if name in TIME_FIELDS else 0)
+        if variables[index] is None:
+            variables[index] = {}
+        variables[index][name] = value
+    return packed
+
+def _to_le(column: array) -> array:
+    """Columns are stored little endian"""
+    if sys.byteorder != "little":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+def convert(source: str, target: str):
+    """Convert a players snapshot between JSON and binary (by target extension)"""
+    if source.endswith(".bin"):
+        with open(source, "rb") as f:
+            players = BinarySnapshot.load(f)
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            players = json.load(f)
+    
+    if target.endswith(".bin"):
+        with open(target, "wb") as f:
+            BinarySnapshot.dump(f, list(players.items()))
+    else:
+        with open(target, "w", encoding="utf-8") as f:
+            json.dump({key: dict(value) for key, value in players.items()}, f, indent=2)
+    print(f"Converted {len(players)} player(s): {source} -> {target}")
+
+if __name__ == "__main__":
+    # python -m utils.binary_snapshot data/players.json data/players.bin  -> to binary
+    # python -m utils.binary_snapshot data/players.bin data/players.json  -> back to JSON
+    if len(sys.argv) != 3:
+        print("Usage: python -m utils.binary_snapshot <source> <target>")
+        sys.exit(1)
+    convert(sys.argv[1], sys.argv[2])
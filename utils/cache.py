@@ -0,0 +1,127 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Hashable, Optional
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire ``ttl`` seconds after being stored
+    
+    An entry can be stored with a ``version`` (e.g. a fingerprint of the
+    data it was built from); ``get`` with a different version treats it as
+    stale and drops it, so callers can invalidate on actual change instead of
+    waiting for the TTL. Once ``maxsize`` entries are stored the least
+    recently used one is evicted. Hits, misses, expiries, stale entries and
+    evictions are counted for ``stats()``.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires, version, value)
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.stale = 0
+        self.evicted = 0
+    
+    def get(self, key: Hashable, default: Any = None, version: Any = None) -> Any:
+        """Cached value for ``key``, or ``default`` if missing, expired or of another version"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        
+        expires, entry_version, value = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            self.expired += 1
+            self.misses += 1
+            return default
+        if entry_version != version:
+            del self._entries[key]
+            self.stale += 1
+            self.misses += 1
+            return default
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def set(self, key: Hashable, value: Any, version: Any = None, ttl: float = None):
+        """Store ``value`` for ``ttl`` seconds (default: the cache TTL)"""
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), version, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+    
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Drop an entry, return its value"""
+        entry = self._entries.pop(key, None)
+        return entry[2] if entry is not None else default
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit/miss counters"""
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "stale": self.stale,
+            "evicted": self.evicted
+        }
+
+class GuildConfigCache:
+    """Guild configurations a SQL store keeps in memory until ``update_guild`` changes them
+    
+    Each entry also holds the guild's ``admin_ids`` as a frozenset, so admin
+    checks are a set lookup. ``ttl`` bounds how long changes made by another
+    process can go unseen (None keeps entries until invalidated). A load
+    that raced with an invalidation is not stored: callers read
+    ``generation`` before loading and pass it to ``put``.
+    """
+    
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl
+        self.generation = 0
+        self._entries: Dict[int, tuple] = {}  # guild id -> (expires or None, data, admin ids)
+    
+    def _entry(self, guild_id: int) -> Optional[tuple]:
+        entry = self._entries.get(guild_id)
+        if entry is not None and entry[0] is not None and entry[0] <= time.monotonic():
+            del self._entries[guild_id]
+            return None
+        return entry
+    
+    def get(self, guild_id: int) -> Optional[Dict[str, Any]]:
+        """Cached configuration (shared, treat as read-only) or None"""
+        entry = self._entry(guild_id)
+        return entry[1] if entry is not None else None
+    
+    def admins(self, guild_id: int) -> Optional[FrozenSet[int]]:
+        """Cached admin ids or None"""
+        entry = self._entry(guild_id)
+        return entry[2] if entry is not None else None
+    
+    def put(self, guild_id: int, data: Dict[str, Any], generation: int):
+        """Store a configuration loaded when ``generation`` was current"""
+        if generation != self.generation:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._entries[guild_id] = (expires, data, frozenset(data.get("admin_ids", [])))
+    
+    def invalidate(self, guild_id: int):
+        """Forget a guild after its configuration changed"""
+        self.generation += 1
+        self._entries.pop(guild_id, None)
+    
+    def clear(self):
+        """Forget every guild (e.g. after a bulk import)"""
+        self.generation += 1
+        self._entries.clear()
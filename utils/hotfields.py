@@ -0,0 +1,143 @@
+import mmap
+import os
+import struct
+from typing import Any, Iterable, List
+from utils.records import PlayerRecord, INT_FIELDS, TIME_FIELDS
+
+MAGIC = b"CASINOHF"
+HEADER = struct.Struct("<8sII")                   # magic, fields per row, rows in use
+ROW = struct.Struct("<q" + "q" * len(INT_FIELDS))  # user id, then INT_FIELDS
+FIELD = struct.Struct("<q")
+
+class HotFieldTable:
+    """Fixed-width memory-mapped table holding the per-bet counters
+    
+    Each player gets one row (user id + ``INT_FIELDS`` as int64) and the
+    store's id -> record map doubles as the id -> slot map, since every
+    mapped record carries its slot. A balance change is an in-place write of
+    8 bytes into the mapping, and the OS decides when those pages are written
+    back or evicted, so the hot numbers no longer live on the Python heap.
+    
+    The file is working storage, not the source of truth: it is rebuilt from
+    the snapshot and journal on every start, so a crash can never leave a
+    half-written row that matters.
+    """
+    
+    INITIAL_CAPACITY = 1024
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self.capacity = 0
+        self._file = None
+        self._mm = None
+    
+    def open(self, capacity: int = 0):
+        """Create an empty table with room for ``capacity`` rows"""
+        self.close()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "w+b")
+        self.count = 0
+        self._resize(max(capacity, self.INITIAL_CAPACITY))
+    
+    def _resize(self, capacity: int):
+        size = HEADER.size + capacity * ROW.size
+        self._file.truncate(size)
+        # The old mapping is left to the garbage collector instead of being
+        # closed: a snapshot thread may still be reading through it
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        self.capacity = capacity
+        HEADER.pack_into(self._mm, 0, MAGIC, len(INT_FIELDS), self.count)
+    
+    def release(self, records: Iterable[PlayerRecord]):
+        """Detach ``records`` from the table, then close it
+        
+        Callers may still hold records handed out earlier; detached ones keep
+        their counters on the heap instead of reading a closed mapping.
+        """
+        for record in records:
+            if isinstance(record, MappedPlayerRecord) and record._table is self and record._slot >= 0:
+                record._detach()
+        self.close()
+    
+    def close(self):
+        """Flush and unmap the table"""
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def allocate(self, user_id: int, values: List[int]) -> int:
+        """Store a new row and return its slot (struct.error if a value doesn't fit)"""
+        if self.count == self.capacity:
+            self._resize(self.capacity * 2)
+        slot = self.count
+        ROW.pack_into(self._mm, HEADER.size + slot * ROW.size, user_id, *values)
+        self.count += 1
+        HEADER.pack_into(self._mm, 0, MAGIC, len(INT_FIELDS), self.count)
+        return slot
+    
+    def get(self, slot: int, index: int) -> int:
+        return FIELD.unpack_from(self._mm, HEADER.size + slot * ROW.size + FIELD.size * (index + 1))[0]
+    
+    def set(self, slot: int, index: int, value: int):
+        FIELD.pack_into(self._mm, HEADER.size + slot * ROW.size + FIELD.size * (index + 1), value)
+    
+    def adopt(self, user_id_str: str, record: PlayerRecord) -> PlayerRecord:
+        """Move a record's hot fields into the table, return the mapped record
+        
+        Records whose id or counters don't fit in int64 are returned unchanged.
+        """
+        try:
+            slot = self.allocate(int(user_id_str), [getattr(record, name) for name in INT_FIELDS])
+        except (struct.error, ValueError):
+            return record
+        
+        mapped = MappedPlayerRecord.__new__(MappedPlayerRecord)
+        mapped._table = self
+        mapped._slot = slot
+        for name in TIME_FIELDS + ("_boosts", "_achievements", "_extra"):
+            setattr(mapped, name, getattr(record, name))
+        return mapped
+
+def _hot_field(index: int, name: str) -> property:
+    """Property reading/writing ``name`` in the table row, or the plain slot once detached"""
+    member = PlayerRecord.__dict__[name]
+    
+    def get(self) -> Any:
+        if self._slot >= 0:
+            return self._table.get(self._slot, index)
+        return member.__get__(self, type(self))
+    
+    def set(self, value: Any):
+        if self._slot >= 0:
+            try:
+                self._table.set(self._slot, index, value)
+                return
+            except struct.error:
+                # Not an int64 (huge or non-integer value): keep it on the heap from now on
+                self._detach()
+        member.__set__(self, value)
+    
+    return property(get, set)
+
+class MappedPlayerRecord(PlayerRecord):
+    """``PlayerRecord`` whose ``INT_FIELDS`` live in a ``HotFieldTable`` row"""
+    
+    __slots__ = ("_table", "_slot")
+    
+    def _detach(self):
+        """Copy the counters back into the record and stop using the table row"""
+        values = [self._table.get(self._slot, index) for index in range(len(INT_FIELDS))]
+        for name, value in zip(INT_FIELDS, values):
+            PlayerRecord.__dict__[name].__set__(self, value)
+        # Only switch over once the values are in place, for readers in other threads
+        self._slot = -1
+
+for _index, _name in enumerate(INT_FIELDS):
+    setattr(MappedPlayerRecord, _name, _hot_field(_index, _name))
@@ -0,0 +1,86 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional, Tuple
+from config import IDEMPOTENCY_SIZE, IDEMPOTENCY_TTL
+
+# Returned by ``IdempotencyTable.get`` for keys without a stored result
+MISSING = object()
+
+def idempotency_key(interaction_id: Optional[int], reason: str) -> Optional[str]:
+    """Key for one money-moving step of an interaction, or None without an interaction id
+    
+    The reason is part of the key because one command can move money more
+    than once (``/buy`` debits the price, a loot box then credits the reward).
+    """
+    if interaction_id is None:
+        return None
+    return f"{interaction_id}:{reason}"
+
+class IdempotencyTable:
+    """Results of money-moving store calls, kept for ``ttl`` seconds
+    
+    A store checks ``get`` before applying a call that carries an
+    interaction id and ``put``s the result once it has been applied, so a
+    retried or double-submitted interaction returns the original result
+    instead of moving money again. At most ``maxsize`` results are kept,
+    oldest dropped first. Expiry times are wall-clock (epoch) seconds so
+    stored entries stay valid across restarts.
+    
+    Entries are inserted in expiry order, so expired ones are always at the
+    front: ``put`` drops them there and both calls are O(1) amortized.
+    """
+    
+    def __init__(self, maxsize: int = IDEMPOTENCY_SIZE, ttl: float = IDEMPOTENCY_TTL):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()  # key -> (expires, result)
+        self.replayed = 0
+    
+    def get(self, key: str) -> Any:
+        """Stored result for ``key``, or ``MISSING``"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISSING
+        if entry[0] <= time.time():
+            del self._entries[key]
+            return MISSING
+        self.replayed += 1
+        return entry[1]
+    
+    def put(self, key: str, result: Any, expires: Optional[float] = None) -> float:
+        """Store the result of an applied call, return its expiry time"""
+        now = time.time()
+        if expires is None:
+            expires = now + self.ttl
+        elif expires <= now:
+            return expires
+        
+        entries = self._entries
+        entries.pop(key, None)
+        entries[key] = (expires, result)
+        while entries:
+            oldest_key, (oldest_expires, _) = next(iter(entries.items()))
+            if oldest_expires > now and len(entries) <= self.maxsize:
+                break
+            del entries[oldest_key]
+        return expires
+    
+    def load(self, entries: Dict[str, Any]):
+        """Add persisted ``key -> [expires, result]`` entries, skipping expired ones"""
+        for key, (expires, result) in sorted(entries.items(), key=lambda item: item[1][0]):
+            self.put(key, result, expires)
+    
+    def items(self) -> Iterator[Tuple[str, Tuple[float, Any]]]:
+        """Live ``(key, (expires, result))`` pairs, for snapshots"""
+        now = time.time()
+        return ((key, entry) for key, entry in self._entries.items() if entry[0] > now)
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> Dict[str, int]:
+        """Stored results and how many calls were answered from them"""
+        return {"size": len(self._entries), "maxsize": self.maxsize, "replayed": self.replayed}
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import os
+from typing import Any, Dict, Iterator, List, Tuple
+
+class Journal:
+    """Append-only write-ahead log of store mutations
+    
+    Each record is one compact JSON line ``[kind, key, data]`` where ``kind`` is
+    ``"p"`` (player), ``"g"`` (guild) or ``"i"`` (result of a money-moving
+    interaction) and ``data`` holds the fields that were set. Records are buffered in memory and written + fsynced together by
+    ``commit()`` (group commit), so the cost per mutation is O(1) regardless of
+    how many players exist. Replaying the records in order over the last
+    snapshot reproduces the current state.
+    
+    ``commit_async()`` does the write and fsync in a worker thread, one
+    commit at a time. Records stay queued until their fsync succeeds: a
+    failed write is cut back off the file and the records are retried by the
+    next commit.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.records = 0  # Records appended since the last rotate
+        self.sealed = 0  # Highest segment number known to be used, even if pruned
+        self._buffer = []
+        self._file = None
+        self._commit_lock = asyncio.Lock()
+    
+    def open(self):
+        """Open the journal for appending"""
+        if self._file is None:
+            self._open_file()
+            self.records = 0
+    
+    def _open_file(self):
+        # Unbuffered, so a failed write leaves nothing behind to be flushed later
+        self._file = open(self.path, "ab", buffering=0)
+        self._trim_torn_tail()
+    
+    def _trim_torn_tail(self):
+        """Drop a partial last line so new records start on a fresh line"""
+        end = self._file.seek(0, os.SEEK_END)
+        with open(self.path, "rb") as f:
+            pos = end
+            while pos > 0:
+                start = max(0, pos - 4096)
+                f.seek(start)
+                chunk = f.read(pos - start)
+                newline = chunk.rfind(b"\n")
+                if newline != -1:
+                    pos = start + newline + 1
+                    break
+                pos = start
+        
+        if pos != end:
+            self._file.truncate(pos)
+    
+    def close(self):
+        """Commit pending records and close the file"""
+        if self._file is not None:
+            self.commit()
+            self._file.close()
+            self._file = None
+    
+    @property
+    def pending(self) -> int:
+        """Number of records waiting for the next commit"""
+        return len(self._buffer)
+    
+    def append(self, kind: str, key: str, data: Dict[str, Any]):
+        """Queue a mutation record for the next group commit"""
+        line = json.dumps([kind, key, data], separators=(",", ":"))
+        self._buffer.append(line.encode("utf-8") + b"\n")
+        self.records += 1
+    
+    def commit(self):
+        """Write and fsync all queued records (blocking; for load and close)"""
+        if not self._buffer or self._file is None:
+            return
+        lines, self._buffer = self._buffer, []
+        try:
+            self._write(self._file, b"".join(lines))
+        except OSError:
+            self._buffer[:0] = lines
+            raise
+    
+    async def commit_async(self):
+        """Write and fsync all queued records in a worker thread
+        
+        Commits run one at a time; records queued while one is in progress
+        go out with the next, which a caller waiting for its own records
+        then issues.
+        """
+        async with self._commit_lock:
+            await self._commit_in_thread()
+    
+    async def _commit_in_thread(self):
+        """``commit()`` with the write in a worker thread (caller must hold the commit lock)"""
+        if not self._buffer or self._file is None:
+            return
+        lines, self._buffer = self._buffer, []
+        try:
+            await asyncio.to_thread(self._write, self._file, b"".join(lines))
+        except OSError:
+            # Keep the order: retry these before anything appended meanwhile
+            self._buffer[:0] = lines
+            raise
+    
+    @staticmethod
+    def _write(file, data: bytes):
+        """Append ``data`` to ``file`` and fsync; on failure cut the file back to where it was"""
+        start = file.seek(0, os.SEEK_END)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[file.write(view):]
+            os.fsync(file.fileno())
+        except OSError:
+            try:
+                file.truncate(start)
+            except OSError:
+                pass
+            raise
+    
+    async def rotate_async(self) -> str:
+        """Seal the current journal as the next numbered segment and start a new one
+        
+        Used when a snapshot is about to be written off the event loop: records
+        in the sealed segment are covered by that snapshot, while records
+        appended meanwhile go to the fresh journal.
+        
+        The queued records are taken on the event loop, then written, fsynced
+        and sealed in a worker thread (once no commit is in progress); records
+        appended meanwhile wait in the queue. Only reopening the journal
+        happens back on the event loop.
+        """
+        async with self._commit_lock:
+            lines, self._buffer = self._buffer, []
+            file, self._file = self._file, None
+            records, self.records = self.records, 0
+            try:
+                if lines:
+                    await asyncio.to_thread(self._write, file, b"".join(lines))
+            except OSError:
+                self._buffer[:0] = lines
+                self.records += records
+                self._file = file
+                raise
+            try:
+                segment_path = await asyncio.to_thread(self._seal, file)
+            finally:
+                # On failure the records are already on disk: keep appending to the same file
+                self._open_file()
+            return segment_path
+    
+    def _seal(self, file) -> str:
+        """Close the journal and rename it to the next segment (worker thread)"""
+        file.close()
+        segments = self.segments()
+        number = max(self.segment_number(segments[-1]) if segments else 0, self.sealed) + 1
+        segment_path = f"{self.path}.{number}"
+        os.replace(self.path, segment_path)
+        self.sealed = number
+        return segment_path
+    
+    @staticmethod
+    def segment_number(segment_path: str) -> int:
+        """Sequence number of a sealed segment path"""
+        return int(segment_path.rsplit(".", 1)[1])
+    
+    def segments(self) -> List[str]:
+        """Sealed segment paths, oldest first"""
+        directory = os.path.dirname(self.path) or "."
+        prefix = os.path.basename(self.path) + "."
+        numbers = []
+        for name in os.listdir(directory):
+            suffix = name[len(prefix):]
+            if name.startswith(prefix) and suffix.isdigit():
+                numbers.append(int(suffix))
+        return [f"{self.path}.{n}" for n in sorted(numbers)]
+    
+    def prune(self, keep: int):
+        """Delete all but the newest ``keep`` sealed segments"""
+        segments = self.segments()
+        for segment_path in segments[:max(0, len(segments) - keep)]:
+            os.remove(segment_path)
+    
+    @staticmethod
+    def replay(path: str) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """Yield ``(kind, key, data)`` records from a journal file
+        
+        A torn final line (crash during append) or a corrupt record is skipped.
+        """
+        if not os.path.exists(path):
+            return
+        
+        skipped = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    kind, key, data = json.loads(line)
+                except (ValueError, TypeError):
+                    skipped += 1
+                    continue
+                yield kind, key, data
+        
+        if skipped:
+            print(f"Skipped {skipped} unreadable journal record(s) in {path}")
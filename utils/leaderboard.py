@@ -0,0 +1,212 @@
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Metrics offered by /leaderboard; each gets its own index
+LEADERBOARD_METRICS = ("balance", "total_won", "games_played", "vote_count")
+_MISSING = object()
+
+class SortedBuckets:
+    """Sorted list split into buckets of at most ``2 * load`` items
+    
+    Inserting or removing bisects the list of bucket maxima and then the
+    one bucket, so the memmove is bounded by the bucket size instead of the
+    whole list; iterating from the start walks the buckets in order, so the
+    first k items cost O(k).
+    
+    Positions come from a Fenwick tree over the bucket sizes: ``index`` and
+    ``islice`` are O(log n). The tree is kept up to date on insert/remove
+    and rebuilt in O(n / load) only after a bucket is split or dropped.
+    """
+    
+    def __init__(self, items: Iterable = (), load: int = 1000):
+        self.load = load
+        self._buckets: List[list] = []
+        self._maxes: list = []
+        self._len = 0
+        self._tree: Optional[List[int]] = None
+        self.rebuild(items)
+    
+    def rebuild(self, items: Iterable):
+        """Replace the contents with ``items`` (sorted once, in bulk)"""
+        values = sorted(items)
+        self._buckets = [values[i:i + self.load] for i in range(0, len(values), self.load)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._len = len(values)
+        self._tree = None
+    
+    def _fenwick(self) -> List[int]:
+        """Fenwick tree of bucket sizes (1-based), built on demand"""
+        if self._tree is None:
+            tree = [0] + [len(bucket) for bucket in self._buckets]
+            for i in range(1, len(tree)):
+                parent = i + (i & -i)
+                if parent < len(tree):
+                    tree[parent] += tree[i]
+            self._tree = tree
+        return self._tree
+    
+    def _resized(self, index: int, delta: int):
+        """Bucket ``index`` grew or shrank by ``delta`` items"""
+        tree = self._tree
+        if tree is None:
+            return
+        i = index + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+    
+    def _locate(self, position: int) -> Tuple[int, int]:
+        """``(bucket, offset)`` of the item at ``position`` (0 <= position < len)"""
+        tree = self._fenwick()
+        index = 0
+        step = 1 << (len(tree).bit_length() - 1)
+        while step:
+            following = index + step
+            if following < len(tree) and tree[following] <= position:
+                index = following
+                position -= tree[following]
+            step >>= 1
+        return index, position
+    
+    def index(self, value: Any) -> int:
+        """Position of ``value`` (ValueError if missing)"""
+        bucket_index = bisect_left(self._maxes, value)
+        if bucket_index < len(self._maxes):
+            bucket = self._buckets[bucket_index]
+            offset = bisect_left(bucket, value)
+            if offset < len(bucket) and bucket[offset] == value:
+                tree = self._fenwick()
+                before = 0
+                i = bucket_index
+                while i:
+                    before += tree[i]
+                    i -= i & -i
+                return before + offset
+        raise ValueError(f"{value!r} not in list")
+    
+    def islice(self, start: int, stop: int) -> Iterator:
+        """Items at positions ``start`` to ``stop - 1``"""
+        start = max(0, start)
+        stop = min(stop, self._len)
+        if start >= stop:
+            return
+        bucket_index, offset = self._locate(start)
+        remaining = stop - start
+        for bucket in self._buckets[bucket_index:]:
+            chunk = bucket[offset:offset + remaining]
+            yield from chunk
+            remaining -= len(chunk)
+            if not remaining:
+                return
+            offset = 0
+    
+    def add(self, value: Any):
+        if not self._buckets:
+            self._buckets.append([value])
+            self._maxes.append(value)
+            self._len = 1
+            self._tree = None
+            return
+        
+        index = bisect_right(self._maxes, value)
+        if index == len(self._maxes):
+            index -= 1
+            self._buckets[index].append(value)
+            self._maxes[index] = value
+        else:
+            insort(self._buckets[index], value)
+        self._len += 1
+        
+        bucket = self._buckets[index]
+        if len(bucket) > 2 * self.load:
+            # Split the bucket in half
+            self._buckets.insert(index + 1, bucket[self.load:])
+            del bucket[self.load:]
+            self._maxes.insert(index, bucket[-1])
+            self._tree = None
+        else:
+            self._resized(index, 1)
+    
+    def remove(self, value: Any):
+        """Remove one occurrence of ``value`` (ValueError if missing)"""
+        index = bisect_left(self._maxes, value)
+        if index == len(self._maxes):
+            raise ValueError(f"{value!r} not in list")
+        bucket = self._buckets[index]
+        position = bisect_left(bucket, value)
+        if position == len(bucket) or bucket[position] != value:
+            raise ValueError(f"{value!r} not in list")
+        
+        del bucket[position]
+        self._len -= 1
+        if not bucket:
+            del self._buckets[index]
+            del self._maxes[index]
+            self._tree = None
+            return
+        if position == len(bucket):
+            self._maxes[index] = bucket[-1]
+        self._resized(index, -1)
+    
+    def __iter__(self) -> Iterator:
+        for bucket in self._buckets:
+            yield from bucket
+    
+    def __len__(self) -> int:
+        return self._len
+
+class LeaderboardIndex:
+    """Players ordered by one metric, highest first, kept up to date on every change
+    
+    Entries are ``(-value, user_id)`` tuples in a ``SortedBuckets``, so ties
+    are broken by the lower user id. The current value of each player is
+    remembered so the old entry can be found and replaced on update.
+    """
+    
+    def __init__(self, metric: str):
+        self.metric = metric
+        self._values: Dict[int, Any] = {}
+        self._entries = SortedBuckets()
+    
+    def rebuild(self, players: Iterable[Tuple[str, Any]]):
+        """Re-index every ``(user_id, record)`` pair"""
+        metric = self.metric
+        self._values = {int(key): record[metric] for key, record in players if metric in record}
+        self._entries.rebuild((-value, user_id) for user_id, value in self._values.items())
+    
+    def update(self, user_id: int, value: Any):
+        """Move a player to their new value (adds players not indexed yet)"""
+        old = self._values.get(user_id, _MISSING)
+        if old is not _MISSING:
+            if old == value:
+                return
+            self._entries.remove((-old, user_id))
+        self._values[user_id] = value
+        self._entries.add((-value, user_id))
+    
+    def discard(self, user_id: int):
+        """Drop a player from the index if present"""
+        old = self._values.pop(user_id, _MISSING)
+        if old is not _MISSING:
+            self._entries.remove((-old, user_id))
+    
+    def top(self, limit: int) -> List[Tuple[int, Any]]:
+        """``(user_id, value)`` for the ``limit`` highest players"""
+        return [(user_id, -value) for value, user_id in islice(self._entries, max(0, limit))]
+    
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based position of a player, or None if not indexed (O(log n))"""
+        value = self._values.get(user_id, _MISSING)
+        if value is _MISSING:
+            return None
+        return self._entries.index((-value, user_id)) + 1
+    
+    def around(self, rank: int, above: int, below: int) -> List[Tuple[int, int, Any]]:
+        """``(rank, user_id, value)`` from ``above`` places before ``rank`` to ``below`` after it"""
+        start = max(1, rank - above)
+        entries = self._entries.islice(start - 1, rank + below)
+        return [(start + i, user_id, -value) for i, (value, user_id) in enumerate(entries)]
+    
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,182 @@
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from config import LEDGER_PATH, LEDGER_FLUSH_INTERVAL, LEDGER_FLUSH_THRESHOLD
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS ledger (
+        id INTEGER PRIMARY KEY,
+        ts REAL NOT NULL,
+        user_id INTEGER NOT NULL,
+        delta INTEGER NOT NULL,
+        reason TEXT NOT NULL,
+        game TEXT,
+        interaction_id INTEGER
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_ledger_user_ts ON ledger (user_id, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_ledger_ts ON ledger (ts)",
+]
+
+INSERT_ENTRY = "INSERT INTO ledger (ts, user_id, delta, reason, game, interaction_id) VALUES (?, ?, ?, ?, ?, ?)"
+
+class Ledger:
+    """Append-only record of every balance change, for audits and disputes
+    
+    Each entry is ``(timestamp, user, delta, reason, game, interaction id)``.
+    ``record`` only appends a tuple to an in-memory buffer; a background task
+    writes the buffer to its own SQLite file (``data/ledger.db``) with one
+    ``executemany`` per batch every ``flush_interval`` seconds, or sooner once
+    ``flush_threshold`` entries are waiting, on a worker thread. ``close()``
+    writes whatever is left. Entries are never updated or deleted.
+    
+    ``history`` reads by user and/or time range through the
+    ``(user_id, ts)`` and ``(ts)`` indexes, after flushing the buffer so
+    the answer includes the latest changes.
+    """
+    
+    def __init__(self, path: str = LEDGER_PATH,
+                 flush_interval: float = LEDGER_FLUSH_INTERVAL,
+                 flush_threshold: int = LEDGER_FLUSH_THRESHOLD):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.recorded = 0  # Entries recorded since start
+        self.written = 0   # ...and written to disk
+        self._buffer: List[tuple] = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ledger")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._flush_lock = asyncio.Lock()
+        self._flush_event = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._closing = False
+    
+    def start(self):
+        """Start the background flusher"""
+        if self._flush_task is None:
+            self._closing = False
+            self._flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def close(self):
+        """Stop the background flusher, write pending entries and close the file"""
+        if self._flush_task is not None:
+            self._closing = True
+            self._flush_event.set()
+            await self._flush_task
+            self._flush_task = None
+        
+        await self.flush()
+        
+        def _close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        
+        await asyncio.get_running_loop().run_in_executor(self._executor, _close)
+        self._executor.shutdown(wait=True)
+    
+    @property
+    def pending(self) -> int:
+        """Entries waiting for the next flush"""
+        return len(self._buffer)
+    
+    def record(self, user_id: int, delta: int, reason: str,
+               game: Optional[str] = None, interaction_id: Optional[int] = None):
+        """Queue one balance change (O(1), never touches the disk)"""
+        if not delta:
+            return
+        self._buffer.append((time.time(), user_id, delta, reason, game, interaction_id))
+        self.recorded += 1
+        if len(self._buffer) >= self.flush_threshold:
+            self._flush_event.set()
+    
+    async def flush(self):
+        """Write all buffered entries in one transaction"""
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            entries, self._buffer = self._buffer, []
+            try:
+                await self._run(self._insert, entries)
+                self.written += len(entries)
+            except Exception as e:
+                print(f"Error writing ledger: {e}")
+                # Keep the order: retry these before anything recorded meanwhile
+                self._buffer[:0] = entries
+    
+    async def history(self, user_id: Optional[int] = None, since: Optional[float] = None,
+                      until: Optional[float] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Newest entries first, filtered by user and/or ``since <= ts < until`` (epoch seconds)"""
+        await self.flush()
+        
+        conditions = []
+        params: list = []
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if since is not None:
+            conditions.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("ts < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = (
+            "SELECT ts, user_id, delta, reason, game, interaction_id FROM ledger "
+            f"{where} ORDER BY ts DESC, id DESC LIMIT ?"
+        )
+        params.append(limit)
+        
+        def _history(conn):
+            return conn.execute(query, params).fetchall()
+        
+        rows = await self._run(_history)
+        return [
+            {"ts": ts, "user_id": uid, "delta": delta, "reason": reason, "game": game, "interaction_id": iid}
+            for ts, uid, delta, reason, game, iid in rows
+        ]
+    
+    def stats(self) -> Dict[str, int]:
+        """Entry counters"""
+        return {"recorded": self.recorded, "written": self.written, "pending": len(self._buffer)}
+    
+    async def _flush_loop(self):
+        """Flush every flush_interval seconds, or early when the threshold is hit"""
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            if self._closing:
+                break
+            await self.flush()
+    
+    async def _run(self, func, *args):
+        """Run ``func(conn, *args)`` on the ledger thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, func, args)
+    
+    def _call(self, func, args):
+        if self._conn is None:
+            self._connect()
+        with self._conn:
+            return func(self._conn, *args)
+    
+    def _connect(self):
+        """Open the file and create the schema (ledger thread)"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+    
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, entries: List[tuple]):
+        conn.executemany(INSERT_ENTRY, entries)
@@ -0,0 +1,73 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+from config import DB_LOCK_STRIPES
+
+class LockStripes:
+    """Fixed pool of asyncio locks picked by hashing a key (e.g. a user id)
+    
+    Operations on different keys usually land on different stripes and run
+    concurrently, while every operation on the same key is serialized. Each
+    stripe records how often it was acquired, how often a caller had to wait
+    and the total/max time spent waiting, so hot stripes can be spotted.
+    """
+    
+    def __init__(self, stripes: int = DB_LOCK_STRIPES):
+        self.size = max(1, stripes)
+        self._locks = [asyncio.Lock() for _ in range(self.size)]
+        self._acquired = [0] * self.size
+        self._contended = [0] * self.size
+        self._wait_total = [0.0] * self.size
+        self._wait_max = [0.0] * self.size
+    
+    def stripe(self, key: Any) -> int:
+        """Stripe index for a key"""
+        return hash(key) % self.size
+    
+    @asynccontextmanager
+    async def hold(self, *keys: Any):
+        """Hold the stripes for all keys, acquired in ascending stripe order
+        
+        The fixed order means two callers locking the same pair of keys can
+        never deadlock, whichever order they pass the keys in.
+        """
+        stripes = sorted({self.stripe(key) for key in keys})
+        held = []
+        try:
+            for index in stripes:
+                await self._acquire(index)
+                held.append(index)
+            yield
+        finally:
+            for index in reversed(held):
+                self._locks[index].release()
+    
+    async def _acquire(self, index: int):
+        lock = self._locks[index]
+        self._acquired[index] += 1
+        if not lock.locked():
+            await lock.acquire()
+            return
+        
+        self._contended[index] += 1
+        started = time.perf_counter()
+        await lock.acquire()
+        waited = time.perf_counter() - started
+        self._wait_total[index] += waited
+        if waited > self._wait_max[index]:
+            self._wait_max[index] = waited
+    
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-stripe counters for every stripe that has been used"""
+        return [
+            {
+                "stripe": index,
+                "acquired": self._acquired[index],
+                "contended": self._contended[index],
+                "wait_total": self._wait_total[index],
+                "wait_max": self._wait_max[index]
+            }
+            for index in range(self.size)
+            if self._acquired[index]
+        ]
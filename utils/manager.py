@@ -1,157 +1,1083 @@
-import json
 import asyncio
+import copy
+import itertools
+import json
 import os
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
-from config import STARTING_BALANCE, STARTING_CRYPTO
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from config import (
+    STARTING_BALANCE, STARTING_CRYPTO,
+    DB_WRITE_BEHIND, DB_FLUSH_INTERVAL, DB_FLUSH_THRESHOLD,
+    DB_JOURNAL, DB_JOURNAL_COMMIT_INTERVAL, DB_COMPACT_RECORDS, DB_COMPACT_INTERVAL,
+    DB_SNAPSHOT_FORMAT, DB_HOT_FIELDS, DB_STREAM_LOAD, DB_LOAD_BATCH, DB_LOAD_PROGRESS_INTERVAL,
+    DATABASE_BACKEND, GUILD_LEADERBOARD_CACHE_SIZE
+)
+from utils.journal import Journal
+from utils.snapshots import SnapshotWriter
+from utils.binary_snapshot import BinarySnapshot
+from utils.hotfields import HotFieldTable
+from utils.idempotency import IdempotencyTable, MISSING, idempotency_key
+from utils.ledger import Ledger
+from utils.leaderboard import LeaderboardIndex, LEADERBOARD_METRICS
+from utils.locks import LockStripes
+from utils.records import PlayerRecord
+
+# Player fields as columns of the SQL backends' players table; the integer ones change on every bet
+HOT_COLUMNS = ["balance", "crypto", "total_won", "total_lost", "games_played", "vote_count"]
+TEXT_COLUMNS = [
+    "last_daily", "last_weekly", "last_monthly", "last_yearly",
+    "last_work", "last_overtime", "last_spin", "last_vote", "created_at"
+]
+JSON_COLUMNS = ["boosts", "achievements"]
+PLAYER_COLUMNS = HOT_COLUMNS + TEXT_COLUMNS + JSON_COLUMNS
+# Columns the leaderboards sort by, indexed in SQL
+INDEXED_COLUMNS = ["balance", "total_won", "games_played", "vote_count"]
+
+def default_player() -> Dict[str, Any]:
+    """Fresh player record with starting balances"""
+    return {
+        "balance": STARTING_BALANCE,
+        "crypto": STARTING_CRYPTO,
+        "total_won": 0,
+        "total_lost": 0,
+        "games_played": 0,
+        "last_daily": None,
+        "last_weekly": None,
+        "last_monthly": None,
+        "last_yearly": None,
+        "last_work": None,
+        "last_overtime": None,
+        "last_spin": None,
+        "last_vote": None,
+        "vote_count": 0,
+        "created_at": datetime.now().isoformat(),
+        "boosts": {},
+        "achievements": []
+    }
+
+def reset_fields() -> Dict[str, Any]:
+    """What ``reset_player`` sets: a fresh player's fields, except when it was created"""
+    fields = default_player()
+    del fields["created_at"]
+    return fields
+
+def bet_stats(stake: int, payout: int, stats_delta: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """Counter increments for one settled bet; ``stats_delta`` overrides or extends them"""
+    profit = payout - stake
+    delta = {
+        "games_played": 1,
+        "total_won": profit if profit > 0 else 0,
+        "total_lost": -profit if profit < 0 else 0
+    }
+    if stats_delta:
+        delta.update(stats_delta)
+    return delta
+
+def default_guild() -> Dict[str, Any]:
+    """Fresh guild configuration with default settings"""
+    return {
+        "channels": {
+            "general": None,
+            "games": None,
+            "leaderboard": None,
+            "announcements": None,
+            "logs": None
+        },
+        "admin_ids": [],
+        "currency_emoji": "🪙",
+        "currency_name": "coins",
+        "crypto_emoji": "💎",
+        "crypto_name": "gems",
+        "disable_update_messages": False,
+        "created_at": datetime.now().isoformat()
+    }
 
 class Database:
-    """Simple JSON-based database for player and guild data"""
+    """Simple JSON-based database for player and guild data
+    
+    A single instance is owned by the bot (``bot.db``) and shared by every cog,
+    so it holds the only in-memory copy of the data. Player operations hold
+    the lock stripe for their user id (see ``utils.locks``), so different
+    users run concurrently while each user's read-check-write sequence stays
+    atomic; ``lock_stats()`` reports wait times per stripe. Guild operations,
+    loading and persistence use the store-wide ``self._lock``.
+    
+    Players are kept as ``utils.records.PlayerRecord`` objects (slotted,
+    epoch timestamps) that read and update like the old player dicts.
+    
+    Reads that must not create a player (profile lookups, bet validation)
+    use ``peek_player``; a record is only stored on its first mutation, so
+    snapshots and leaderboards only contain people who actually played.
     
-    def __init__(self):
-        self.players_file = "data/players.json"
+    The files are read once (on ``start()`` or first use) and all reads are
+    served from memory afterwards. Mutations mark the touched records dirty;
+    with ``write_behind`` enabled a background task writes them out every
+    ``flush_interval`` seconds, or sooner once ``flush_threshold`` records are
+    dirty, and ``close()`` flushes whatever is left. Without ``write_behind``
+    every mutation triggers a flush immediately.
+    
+    With ``journal`` enabled, mutations are appended to an append-only
+    journal (see ``utils.journal``) instead of rewriting the JSON files, and
+    each flush is a single group commit. The JSON files become snapshots: the
+    journal is folded into them once it holds ``compact_records`` records or
+    ``compact_interval`` seconds have passed, and replayed over them on load.
+    
+    Snapshots are written by ``utils.snapshots.SnapshotWriter`` in a worker
+    thread (temp file, fsync, atomic rename), keeping the last few
+    generations; loading falls back to the newest one that is readable.
+    With ``snapshot_format="binary"`` players are stored in the columnar
+    ``utils.binary_snapshot`` format (``data/players.bin``) instead of JSON.
+    With ``hot_fields`` the per-bet counters (balance, totals, ...) are kept
+    in a memory-mapped ``utils.hotfields.HotFieldTable`` that is rebuilt from
+    the snapshot and journal on load.
+    
+    With ``stream_load`` the players snapshot is parsed in batches in a worker
+    thread after ``start()`` returns. Players that have already been loaded
+    are served right away; anything that needs a player not loaded yet (or
+    the whole set, like leaderboards and snapshots) waits for the load.
+    
+    The ``/leaderboard`` metrics are kept in ``utils.leaderboard`` indexes
+    that every mutation updates in O(log n), so a top-k read costs O(k)
+    instead of sorting every player. Players list the guilds they play in
+    (``add_guild_member``); each guild gets its own indexes over just its
+    members the first time its server leaderboard is asked for.
+    
+    With a ``ledger`` (``utils.ledger.Ledger``) every balance change made by
+    ``add_balance``, ``subtract_balance``, ``settle_bet``, ``transfer`` and
+    ``reset_player`` is recorded
+    along with the reason, game and interaction id the caller passes. Those
+    calls are idempotent per interaction id and reason: the result is kept
+    for ``IDEMPOTENCY_TTL`` seconds (``utils.idempotency``, journaled and
+    snapshotted to ``data/idempotency.json``) and a retried interaction gets
+    it back instead of moving money twice.
+    """
+    
+    def __init__(self, write_behind: bool = DB_WRITE_BEHIND,
+                 journal: bool = DB_JOURNAL,
+                 flush_interval: Optional[float] = None,
+                 flush_threshold: int = DB_FLUSH_THRESHOLD,
+                 compact_records: int = DB_COMPACT_RECORDS,
+                 compact_interval: float = DB_COMPACT_INTERVAL,
+                 snapshot_format: str = DB_SNAPSHOT_FORMAT,
+                 hot_fields: bool = DB_HOT_FIELDS,
+                 stream_load: bool = DB_STREAM_LOAD,
+                 ledger: Optional[Ledger] = None):
+        self._players_codec = BinarySnapshot if snapshot_format == "binary" else None
+        self.players_file = "data/players.bin" if self._players_codec else "data/players.json"
+        self.json_players_file = "data/players.json"
         self.guilds_file = "data/guilds.json"
+        self.journal_file = "data/journal.jsonl"
+        self.hot_fields_file = "data/hotfields.bin"
+        self.idempotency_file = "data/idempotency.json"
+        self.snapshot_meta_file = "data/snapshot.json"
+        self.write_behind = write_behind
+        if flush_interval is None:
+            flush_interval = DB_JOURNAL_COMMIT_INTERVAL if journal else DB_FLUSH_INTERVAL
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.compact_records = compact_records
+        self.compact_interval = compact_interval
+        self.stream_load = stream_load
+        self.ledger = ledger
+        self._idempotency = IdempotencyTable()
         self._players_cache = {}
         self._guilds_cache = {}
+        self._leaderboards = {metric: LeaderboardIndex(metric) for metric in LEADERBOARD_METRICS}
+        self._guild_members: Dict[str, set] = {}
+        self._player_guilds: Dict[str, frozenset] = {}  # Guilds each player is indexed under
+        self._guild_admins: Dict[str, frozenset] = {}
+        # Least recently used guild's indexes are dropped first
+        self._guild_leaderboards: "OrderedDict[str, Dict[str, LeaderboardIndex]]" = OrderedDict()
         self._lock = asyncio.Lock()
+        self._player_locks = LockStripes()
+        self._loaded = False
+        self._load_complete = asyncio.Event()
+        self._load_task: Optional[asyncio.Task] = None
+        self._dirty_players = set()
+        self._guilds_dirty = False
+        self._snapshots = SnapshotWriter()
+        self._journal: Optional[Journal] = Journal(self.journal_file) if journal else None
+        self._hot_fields: Optional[HotFieldTable] = HotFieldTable(self.hot_fields_file) if hot_fields else None
+        self._last_compaction = time.monotonic()
+        self._flush_event = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._snapshot_lock = asyncio.Lock()
+        self._compaction_task: Optional[asyncio.Task] = None
     
-    async def load_data(self):
-        """Load data from JSON files into cache"""
+    @classmethod
+    def in_memory(cls, players: Optional[Dict[str, Any]] = None, **options) -> "Database":
+        """A loaded store holding just ``players`` (``{user_id: record}``), for benchmarks and scripts
+        
+        No files are read, and nothing is written unless ``start()`` is
+        called (which starts the background flusher).
+        """
+        options = {"write_behind": True, "journal": False, "stream_load": False, **options}
+        db = cls(**options)
+        db._players_cache = {
+            key: data if isinstance(data, PlayerRecord) else PlayerRecord.from_dict(data)
+            for key, data in (players or {}).items()
+        }
+        db._loaded = True
+        db._rebuild_leaderboards()
+        db._load_complete.set()
+        return db
+    
+    async def start(self):
+        """Start loading the data and the background flusher
+        
+        With ``stream_load`` this returns once guilds and the journal are
+        loaded; players keep streaming in from the snapshot in the background
+        (see ``_stream_players``) and are served as soon as they arrive.
+        """
         async with self._lock:
+            if not self._loaded:
+                if self.stream_load:
+                    self._begin_stream_load()
+                else:
+                    self._load_data()
+        
+        if self._flush_task is None:
+            self._closing = False
+            self._flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def close(self):
+        """Stop the background flusher and write out pending changes"""
+        if self._load_task is not None:
+            await self._load_task
+        
+        if self._flush_task is not None:
+            # Ask the flusher to stop rather than cancelling it: a cancel can be
+            # swallowed by wait_for() (Python 3.11) or interrupt a flush mid-write
+            self._closing = True
+            self._flush_event.set()
+            await self._flush_task
+            self._flush_task = None
+        
+        if self._compaction_task is not None:
+            await self._compaction_task
+        
+        if self._journal is not None:
+            if self._loaded and (self._journal.records or self._journal.pending):
+                await self.compact()
+            self._journal.close()
+        else:
+            await self.flush()
+        
+        if self._hot_fields is not None:
+            self._hot_fields.close()
+    
+    async def flush(self):
+        """Write pending changes to disk"""
+        if self._journal is not None:
+            await self._commit_journal()
+            
+            if self._compaction_due() and self._compaction_task is None and self._load_complete.is_set():
+                self._compaction_task = asyncio.create_task(self._run_compaction())
+            return
+        
+        if not self._load_complete.is_set():
+            # A snapshot of a partially loaded store would drop players
+            return
+        
+        async with self._snapshot_lock:
+            async with self._lock:
+                dirty_players, self._dirty_players = self._dirty_players, set()
+                dirty_guilds, self._guilds_dirty = self._guilds_dirty, False
+                guilds = self._copy_guilds() if dirty_guilds else None
+            
             try:
-                if os.path.exists(self.players_file):
-                    with open(self.players_file, 'r') as f:
-                        self._players_cache = json.load(f)
-                
-                if os.path.exists(self.guilds_file):
-                    with open(self.guilds_file, 'r') as f:
-                        self._guilds_cache = json.load(f)
+                await self._write_snapshot(bool(dirty_players), guilds)
             except Exception as e:
-                print(f"Error loading data: {e}")
-                self._players_cache = {}
-                self._guilds_cache = {}
+                print(f"Error saving data: {e}")
+                # Retry on the next flush
+                async with self._lock:
+                    self._dirty_players |= dirty_players
+                    self._guilds_dirty = self._guilds_dirty or dirty_guilds
+    
+    async def compact(self):
+        """Fold the journal into fresh snapshot files"""
+        await self._wait_loaded()
+        async with self._snapshot_lock:
+            async with self._lock:
+                try:
+                    segment_path = await self._journal.rotate_async()
+                except OSError as e:
+                    print(f"Error committing journal: {e}")
+                    return
+                guilds = self._copy_guilds()
+            
+            try:
+                await self._write_snapshot(True, guilds)
+                # Written last: if it lags behind the snapshots, load just replays more
+                await self._snapshots.save(self.snapshot_meta_file, {"segment": Journal.segment_number(segment_path)})
+            except Exception as e:
+                # Keep the sealed segment: it is still needed to recover these changes
+                print(f"Error compacting journal ({segment_path} kept): {e}")
+                return
+            
+            # Snapshot generations older than the kept segments can no longer be replayed
+            await asyncio.to_thread(self._journal.prune, self._snapshots.generations)
+            self._last_compaction = time.monotonic()
+    
+    async def _run_compaction(self):
+        """Background compaction task"""
+        try:
+            await self.compact()
+        finally:
+            self._compaction_task = None
+    
+    async def _flush_loop(self):
+        """Flush every flush_interval seconds, or early when the threshold is hit"""
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            if self._closing:
+                break
+            await self.flush()
+    
+    def lock_stats(self) -> list:
+        """Per-stripe lock acquisition and wait-time counters for player operations"""
+        return self._player_locks.stats()
+    
+    async def load_data(self):
+        """Load data from JSON files into cache"""
+        await self._wait_loaded()
+        async with self._lock:
+            self._load_data()
     
     async def save_data(self):
         """Save cache data to JSON files"""
-        async with self._lock:
+        await self._wait_loaded()
+        if self._journal is not None:
+            await self.compact()
+            return
+        
+        async with self._snapshot_lock:
+            async with self._lock:
+                self._dirty_players.clear()
+                self._guilds_dirty = False
+                guilds = self._copy_guilds()
             try:
-                with open(self.players_file, 'w') as f:
-                    json.dump(self._players_cache, f, indent=2)
-                
-                with open(self.guilds_file, 'w') as f:
-                    json.dump(self._guilds_cache, f, indent=2)
+                await self._write_snapshot(True, guilds)
             except Exception as e:
                 print(f"Error saving data: {e}")
     
-    async def get_player(self, user_id: int) -> Dict[str, Any]:
-        """Get player data, create if doesn't exist"""
-        await self.load_data()
+    def _ensure_loaded(self):
+        """Load the files on first use (caller must hold the lock)"""
+        if not self._loaded:
+            self._load_data()
+    
+    def _mark_player_dirty(self, user_id_str: str, data: Dict[str, Any], persist: bool = True):
+        """Record a changed player and persist per the write mode (caller must hold the lock)
+        
+        ``persist=False`` skips the write-through, for callers that change
+        several players and persist them together afterwards.
+        """
+        if self._load_complete.is_set():
+            # Until then the indexes are built in one go when loading finishes
+            self._index_player(user_id_str, data)
+        
+        if self._journal is not None:
+            self._journal.append("p", user_id_str, data)
+            pending = self._journal.pending
+        else:
+            self._dirty_players.add(user_id_str)
+            pending = len(self._dirty_players)
+        
+        if not self.write_behind:
+            if persist:
+                self._write_through()
+        elif pending >= self.flush_threshold:
+            self._flush_event.set()
+    
+    def _index_player(self, user_id_str: str, data: Dict[str, Any]):
+        """Move a player in the leaderboards for the metrics in ``data``"""
+        record = self._players_cache[user_id_str]
+        if "guilds" in data:
+            self._index_guilds(user_id_str, record)
+        
+        boards = [self._leaderboards]
+        if self._guild_leaderboards:
+            boards += [
+                self._guild_leaderboards[guild_id_str]
+                for guild_id_str in record.get("guilds", ())
+                if guild_id_str in self._guild_leaderboards
+            ]
+        user_id = int(user_id_str)
+        for metric in LEADERBOARD_METRICS:
+            if metric in data:
+                value = record[metric]
+                for board in boards:
+                    board[metric].update(user_id, value)
+    
+    def _index_guilds(self, user_id_str: str, record: PlayerRecord):
+        """Sync the guild membership index with a player's ``guilds`` list
+        
+        Only the guilds added or removed since the last sync are touched.
+        """
+        guilds = frozenset(record.get("guilds", ()))
+        indexed = self._player_guilds.get(user_id_str, frozenset())
+        if guilds == indexed:
+            return
+        self._player_guilds[user_id_str] = guilds
+        user_id = int(user_id_str)
+        
+        for guild_id_str in indexed - guilds:
+            members = self._guild_members.get(guild_id_str)
+            if members is not None:
+                members.discard(user_id_str)
+                if not members:
+                    del self._guild_members[guild_id_str]
+            for index in self._guild_leaderboards.get(guild_id_str, {}).values():
+                index.discard(user_id)
+        
+        for guild_id_str in guilds - indexed:
+            self._guild_members.setdefault(guild_id_str, set()).add(user_id_str)
+            for metric, index in self._guild_leaderboards.get(guild_id_str, {}).items():
+                index.update(user_id, record[metric])
+    
+    def _rebuild_leaderboards(self):
+        """Index every loaded player from scratch"""
+        for index in self._leaderboards.values():
+            index.rebuild(self._players_cache.items())
+        
+        self._guild_members = {}
+        self._player_guilds = {}
+        for key, record in self._players_cache.items():
+            guilds = frozenset(record.get("guilds", ()))
+            if guilds:
+                self._player_guilds[key] = guilds
+            for guild_id_str in guilds:
+                self._guild_members.setdefault(guild_id_str, set()).add(key)
+        # Per-guild indexes are built again on first use
+        self._guild_leaderboards = OrderedDict()
+    
+    def _guild_leaderboard(self, guild_id_str: str, metric: str) -> LeaderboardIndex:
+        """Index of one guild's members for ``metric``, built on first use
+        
+        At most ``GUILD_LEADERBOARD_CACHE_SIZE`` guilds keep their indexes.
+        """
+        boards = self._guild_leaderboards.get(guild_id_str)
+        if boards is None:
+            members = [(key, self._players_cache[key]) for key in self._guild_members.get(guild_id_str, ())]
+            boards = {}
+            for name in LEADERBOARD_METRICS:
+                boards[name] = LeaderboardIndex(name)
+                boards[name].rebuild(members)
+            self._guild_leaderboards[guild_id_str] = boards
+            while len(self._guild_leaderboards) > max(1, GUILD_LEADERBOARD_CACHE_SIZE):
+                self._guild_leaderboards.popitem(last=False)
+        self._guild_leaderboards.move_to_end(guild_id_str)
+        return boards[metric]
+    
+    def _mark_guilds_dirty(self, guild_id_str: str, data: Dict[str, Any]):
+        """Record a changed guild and persist per the write mode (caller must hold the lock)"""
+        self._guild_admins.pop(guild_id_str, None)
+        if self._journal is not None:
+            self._journal.append("g", guild_id_str, data)
+        else:
+            self._guilds_dirty = True
+        
+        if not self.write_behind:
+            self._write_through()
+    
+    def _write_through(self):
+        """Persist a mutation right away (caller must hold the lock)
+        
+        Journal records are committed by ``_persist`` once the caller has
+        released its lock, so the fsync never runs on the event loop.
+        """
+        if self._journal is None:
+            self._flush_event.set()
+    
+    async def _persist(self):
+        """Without ``write_behind``, wait until the mutations made so far are on disk"""
+        if not self.write_behind and self._journal is not None:
+            await self._commit_journal()
+    
+    @asynccontextmanager
+    async def _mutating(self, *user_ids: int):
+        """Hold the users' lock stripes for a mutation, then ``_persist`` it"""
+        async with self._player_locks.hold(*user_ids):
+            yield
+        await self._persist()
+    
+    async def _commit_journal(self):
+        """Group-commit buffered journal records in a worker thread
+        
+        Records that fail to commit stay queued for the next attempt.
+        """
+        try:
+            await self._journal.commit_async()
+        except OSError as e:
+            print(f"Error committing journal: {e}")
+    
+    def _compaction_due(self) -> bool:
+        """Whether the journal should be folded into a snapshot"""
+        if not self._journal.records:
+            return False
+        if self._journal.records >= self.compact_records:
+            return True
+        return time.monotonic() - self._last_compaction >= self.compact_interval
+    
+    def _copy_guilds(self) -> Dict[str, Any]:
+        """Deep copy of the guild configs for a snapshot (caller must hold the lock)
+        
+        The snapshot thread encodes the copy while the live, nested guild
+        dicts keep changing on the event loop.
+        """
+        return copy.deepcopy(self._guilds_cache)
+    
+    async def _write_snapshot(self, players: bool, guilds: Optional[Dict[str, Any]]):
+        """Write the players snapshot and/or ``guilds`` (a ``_copy_guilds()`` copy) off the event loop"""
+        if players:
+            # Results are stored with the player changes they belong to
+            idempotency = dict(self._idempotency.items())
+            await self._snapshots.save(self.players_file, self._players_cache, codec=self._players_codec)
+            await self._snapshots.save(self.idempotency_file, idempotency)
+        if guilds is not None:
+            await self._snapshots.save(self.guilds_file, guilds)
+    
+    def _load_data(self):
+        """Load data from JSON files (caller must hold the lock)"""
+        self._loaded = True
+        self._guild_admins.clear()
+        if self._hot_fields is not None:
+            # Records already handed out must not point into the table being rebuilt
+            self._hot_fields.release(self._players_cache.values())
+        generations = []
+        try:
+            players, generation = self._snapshots.load_generation(self.players_file, codec=self._players_codec)
+            if players is None and self._players_codec is not None:
+                # First start after switching to binary snapshots
+                players = self._snapshots.load(self.json_players_file)
+            generations.append(generation)
+            self._players_cache = {
+                key: data if isinstance(data, PlayerRecord) else PlayerRecord.from_dict(data)
+                for key, data in (players or {}).items()
+            }
+            guilds, generation = self._snapshots.load_generation(self.guilds_file)
+            generations.append(generation)
+            self._guilds_cache = guilds or {}
+        except Exception as e:
+            print(f"Error loading data: {e}")
+            self._players_cache = {}
+            self._guilds_cache = {}
+            generations.append(None)
+        generations.append(self._load_idempotency())
+        
+        if self._journal is not None:
+            self._replay_journal(covered=self._covered_segment(generations))
+        
+        if self._hot_fields is not None:
+            self._map_hot_fields()
+        self._rebuild_leaderboards()
+        self._load_complete.set()
+    
+    def _begin_stream_load(self):
+        """Load guilds and the journal, then stream players in the background (caller must hold the lock)"""
+        path, codec = self._snapshots.newest(self.players_file), self._players_codec
+        if path is None and codec is not None:
+            # First start after switching to binary snapshots
+            path, codec = self._snapshots.newest(self.json_players_file), None
+        if path is None:
+            self._load_data()
+            return
+        
+        self._loaded = True
+        self._guild_admins.clear()
+        paths = self._snapshots.generation_paths(self.players_file)
+        generations = [paths.index(path) if path in paths else None]
+        try:
+            guilds, generation = self._snapshots.load_generation(self.guilds_file)
+            generations.append(generation)
+            self._guilds_cache = guilds or {}
+        except Exception as e:
+            print(f"Error loading data: {e}")
+            self._guilds_cache = {}
+        generations.append(self._load_idempotency())
+        
+        # Journal changes to players are kept aside and applied to each player
+        # as it streams in (guild changes are applied right away)
+        overlay = {}
+        if self._journal is not None:
+            self._replay_journal(overlay, self._covered_segment(generations))
+        if self._hot_fields is not None:
+            self._hot_fields.path = self.hot_fields_file
+            self._hot_fields.open()
+        
+        self._load_task = asyncio.create_task(self._stream_players(path, codec, overlay))
+    
+    @staticmethod
+    def _next_batch(f, records) -> tuple:
+        """Parse the next batch of snapshot records, return it with the bytes read so far (worker thread)"""
+        batch = [
+            (key, data if isinstance(data, PlayerRecord) else PlayerRecord.from_dict(data))
+            for key, data in itertools.islice(records, DB_LOAD_BATCH)
+        ]
+        return batch, getattr(f, "buffer", f).tell()
+    
+    async def _stream_players(self, path: str, codec, overlay: Dict[str, Dict[str, Any]]):
+        """Insert snapshot players batch by batch, parsing off the event loop"""
+        started = last_report = time.monotonic()
+        size = os.path.getsize(path) or 1
+        loaded = 0
+        try:
+            f, records = self._snapshots.open_records(path, codec=codec)
+        except OSError as e:
+            f = None
+            records = iter(())
+            print(f"Error opening {path}: {e}")
+        try:
+            while True:
+                batch, position = await asyncio.to_thread(self._next_batch, f, records)
+                if not batch:
+                    break
+                for key, record in batch:
+                    changes = overlay.pop(key, None)
+                    if changes:
+                        record.update(changes)
+                    if self._hot_fields is not None:
+                        record = self._hot_fields.adopt(key, record)
+                    self._players_cache[key] = record
+                loaded += len(batch)
+                
+                if time.monotonic() - last_report >= DB_LOAD_PROGRESS_INTERVAL:
+                    last_report = time.monotonic()
+                    print(f"Loading players: {loaded:,} ({min(100, 100 * position // size)}% of {path})")
+        except (OSError, ValueError) as e:
+            print(f"Error streaming {path} ({e}), loading snapshots in full instead")
+            async with self._lock:
+                self._reload_after_failed_stream()
+            return
+        finally:
+            if f is not None:
+                f.close()
+        
+        for key, data in overlay.items():
+            # Players created since the snapshot only exist in the journal
+            record = PlayerRecord.from_dict(data)
+            if self._hot_fields is not None:
+                record = self._hot_fields.adopt(key, record)
+            self._players_cache[key] = record
+        
+        self._rebuild_leaderboards()
+        self._load_complete.set()
+        print(f"Loaded {len(self._players_cache):,} players in {time.monotonic() - started:.1f}s")
+    
+    def _reload_after_failed_stream(self):
+        """Drop the partly streamed players and load the snapshots in full (caller must hold the lock)
+        
+        Players streamed in so far may have changed since. With the journal
+        those changes are in it and the full load replays them; without it
+        the changed players are copied out first and put back on top.
+        """
+        changed = {}
+        if self._journal is None:
+            changed = {key: dict(self._players_cache[key]) for key in self._dirty_players if key in self._players_cache}
+        self._load_data()
+        for key, data in changed.items():
+            record = self._players_cache.get(key)
+            if record is None:
+                record = PlayerRecord.from_dict(data)
+                if self._hot_fields is not None:
+                    record = self._hot_fields.adopt(key, record)
+                self._players_cache[key] = record
+            else:
+                record.update(data)
+            self._index_player(key, data)
+    
+    async def _wait_loaded(self):
+        """Wait for a background load to finish"""
+        if self._loaded and not self._load_complete.is_set():
+            await self._load_complete.wait()
+    
+    async def _wait_for_player(self, user_id: int):
+        """Wait for the background load if this player may not be loaded yet"""
+        if self._loaded and not self._load_complete.is_set() and str(user_id) not in self._players_cache:
+            await self._load_complete.wait()
+    
+    def _load_idempotency(self) -> Optional[int]:
+        """Load stored interaction results (replayed journal records are added on top), return the generation read"""
+        self._idempotency.clear()
+        try:
+            results, generation = self._snapshots.load_generation(self.idempotency_file)
+            self._idempotency.load(results or {})
+            return generation
+        except Exception as e:
+            print(f"Error loading {self.idempotency_file}: {e}")
+            return None
+    
+    def _covered_segment(self, generations: List[Optional[int]]) -> Optional[int]:
+        """Newest journal segment folded into every loaded snapshot, or None to replay them all
+        
+        ``generations`` are the snapshot generations that were loaded; each
+        compaction records the segment it sealed in the matching generation
+        of ``snapshot_meta_file``.
+        """
+        paths = self._snapshots.generation_paths(self.snapshot_meta_file)
+        covered = []
+        for generation in generations:
+            if generation is None:
+                return None
+            try:
+                with open(paths[generation], "r", encoding="utf-8") as f:
+                    covered.append(int(json.load(f)["segment"]))
+            except (OSError, ValueError, KeyError, TypeError):
+                return None
+        return min(covered)
+    
+    def _map_hot_fields(self):
+        """Rebuild the hot-field table from the loaded players (caller must hold the lock)"""
+        self._hot_fields.path = self.hot_fields_file
+        self._hot_fields.open(len(self._players_cache))
+        adopt = self._hot_fields.adopt
+        for key, record in self._players_cache.items():
+            self._players_cache[key] = adopt(key, record)
+    
+    def _replay_journal(self, overlay: Optional[Dict[str, Dict[str, Any]]] = None, covered: Optional[int] = None):
+        """Apply journal segments and the live journal over the loaded snapshot (caller must hold the lock)
+        
+        With ``overlay`` the player changes are merged into it per user id
+        instead, for players that haven't been loaded yet. Segments up to
+        ``covered`` are already in the snapshot and are skipped; older ones
+        are only kept for falling back to an older snapshot generation.
+        """
+        self._journal.commit()
+        
+        segments = self._journal.segments()
+        if covered is not None:
+            segments = [path for path in segments if Journal.segment_number(path) > covered]
+            # Never reuse a number the snapshot already covers, even if its segment is gone
+            self._journal.sealed = max(self._journal.sealed, covered)
+        
+        replayed = 0
+        for path in segments + [self.journal_file]:
+            for kind, key, data in Journal.replay(path):
+                if kind == "p" and overlay is not None:
+                    overlay.setdefault(key, {}).update(data)
+                elif kind == "p":
+                    record = self._players_cache.get(key)
+                    if record is None:
+                        record = self._players_cache[key] = PlayerRecord()
+                    record.update(data)
+                elif kind == "i":
+                    self._idempotency.put(key, data["result"], data["expires"])
+                else:
+                    self._guilds_cache.setdefault(key, {}).update(data)
+                replayed += 1
+        
+        self._journal.open()
+        self._journal.records = replayed
+        if replayed:
+            print(f"Replayed {replayed} journal record(s)")
+    
+    def _get_player(self, user_id: int) -> Dict[str, Any]:
+        """Get player data, create if doesn't exist (caller must hold the user's lock stripe)"""
+        self._ensure_loaded()
         
         user_id_str = str(user_id)
         if user_id_str not in self._players_cache:
-            self._players_cache[user_id_str] = {
-                "balance": STARTING_BALANCE,
-                "crypto": STARTING_CRYPTO,
-                "total_won": 0,
-                "total_lost": 0,
-                "games_played": 0,
-                "last_daily": None,
-                "last_weekly": None,
-                "last_monthly": None,
-                "last_yearly": None,
-                "last_work": None,
-                "last_overtime": None,
-                "last_spin": None,
-                "last_vote": None,
-                "vote_count": 0,
-                "created_at": datetime.now().isoformat(),
-                "boosts": {},
-                "achievements": []
-            }
-            await self.save_data()
+            data = default_player()
+            record = PlayerRecord.from_dict(data)
+            if self._hot_fields is not None:
+                record = self._hot_fields.adopt(user_id_str, record)
+            self._players_cache[user_id_str] = record
+            self._mark_player_dirty(user_id_str, data)
         
         return self._players_cache[user_id_str]
     
-    async def update_player(self, user_id: int, data: Dict[str, Any]):
-        """Update player data"""
-        await self.load_data()
-        user_id_str = str(user_id)
+    def _peek_player(self, user_id: int) -> Dict[str, Any]:
+        """Existing player data, or transient defaults that are not stored"""
+        self._ensure_loaded()
         
-        if user_id_str in self._players_cache:
-            self._players_cache[user_id_str].update(data)
-        else:
-            player_data = await self.get_player(user_id)
-            player_data.update(data)
+        player = self._players_cache.get(str(user_id))
+        if player is None:
+            player = PlayerRecord.from_dict(default_player())
+        return player
+    
+    def _update_player(self, user_id: int, data: Dict[str, Any]):
+        """Update player data (caller must hold the user's lock stripe)"""
+        player_data = self._get_player(user_id)
+        player_data.update(data)
+        self._mark_player_dirty(str(user_id), data)
+    
+    def _update_players(self, updates: Dict[int, Dict[str, Any]]):
+        """Update several players and persist them together (caller must hold their lock stripes)"""
+        for user_id, data in updates.items():
+            self._get_player(user_id).update(data)
+            self._mark_player_dirty(str(user_id), data, persist=False)
+        if not self.write_behind:
+            self._write_through()
+    
+    def _remember(self, key: Optional[str], result: Any):
+        """Store the result of a money-moving call (caller must hold the lock stripes)
         
-        await self.save_data()
+        Called right before the player change, so the journal record lands
+        in the same group commit.
+        """
+        if key is None:
+            return
+        expires = self._idempotency.put(key, result)
+        if self._journal is not None:
+            self._journal.append("i", key, {"expires": expires, "result": result})
+    
+    def idempotency_stats(self) -> Dict[str, int]:
+        """Stored interaction results and how many repeated calls they answered"""
+        return self._idempotency.stats()
     
-    async def add_balance(self, user_id: int, amount: int) -> int:
+    async def get_player(self, user_id: int) -> Dict[str, Any]:
+        """Get player data, create if doesn't exist"""
+        await self._wait_for_player(user_id)
+        async with self._mutating(user_id):
+            return self._get_player(user_id)
+    
+    async def peek_player(self, user_id: int) -> Dict[str, Any]:
+        """Get player data without creating a record (unknown ids get unsaved defaults)"""
+        await self._wait_for_player(user_id)
+        # No lock needed: the lookup never awaits
+        return self._peek_player(user_id)
+    
+    async def update_player(self, user_id: int, data: Dict[str, Any]):
+        """Update player data"""
+        await self._wait_for_player(user_id)
+        async with self._mutating(user_id):
+            self._update_player(user_id, data)
+    
+    async def add_balance(self, user_id: int, amount: int, reason: str = "credit",
+                          game: Optional[str] = None, interaction_id: Optional[int] = None) -> int:
         """Add to player balance, return new balance"""
-        player = await self.get_player(user_id)
-        new_balance = player["balance"] + amount
-        await self.update_player(user_id, {"balance": new_balance})
-        return new_balance
+        key = idempotency_key(interaction_id, reason)
+        await self._wait_for_player(user_id)
+        async with self._mutating(user_id):
+            result = self._idempotency.get(key) if key is not None else MISSING
+            if result is not MISSING:
+                return result
+            
+            player = self._get_player(user_id)
+            new_balance = player["balance"] + amount
+            self._remember(key, new_balance)
+            self._update_player(user_id, {"balance": new_balance})
+            if self.ledger is not None:
+                self.ledger.record(user_id, amount, reason, game, interaction_id)
+            return new_balance
     
-    async def subtract_balance(self, user_id: int, amount: int) -> bool:
+    async def subtract_balance(self, user_id: int, amount: int, reason: str = "debit",
+                               game: Optional[str] = None, interaction_id: Optional[int] = None) -> bool:
         """Subtract from player balance, return success"""
-        player = await self.get_player(user_id)
-        if player["balance"] >= amount:
-            new_balance = player["balance"] - amount
-            await self.update_player(user_id, {"balance": new_balance})
-            return True
-        return False
+        key = idempotency_key(interaction_id, reason)
+        await self._wait_for_player(user_id)
+        async with self._mutating(user_id):
+            result = self._idempotency.get(key) if key is not None else MISSING
+            if result is not MISSING:
+                return result
+            
+            player = self._peek_player(user_id)
+            if player["balance"] >= amount:
+                new_balance = player["balance"] - amount
+                self._remember(key, True)
+                self._update_player(user_id, {"balance": new_balance})
+                if self.ledger is not None:
+                    self.ledger.record(user_id, -amount, reason, game, interaction_id)
+                return True
+            return False
     
-    async def get_guild(self, guild_id: int) -> Dict[str, Any]:
-        """Get guild configuration"""
-        await self.load_data()
+    async def settle_bet(self, user_id: int, stake: int, payout: int,
+                         stats_delta: Optional[Dict[str, int]] = None, reason: str = "bet",
+                         game: Optional[str] = None, interaction_id: Optional[int] = None) -> Optional[int]:
+        """Debit the stake, credit the payout and count the game in one step
+        
+        Returns the new balance, or None (and changes nothing) if the player
+        cannot cover the stake. Balance changes are recorded in ``ledger``
+        (if set) with the given reason, game and interaction id.
         
+        Like the other money-moving calls, a call repeating the reason and
+        interaction id of one that was already applied returns the first
+        result and changes nothing.
+        """
+        key = idempotency_key(interaction_id, reason)
+        await self._wait_for_player(user_id)
+        async with self._mutating(user_id):
+            result = self._idempotency.get(key) if key is not None else MISSING
+            if result is not MISSING:
+                return result
+            
+            player = self._peek_player(user_id)
+            if stake < 0 or payout < 0 or player["balance"] < stake:
+                return None
+            
+            changes = {"balance": player["balance"] - stake + payout}
+            for field, amount in bet_stats(stake, payout, stats_delta).items():
+                changes[field] = player.get(field, 0) + amount
+            self._remember(key, changes["balance"])
+            self._update_player(user_id, changes)
+            if self.ledger is not None:
+                self.ledger.record(user_id, payout - stake, reason, game, interaction_id)
+            return changes["balance"]
+    
+    async def transfer(self, sender_id: int, recipient_id: int, amount: int, reason: str = "transfer",
+                       interaction_id: Optional[int] = None) -> Optional[int]:
+        """Move ``amount`` from one player to another in one step
+        
+        Both lock stripes are held (acquired in a fixed order, so opposite
+        transfers cannot deadlock) while the sender's balance is checked and
+        both balances change, and the two records are persisted together.
+        Returns the sender's new balance, or None (and changes nothing) if
+        the amount is not positive, both ids are the same or the sender
+        cannot cover it.
+        """
+        if amount <= 0 or sender_id == recipient_id:
+            return None
+        
+        key = idempotency_key(interaction_id, reason)
+        await self._wait_for_player(sender_id)
+        await self._wait_for_player(recipient_id)
+        async with self._mutating(sender_id, recipient_id):
+            result = self._idempotency.get(key) if key is not None else MISSING
+            if result is not MISSING:
+                return result
+            
+            sender = self._peek_player(sender_id)
+            if sender["balance"] < amount:
+                return None
+            
+            new_balance = sender["balance"] - amount
+            recipient = self._get_player(recipient_id)
+            self._remember(key, new_balance)
+            self._update_players({
+                sender_id: {"balance": new_balance},
+                recipient_id: {"balance": recipient["balance"] + amount}
+            })
+            if self.ledger is not None:
+                self.ledger.record(sender_id, -amount, reason, interaction_id=interaction_id)
+                self.ledger.record(recipient_id, amount, reason, interaction_id=interaction_id)
+            return new_balance
+    
+    async def reset_player(self, user_id: int, reason: str = "reset",
+                           interaction_id: Optional[int] = None) -> int:
+        """Reset a player's balances, stats, cooldowns and items in one step, return the new balance
+        
+        The balance change is worked out under the player's lock and
+        recorded in ``ledger`` like any other; repeats of an interaction
+        are answered from the stored result.
+        """
+        key = idempotency_key(interaction_id, reason)
+        await self._wait_for_player(user_id)
+        async with self._mutating(user_id):
+            result = self._idempotency.get(key) if key is not None else MISSING
+            if result is not MISSING:
+                return result
+            
+            player = self._get_player(user_id)
+            changes = reset_fields()
+            delta = changes["balance"] - player["balance"]
+            self._remember(key, changes["balance"])
+            self._update_player(user_id, changes)
+            if self.ledger is not None:
+                self.ledger.record(user_id, delta, reason, interaction_id=interaction_id)
+            return changes["balance"]
+    
+    def _initialize_guild(self, guild_id: int):
+        """Initialize guild with default settings (caller must hold the lock)"""
         guild_id_str = str(guild_id)
-        if guild_id_str not in self._guilds_cache:
-            await self.initialize_guild(guild_id)
+        self._guilds_cache[guild_id_str] = default_guild()
+        self._mark_guilds_dirty(guild_id_str, self._guilds_cache[guild_id_str])
+    
+    async def get_guild(self, guild_id: int) -> Dict[str, Any]:
+        """Get guild configuration (shared, treat as read-only and change it with ``update_guild``)"""
+        async with self._lock:
+            self._ensure_loaded()
+            
+            guild_id_str = str(guild_id)
+            created = guild_id_str not in self._guilds_cache
+            if created:
+                self._initialize_guild(guild_id)
+            guild = self._guilds_cache[guild_id_str]
         
-        return self._guilds_cache[guild_id_str]
+        if created:
+            await self._persist()
+        return guild
+    
+    async def is_guild_admin(self, guild_id: int, user_id: int) -> bool:
+        """Whether ``user_id`` is one of the guild's bot admins (a cached set lookup)"""
+        admins = self._guild_admins.get(str(guild_id))
+        if admins is None:
+            guild = await self.get_guild(guild_id)
+            admins = self._guild_admins[str(guild_id)] = frozenset(guild.get("admin_ids", []))
+        return user_id in admins
     
     async def initialize_guild(self, guild_id: int):
         """Initialize guild with default settings"""
-        await self.load_data()
-        
-        guild_id_str = str(guild_id)
-        self._guilds_cache[guild_id_str] = {
-            "channels": {
-                "general": None,
-                "games": None,
-                "leaderboard": None,
-                "announcements": None,
-                "logs": None
-            },
-            "admin_ids": [],
-            "currency_emoji": "🪙",
-            "currency_name": "coins",
-            "crypto_emoji": "💎",
-            "crypto_name": "gems",
-            "disable_update_messages": False,
-            "created_at": datetime.now().isoformat()
-        }
-        await self.save_data()
+        async with self._lock:
+            self._ensure_loaded()
+            self._initialize_guild(guild_id)
+        await self._persist()
     
     async def update_guild(self, guild_id: int, data: Dict[str, Any]):
         """Update guild configuration"""
-        await self.load_data()
-        guild_id_str = str(guild_id)
-        
-        if guild_id_str not in self._guilds_cache:
-            await self.initialize_guild(guild_id)
+        async with self._lock:
+            self._ensure_loaded()
+            guild_id_str = str(guild_id)
+            
+            if guild_id_str not in self._guilds_cache:
+                self._initialize_guild(guild_id)
+            
+            self._guilds_cache[guild_id_str].update(data)
+            self._mark_guilds_dirty(guild_id_str, data)
+        await self._persist()
+    
+    async def add_guild_member(self, guild_id: int, user_id: int):
+        """Remember that a player plays in a guild (for server leaderboards)
         
-        self._guilds_cache[guild_id_str].update(data)
-        await self.save_data()
+        Membership is stored in the player's ``guilds`` list; people without a
+        player record are skipped, as they have nothing to rank.
+        """
+        await self._wait_for_player(user_id)
+        async with self._mutating(user_id):
+            player = self._players_cache.get(str(user_id))
+            if player is None:
+                return
+            guilds = player.get("guilds", [])
+            if str(guild_id) not in guilds:
+                self._update_player(user_id, {"guilds": guilds + [str(guild_id)]})
     
-    async def get_leaderboard(self, metric: str = "balance", limit: int = 10) -> list:
-        """Get leaderboard data"""
-        await self.load_data()
+    async def get_leaderboard(self, metric: str = "balance", limit: int = 10,
+                              guild_id: Optional[int] = None) -> list:
+        """Get leaderboard data (only the members of ``guild_id`` if given)"""
+        await self._wait_loaded()
+        # No lock needed: neither the index read nor the scan awaits, so both see a consistent view
+        self._ensure_loaded()
         
-        # Convert to list and sort
+        players = self._players_cache
+        if metric in self._leaderboards:
+            if guild_id is None:
+                index = self._leaderboards[metric]
+            else:
+                index = self._guild_leaderboard(str(guild_id), metric)
+            return [
+                {
+                    "user_id": user_id,
+                    "value": value,
+                    "balance": players[str(user_id)].get("balance", 0),
+                    "games_played": players[str(user_id)].get("games_played", 0)
+                }
+                for user_id, value in index.top(limit)
+            ]
+        
+        # Other metrics: convert to list and sort
+        if guild_id is None:
+            candidates = players.items()
+        else:
+            candidates = [(key, players[key]) for key in self._guild_members.get(str(guild_id), ())]
         players_list = []
-        for user_id, data in self._players_cache.items():
+        for user_id, data in candidates:
             if metric in data:
                 players_list.append({
                     "user_id": int(user_id),
@@ -163,7 +1089,59 @@ class Database:
         # Sort by metric value (descending)
         players_list.sort(key=lambda x: x["value"], reverse=True)
         return players_list[:limit]
+    
+    async def get_rank(self, user_id: int, metric: str = "balance", guild_id: Optional[int] = None,
+                       span: int = 1) -> Optional[Dict[str, Any]]:
+        """A player's leaderboard position with the ``span`` players above and below
+        
+        Returns ``{"rank", "total", "value", "nearby": [{"rank", "user_id", "value"}, ...]}``
+        in O(log n), or None if the player isn't ranked (no record, not a
+        member of ``guild_id`` or not a leaderboard metric).
+        """
+        await self._wait_loaded()
+        self._ensure_loaded()
+        
+        if metric not in self._leaderboards:
+            return None
+        if guild_id is None:
+            index = self._leaderboards[metric]
+        else:
+            index = self._guild_leaderboard(str(guild_id), metric)
+        
+        rank = index.rank(user_id)
+        if rank is None:
+            return None
+        nearby = [
+            {"rank": position, "user_id": other_id, "value": value}
+            for position, other_id, value in index.around(rank, span, span)
+        ]
+        return {
+            "rank": rank,
+            "total": len(index),
+            "value": self._players_cache[str(user_id)][metric],
+            "nearby": nearby
+        }
+
+def open_database(backend: str = DATABASE_BACKEND, ledger: Optional[Ledger] = None):
+    """Create the store for the configured backend ("json", "sqlite" or "postgres")
+    
+    Balance changes are recorded in ``ledger`` if one is given.
+    """
+    if backend == "sqlite":
+        from utils.sqlite_store import SQLiteDatabase
+        return SQLiteDatabase(ledger=ledger)
+    if backend == "postgres":
+        from utils.postgres_store import PostgresDatabase
+        return PostgresDatabase(ledger=ledger)
+    if backend != "json":
+        raise ValueError(f"Unknown DATABASE_BACKEND: {backend}")
+    return Database(ledger=ledger)
+
+async def create_tables(conn):
+    """Create the PostgreSQL tables and indexes if they don't exist
 
-def create_tables():
-    """Stub for database table creation (for future PostgreSQL support)."""
-    pass
+    ``conn`` is an asyncpg connection or pool.
+    """
+    from utils.postgres_store import SCHEMA
+    for statement in SCHEMA:
+        await conn.execute(statement)
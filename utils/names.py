@@ -0,0 +1,135 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+import discord
+from config import (
+    NAME_CACHE_SIZE, NAME_CACHE_TTL, NAME_FETCH_BATCH, NAME_FETCH_INTERVAL, NAME_FETCH_MAX_BACKOFF
+)
+from utils.cache import TTLCache
+
+_MISSING = object()
+
+class NameResolver:
+    """Non-blocking user id -> display name lookups for leaderboards
+    
+    ``lookup`` answers from the gateway caches (``guild.get_member`` /
+    ``bot.get_user``) or from a bounded TTL cache of names fetched earlier,
+    and never waits on the API: unknown ids are queued and a background task
+    resolves them in batches - up to ``NAME_FETCH_BATCH`` guild members per
+    ``query_members`` gateway request, global users one ``fetch_user`` at a
+    time - pausing ``NAME_FETCH_INTERVAL`` between requests and backing off
+    after failures such as rate limits. Users that no longer exist (or left
+    the guild) are cached as gone.
+    
+    Names are fetched when needed, so this works without the privileged
+    members intent and a full member cache.
+    """
+    
+    def __init__(self, bot, maxsize: int = NAME_CACHE_SIZE, ttl: float = NAME_CACHE_TTL):
+        self.bot = bot
+        # (guild id or None for global, user id) -> display name, or None if gone
+        self._names = TTLCache(maxsize, ttl)
+        self._pending: Dict[Tuple[Optional[int], int], None] = {}  # Insertion-ordered set
+        self._max_pending = maxsize
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """Start the background fetcher"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._fetch_loop())
+    
+    async def close(self):
+        """Stop the background fetcher"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def lookup(self, user_id: int, guild: Optional[discord.Guild] = None) -> Tuple[bool, Optional[str]]:
+        """``(known, name)`` for a user, without waiting on the API
+        
+        ``name`` is the member's name in ``guild`` (or the global name) and
+        None for users that no longer exist or left the guild. Unknown users
+        return ``(False, None)`` and are queued for the background fetcher.
+        """
+        if guild is not None:
+            member = guild.get_member(user_id)
+            if member is not None:
+                return True, member.display_name
+        else:
+            user = self.bot.get_user(user_id)
+            if user is not None:
+                return True, user.display_name
+        
+        key = (guild.id if guild is not None else None, user_id)
+        name = self._names.get(key, _MISSING)
+        if name is not _MISSING:
+            return True, name
+        
+        if key not in self._pending and len(self._pending) < self._max_pending:
+            self._pending[key] = None
+            self._wakeup.set()
+        return False, None
+    
+    def stats(self) -> Dict[str, int]:
+        """Name cache counters plus the number of ids waiting to be fetched"""
+        stats = self._names.stats()
+        stats["pending"] = len(self._pending)
+        return stats
+    
+    def _next_batch(self) -> List[Tuple[Optional[int], int]]:
+        """Oldest pending ids that can go into one request (same guild)"""
+        guild_id = next(iter(self._pending))[0]
+        limit = NAME_FETCH_BATCH if guild_id is not None else 1
+        batch = []
+        for key in self._pending:
+            if key[0] == guild_id:
+                batch.append(key)
+                if len(batch) == limit:
+                    break
+        for key in batch:
+            del self._pending[key]
+        return batch
+    
+    async def _fetch_loop(self):
+        delay = NAME_FETCH_INTERVAL
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            
+            batch = self._next_batch()
+            try:
+                await self._fetch(batch)
+                delay = NAME_FETCH_INTERVAL
+            except (discord.DiscordException, asyncio.TimeoutError) as e:
+                print(f"Error resolving user names: {e}")
+                # Retry later, waiting longer after each consecutive failure
+                for key in batch:
+                    self._pending.setdefault(key, None)
+                delay = min(delay * 2, NAME_FETCH_MAX_BACKOFF)
+            await asyncio.sleep(delay)
+    
+    async def _fetch(self, batch: List[Tuple[Optional[int], int]]):
+        guild_id = batch[0][0]
+        if guild_id is None:
+            for key in batch:
+                try:
+                    user = await self.bot.fetch_user(key[1])
+                    self._names.set(key, user.display_name)
+                except discord.NotFound:
+                    self._names.set(key, None)
+            return
+        
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            # No longer in that guild: nothing to show there anyway
+            return
+        members = await guild.query_members(user_ids=[user_id for _, user_id in batch], limit=len(batch), cache=False)
+        names = {member.id: member.display_name for member in members}
+        for key in batch:
+            self._names.set(key, names.get(key[1]))
@@ -0,0 +1,625 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+import asyncpg
+from config import DATABASE_URL, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, GUILD_CACHE_TTL
+from utils.cache import GuildConfigCache
+from utils.idempotency import IdempotencyTable, MISSING, idempotency_key
+from utils.ledger import Ledger
+from utils.manager import (
+    default_player, default_guild, bet_stats, reset_fields, create_tables,
+    HOT_COLUMNS, TEXT_COLUMNS, JSON_COLUMNS, PLAYER_COLUMNS, INDEXED_COLUMNS
+)
+
+SCHEMA = [
+    f"""CREATE TABLE IF NOT EXISTS players (
+        user_id BIGINT PRIMARY KEY,
+        {", ".join(f"{c} BIGINT NOT NULL DEFAULT 0" for c in HOT_COLUMNS)},
+        {", ".join(f"{c} TEXT" for c in TEXT_COLUMNS)},
+        boosts JSONB NOT NULL DEFAULT '{{}}',
+        achievements JSONB NOT NULL DEFAULT '[]',
+        extra JSONB NOT NULL DEFAULT '{{}}'
+    )""",
+    """CREATE TABLE IF NOT EXISTS guilds (
+        guild_id BIGINT PRIMARY KEY,
+        data JSONB NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS guild_members (
+        guild_id BIGINT NOT NULL,
+        user_id BIGINT NOT NULL,
+        PRIMARY KEY (guild_id, user_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS idempotency (
+        key TEXT PRIMARY KEY,
+        expires DOUBLE PRECISION NOT NULL,
+        result JSONB NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency (expires)",
+] + [
+    f"CREATE INDEX IF NOT EXISTS idx_players_{c} ON players ({c} DESC)" for c in INDEXED_COLUMNS
+]
+
+# Per-bet statements. They are constant strings, so asyncpg prepares each one
+# once per pooled connection and reuses the prepared statement afterwards.
+ENSURE_PLAYER = (
+    "INSERT INTO players (user_id, balance, crypto, created_at) VALUES ($1, $2, $3, $4) "
+    "ON CONFLICT (user_id) DO NOTHING"
+)
+ADD_BALANCE = "UPDATE players SET balance = balance + $2 WHERE user_id = $1 RETURNING balance"
+SUBTRACT_BALANCE = (
+    "UPDATE players SET balance = balance - $2 WHERE user_id = $1 AND balance >= $2 RETURNING balance"
+)
+SELECT_PLAYER = "SELECT * FROM players WHERE user_id = $1"
+# Row locks are taken in user id order, so opposite transfers cannot deadlock
+LOCK_BALANCES = "SELECT user_id, balance FROM players WHERE user_id = ANY($1::bigint[]) ORDER BY user_id FOR UPDATE"
+SETTLE_BET = (
+    "UPDATE players SET balance = balance - $2 + $3, games_played = games_played + $4, "
+    "total_won = total_won + $5, total_lost = total_lost + $6 "
+    "WHERE user_id = $1 AND balance >= $2 RETURNING balance"
+)
+SETTLE_FIELDS = ("games_played", "total_won", "total_lost")
+# Claims an interaction key unless a live result is already stored under it
+CLAIM_IDEMPOTENCY = (
+    "INSERT INTO idempotency (key, expires, result) VALUES ($1, $2, $3) "
+    "ON CONFLICT (key) DO UPDATE SET expires = EXCLUDED.expires, result = EXCLUDED.result "
+    "WHERE idempotency.expires <= $4 RETURNING TRUE"
+)
+SELECT_IDEMPOTENCY = "SELECT expires, result FROM idempotency WHERE key = $1"
+PURGE_IDEMPOTENCY = "DELETE FROM idempotency WHERE expires <= $1"
+ADD_GUILD_MEMBER = (
+    "INSERT INTO guild_members (guild_id, user_id) SELECT $1, user_id FROM players WHERE user_id = $2 "
+    "ON CONFLICT DO NOTHING"
+)
+
+class _AlreadyApplied(Exception):
+    """Rolls back a call whose interaction key was claimed by another call"""
+
+class PostgresDatabase:
+    """PostgreSQL store implementing the ``Database`` API
+    
+    Uses asyncpg with a bounded connection pool, so several bot processes can
+    share one database. Every balance change is a single conditional UPDATE
+    inside a transaction, which keeps check-then-debit atomic across
+    processes. Layout matches the SQLite backend: hot numeric fields are
+    indexed BIGINT columns, ``boosts``/``achievements``/unknown keys are JSONB.
+    
+    Guild configurations are cached in memory (``utils.cache.GuildConfigCache``)
+    and dropped by ``update_guild``/``initialize_guild``; changes made by other
+    processes show up after at most ``GUILD_CACHE_TTL`` seconds.
+    
+    Committed balance changes are recorded in ``ledger`` (if set), like the
+    JSON store does. Money-moving calls are idempotent per interaction id and
+    reason across processes: the result is claimed in the ``idempotency``
+    table at the end of the transaction, and a call that loses the claim is
+    rolled back and returns the stored result. Results are also kept in
+    memory (``utils.idempotency``) so most repeats skip the database.
+    
+    ``schema`` optionally isolates the tables in their own PostgreSQL schema
+    (used by the self-check below).
+    """
+    
+    def __init__(self, dsn: Optional[str] = DATABASE_URL, schema: Optional[str] = None,
+                 min_size: int = DB_POOL_MIN_SIZE, max_size: int = DB_POOL_MAX_SIZE,
+                 ledger: Optional[Ledger] = None):
+        if not dsn:
+            raise RuntimeError("DATABASE_URL must be set to use the PostgreSQL backend")
+        self.dsn = dsn
+        self.schema = schema
+        self.min_size = min_size
+        self.max_size = max_size
+        self.ledger = ledger
+        self._idempotency = IdempotencyTable()
+        self._last_purge = 0.0
+        self._pool: Optional[asyncpg.Pool] = None
+        self._guild_cache = GuildConfigCache(GUILD_CACHE_TTL)
+    
+    async def _init_connection(self, conn: asyncpg.Connection):
+        """Decode JSONB columns to Python objects"""
+        await conn.set_type_codec("jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+    
+    async def start(self):
+        """Create the connection pool and the tables"""
+        if self._pool is not None:
+            return
+        
+        server_settings = None
+        if self.schema:
+            conn = await asyncpg.connect(self.dsn)
+            try:
+                await conn.execute(f'CREATE SCHEMA IF NOT EXISTS "{self.schema}"')
+            finally:
+                await conn.close()
+            server_settings = {"search_path": self.schema}
+        
+        self._pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            init=self._init_connection,
+            server_settings=server_settings
+        )
+        await create_tables(self._pool)
+    
+    async def close(self):
+        """Close the connection pool"""
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+    
+    @staticmethod
+    async def _ensure_player(conn: asyncpg.Connection, user_id: int):
+        defaults = default_player()
+        await conn.execute(ENSURE_PLAYER, user_id, defaults["balance"], defaults["crypto"], defaults["created_at"])
+    
+    @staticmethod
+    def _row_to_player(row: asyncpg.Record) -> Dict[str, Any]:
+        player = {column: row[column] for column in PLAYER_COLUMNS}
+        player.update(row["extra"])
+        return player
+    
+    async def get_player(self, user_id: int) -> Dict[str, Any]:
+        """Get player data, create if doesn't exist"""
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                await self._ensure_player(conn, user_id)
+                row = await conn.fetchrow(SELECT_PLAYER, user_id)
+        return self._row_to_player(row)
+    
+    @staticmethod
+    async def _apply_update(conn: asyncpg.Connection, user_id: int, data: Dict[str, Any]):
+        columns = {key: value for key, value in data.items() if key in PLAYER_COLUMNS}
+        extra = {key: value for key, value in data.items() if key not in PLAYER_COLUMNS}
+        
+        assignments = [f"{name} = ${i}" for i, name in enumerate(columns, start=2)]
+        values = list(columns.values())
+        if extra:
+            assignments.append(f"extra = extra || ${len(values) + 2}::jsonb")
+            values.append(extra)
+        if not assignments:
+            return
+        
+        await conn.execute(
+            f"UPDATE players SET {', '.join(assignments)} WHERE user_id = $1",
+            user_id, *values
+        )
+    
+    async def peek_player(self, user_id: int) -> Dict[str, Any]:
+        """Get player data without creating a record (unknown ids get unsaved defaults)"""
+        row = await self._pool.fetchrow(SELECT_PLAYER, user_id)
+        return self._row_to_player(row) if row is not None else default_player()
+    
+    async def update_player(self, user_id: int, data: Dict[str, Any]):
+        """Update player data"""
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                await self._ensure_player(conn, user_id)
+                await self._apply_update(conn, user_id, data)
+    
+    async def _run_once(self, key: Optional[str], func) -> tuple:
+        """Run ``await func(conn)`` in a transaction unless ``key`` was already applied
+        
+        Returns ``(result, applied)``. Results other than None/False are
+        claimed under ``key`` at the end of the same transaction; if another
+        call (possibly in another process) got there first the transaction is
+        rolled back and its stored result returned instead.
+        """
+        if key is None:
+            async with self._pool.acquire() as conn:
+                async with conn.transaction():
+                    return await func(conn), True
+        
+        result = self._idempotency.get(key)
+        if result is not MISSING:
+            return result, False
+        
+        now = time.time()
+        expires = now + self._idempotency.ttl
+        async with self._pool.acquire() as conn:
+            try:
+                async with conn.transaction():
+                    result = await func(conn)
+                    if result is None or result is False:
+                        return result, True
+                    if not await conn.fetchval(CLAIM_IDEMPOTENCY, key, expires, result, now):
+                        raise _AlreadyApplied()
+            except _AlreadyApplied:
+                row = await conn.fetchrow(SELECT_IDEMPOTENCY, key)
+                result, expires = row["result"], row["expires"]
+                self._idempotency.put(key, result, expires)
+                return result, False
+            
+            if now - self._last_purge >= self._idempotency.ttl:
+                self._last_purge = now
+                await conn.execute(PURGE_IDEMPOTENCY, now)
+        
+        self._idempotency.put(key, result, expires)
+        return result, True
+    
+    def idempotency_stats(self) -> Dict[str, int]:
+        """Interaction results cached in memory and how many repeated calls they answered"""
+        return self._idempotency.stats()
+    
+    async def add_balance(self, user_id: int, amount: int, reason: str = "credit",
+                          game: Optional[str] = None, interaction_id: Optional[int] = None) -> int:
+        """Add to player balance, return new balance"""
+        async def _add(conn):
+            await self._ensure_player(conn, user_id)
+            return await conn.fetchval(ADD_BALANCE, user_id, amount)
+        
+        balance, applied = await self._run_once(idempotency_key(interaction_id, reason), _add)
+        if applied and self.ledger is not None:
+            self.ledger.record(user_id, amount, reason, game, interaction_id)
+        return balance
+    
+    async def subtract_balance(self, user_id: int, amount: int, reason: str = "debit",
+                               game: Optional[str] = None, interaction_id: Optional[int] = None) -> bool:
+        """Subtract from player balance, return success"""
+        async def _subtract(conn):
+            balance = await conn.fetchval(SUBTRACT_BALANCE, user_id, amount)
+            if balance is None and default_player()["balance"] >= amount:
+                # Unknown player: create it only now that the debit will succeed
+                await self._ensure_player(conn, user_id)
+                balance = await conn.fetchval(SUBTRACT_BALANCE, user_id, amount)
+            return balance is not None
+        
+        success, applied = await self._run_once(idempotency_key(interaction_id, reason), _subtract)
+        if success and applied and self.ledger is not None:
+            self.ledger.record(user_id, -amount, reason, game, interaction_id)
+        return success
+    
+    async def transfer(self, sender_id: int, recipient_id: int, amount: int, reason: str = "transfer",
+                       interaction_id: Optional[int] = None) -> Optional[int]:
+        """Move ``amount`` from one player to another in one transaction
+        
+        Both rows are locked in user id order before the sender's balance is
+        checked. Returns the sender's new balance, or None if the amount is
+        not positive, both ids are the same or the sender cannot cover it.
+        """
+        if amount <= 0 or sender_id == recipient_id:
+            return None
+        
+        user_ids = sorted((sender_id, recipient_id))
+        
+        async def _transfer(conn):
+            balances = dict(await conn.fetch(LOCK_BALANCES, user_ids))
+            if balances.get(sender_id, default_player()["balance"]) < amount:
+                return None
+            if len(balances) < 2:
+                # New players are created (and locked) in the same order
+                for user_id in user_ids:
+                    if user_id not in balances:
+                        await self._ensure_player(conn, user_id)
+                balances = dict(await conn.fetch(LOCK_BALANCES, user_ids))
+                if balances[sender_id] < amount:
+                    return None
+            
+            balance = await conn.fetchval(ADD_BALANCE, sender_id, -amount)
+            await conn.execute(ADD_BALANCE, recipient_id, amount)
+            return balance
+        
+        balance, applied = await self._run_once(idempotency_key(interaction_id, reason), _transfer)
+        if balance is not None and applied and self.ledger is not None:
+            self.ledger.record(sender_id, -amount, reason, interaction_id=interaction_id)
+            self.ledger.record(recipient_id, amount, reason, interaction_id=interaction_id)
+        return balance
+    
+    async def settle_bet(self, user_id: int, stake: int, payout: int,
+                         stats_delta: Optional[Dict[str, int]] = None, reason: str = "bet",
+                         game: Optional[str] = None, interaction_id: Optional[int] = None) -> Optional[int]:
+        """Debit the stake, credit the payout and count the game in one transaction
+        
+        Returns the new balance, or None if the player cannot cover the stake.
+        The usual game counters go through one prepared conditional UPDATE;
+        other counters lock the row and update it in the same transaction.
+        """
+        if stake < 0 or payout < 0:
+            return None
+        
+        delta = bet_stats(stake, payout, stats_delta)
+        
+        async def _settle(conn):
+            return await self._settle_bet(conn, user_id, stake, payout, delta)
+        
+        balance, applied = await self._run_once(idempotency_key(interaction_id, reason), _settle)
+        if balance is not None and applied and self.ledger is not None:
+            self.ledger.record(user_id, payout - stake, reason, game, interaction_id)
+        return balance
+    
+    async def reset_player(self, user_id: int, reason: str = "reset",
+                           interaction_id: Optional[int] = None) -> int:
+        """Reset a player's balances, stats, cooldowns and items in one transaction, return the new balance"""
+        changes = reset_fields()
+        deltas = []
+        
+        async def _reset(conn):
+            await self._ensure_player(conn, user_id)
+            balance = await conn.fetchval("SELECT balance FROM players WHERE user_id = $1 FOR UPDATE", user_id)
+            await self._apply_update(conn, user_id, changes)
+            deltas.append(changes["balance"] - balance)
+            return changes["balance"]
+        
+        balance, applied = await self._run_once(idempotency_key(interaction_id, reason), _reset)
+        if applied and self.ledger is not None:
+            self.ledger.record(user_id, deltas[0], reason, interaction_id=interaction_id)
+        return balance
+    
+    async def _settle_bet(self, conn: asyncpg.Connection, user_id: int, stake: int, payout: int,
+                          delta: Dict[str, int]) -> Optional[int]:
+        """``settle_bet`` statements with the counter increments already computed (inside a transaction)"""
+        if set(delta) == set(SETTLE_FIELDS):
+            values = [delta[field] for field in SETTLE_FIELDS]
+            balance = await conn.fetchval(SETTLE_BET, user_id, stake, payout, *values)
+            if balance is None and default_player()["balance"] >= stake:
+                # Unknown player: create it only now that the bet can be covered
+                await self._ensure_player(conn, user_id)
+                balance = await conn.fetchval(SETTLE_BET, user_id, stake, payout, *values)
+            return balance
+        
+        row = await conn.fetchrow(SELECT_PLAYER + " FOR UPDATE", user_id)
+        if row is None:
+            if default_player()["balance"] < stake:
+                return None
+            await self._ensure_player(conn, user_id)
+            row = await conn.fetchrow(SELECT_PLAYER + " FOR UPDATE", user_id)
+        player = self._row_to_player(row)
+        if player["balance"] < stake:
+            return None
+        
+        changes = {"balance": player["balance"] - stake + payout}
+        for field, amount in delta.items():
+            changes[field] = player.get(field, 0) + amount
+        await self._apply_update(conn, user_id, changes)
+        return changes["balance"]
+    
+    async def add_guild_member(self, guild_id: int, user_id: int):
+        """Remember that a player plays in a guild (skipped if the player doesn't exist)"""
+        await self._pool.execute(ADD_GUILD_MEMBER, guild_id, user_id)
+    
+    async def get_leaderboard(self, metric: str = "balance", limit: int = 10,
+                              guild_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get leaderboard data (only the members of ``guild_id`` if given)"""
+        if metric not in HOT_COLUMNS:
+            return []
+        
+        if guild_id is None:
+            rows = await self._pool.fetch(
+                f"SELECT user_id, {metric} AS value, balance, games_played FROM players "
+                f"ORDER BY {metric} DESC LIMIT $1",
+                limit
+            )
+        else:
+            rows = await self._pool.fetch(
+                f"SELECT p.user_id, p.{metric} AS value, p.balance, p.games_played "
+                f"FROM guild_members m JOIN players p ON p.user_id = m.user_id "
+                f"WHERE m.guild_id = $1 ORDER BY p.{metric} DESC LIMIT $2",
+                guild_id, limit
+            )
+        return [dict(row) for row in rows]
+    
+    async def get_rank(self, user_id: int, metric: str = "balance", guild_id: Optional[int] = None,
+                       span: int = 1) -> Optional[Dict[str, Any]]:
+        """A player's leaderboard position with the ``span`` players above and below
+        
+        Same result as ``Database.get_rank``. The position is a count over
+        the metric index, so it costs O(rank) rather than O(log n).
+        """
+        if metric not in HOT_COLUMNS:
+            return None
+        
+        if guild_id is None:
+            source, scope, args = "players p", "TRUE", []
+        else:
+            source = "guild_members m JOIN players p ON p.user_id = m.user_id"
+            scope, args = "m.guild_id = $1", [guild_id]
+        # The player's id, their value and the span follow the scope arguments
+        uid, val, lim = (f"${len(args) + i}" for i in (1, 2, 3))
+        ahead = f"(p.{metric} > {val} OR (p.{metric} = {val} AND p.user_id < {uid}))"
+        behind = f"(p.{metric} < {val} OR (p.{metric} = {val} AND p.user_id > {uid}))"
+        
+        async with self._pool.acquire() as conn:
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                value = await conn.fetchval(
+                    f"SELECT p.{metric} FROM {source} WHERE {scope} AND p.user_id = {uid}", *args, user_id
+                )
+                if value is None:
+                    return None
+                
+                rank = await conn.fetchval(
+                    f"SELECT COUNT(*) FROM {source} WHERE {scope} AND {ahead}", *args, user_id, value
+                ) + 1
+                total = await conn.fetchval(f"SELECT COUNT(*) FROM {source} WHERE {scope}", *args)
+                above = await conn.fetch(
+                    f"SELECT p.user_id, p.{metric} AS value FROM {source} WHERE {scope} AND {ahead} "
+                    f"ORDER BY p.{metric} ASC, p.user_id DESC LIMIT {lim}",
+                    *args, user_id, value, span
+                )
+                below = await conn.fetch(
+                    f"SELECT p.user_id, p.{metric} AS value FROM {source} WHERE {scope} AND {behind} "
+                    f"ORDER BY p.{metric} DESC, p.user_id ASC LIMIT {lim}",
+                    *args, user_id, value, span
+                )
+        
+        rows = list(reversed(above)) + [{"user_id": user_id, "value": value}] + list(below)
+        first = rank - len(above)
+        nearby = [
+            {"rank": first + i, "user_id": row["user_id"], "value": row["value"]}
+            for i, row in enumerate(rows)
+        ]
+        return {"rank": rank, "total": total, "value": value, "nearby": nearby}
+    
+    async def get_guild(self, guild_id: int) -> Dict[str, Any]:
+        """Get guild configuration (cached and shared, treat as read-only)"""
+        guild = self._guild_cache.get(guild_id)
+        if guild is not None:
+            return guild
+        
+        generation = self._guild_cache.generation
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    "INSERT INTO guilds (guild_id, data) VALUES ($1, $2) ON CONFLICT (guild_id) DO NOTHING",
+                    guild_id, default_guild()
+                )
+                guild = await conn.fetchval("SELECT data FROM guilds WHERE guild_id = $1", guild_id)
+        self._guild_cache.put(guild_id, guild, generation)
+        return guild
+    
+    async def is_guild_admin(self, guild_id: int, user_id: int) -> bool:
+        """Whether ``user_id`` is one of the guild's bot admins (a cached set lookup)"""
+        admins = self._guild_cache.admins(guild_id)
+        if admins is None:
+            admins = frozenset((await self.get_guild(guild_id)).get("admin_ids", []))
+        return user_id in admins
+    
+    async def initialize_guild(self, guild_id: int):
+        """Initialize guild with default settings"""
+        await self._pool.execute(
+            "INSERT INTO guilds (guild_id, data) VALUES ($1, $2) "
+            "ON CONFLICT (guild_id) DO UPDATE SET data = EXCLUDED.data",
+            guild_id, default_guild()
+        )
+        self._guild_cache.invalidate(guild_id)
+    
+    async def update_guild(self, guild_id: int, data: Dict[str, Any]):
+        """Update guild configuration"""
+        await self._pool.execute(
+            "INSERT INTO guilds (guild_id, data) VALUES ($1, $2::jsonb || $3::jsonb) "
+            "ON CONFLICT (guild_id) DO UPDATE SET data = guilds.data || $3::jsonb",
+            guild_id, default_guild(), data
+        )
+        self._guild_cache.invalidate(guild_id)
+    
+    async def import_json(self, players_file: str = "data/players.json",
+                          guilds_file: str = "data/guilds.json", batch_size: int = 5000) -> int:
+        """Import players/guilds from the JSON store, return the number of players"""
+        def _load(path):
+            if not os.path.exists(path):
+                return {}
+            with open(path, "r") as f:
+                return json.load(f)
+        
+        players = _load(players_file)
+        guilds = _load(guilds_file)
+        
+        names = ["user_id"] + PLAYER_COLUMNS + ["extra"]
+        placeholders = ", ".join(f"${i}" for i in range(1, len(names) + 1))
+        updates = ", ".join(f"{name} = EXCLUDED.{name}" for name in names[1:])
+        upsert = (
+            f"INSERT INTO players ({', '.join(names)}) VALUES ({placeholders}) "
+            f"ON CONFLICT (user_id) DO UPDATE SET {updates}"
+        )
+        
+        rows = []
+        members = []
+        for user_id, data in players.items():
+            record = default_player()
+            record.update(data)
+            members += [(int(guild_id), int(user_id)) for guild_id in record.pop("guilds", [])]
+            extra = {key: value for key, value in record.items() if key not in PLAYER_COLUMNS}
+            rows.append([int(user_id)] + [record[column] for column in PLAYER_COLUMNS] + [extra])
+        
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                for start in range(0, len(rows), batch_size):
+                    await conn.executemany(upsert, rows[start:start + batch_size])
+                await conn.executemany(
+                    "INSERT INTO guilds (guild_id, data) VALUES ($1, $2) "
+                    "ON CONFLICT (guild_id) DO UPDATE SET data = EXCLUDED.data",
+                    [(int(guild_id), data) for guild_id, data in guilds.items()]
+                )
+                await conn.executemany(
+                    "INSERT INTO guild_members (guild_id, user_id) VALUES ($1, $2) ON CONFLICT DO NOTHING",
+                    members
+                )
+        self._guild_cache.clear()
+        return len(rows)
+
+async def self_check(dsn: Optional[str] = DATABASE_URL):
+    """Exercise the backend against a throwaway schema on a local server"""
+    schema = "casino_selfcheck"
+    db = PostgresDatabase(dsn, schema=schema)
+    await db.start()
+    try:
+        user_id = 1
+        assert (await db.peek_player(2))["balance"] == default_player()["balance"]
+        assert await db.subtract_balance(2, default_player()["balance"] + 1) is False
+        assert await db._pool.fetchval("SELECT count(*) FROM players") == 0
+        await asyncio.gather(*[db.add_balance(user_id, 1) for _ in range(50)])
+        player = await db.get_player(user_id)
+        assert player["balance"] == default_player()["balance"] + 50, player
+        assert await db.subtract_balance(user_id, player["balance"] + 1) is False
+        assert await db.subtract_balance(user_id, 50) is True
+        balance = await db.settle_bet(user_id, 10, 25)
+        assert balance == default_player()["balance"] + 15, balance
+        assert await db.settle_bet(user_id, balance + 1, 0) is None
+        assert await db.settle_bet(user_id, 5, 0, {"games_played": 3, "spins": 3}) == balance - 5
+        player = await db.get_player(user_id)
+        assert player["games_played"] == 4 and player["spins"] == 3 and player["total_won"] == 15, player
+        await db.update_player(user_id, {"games_played": 2, "boosts": {"x": 1}, "note": "ok"})
+        player = await db.get_player(user_id)
+        assert player["games_played"] == 2 and player["boosts"] == {"x": 1} and player["note"] == "ok"
+        assert (await db.get_leaderboard("games_played"))[0]["user_id"] == user_id
+        await db.add_guild_member(7, user_id)
+        await db.add_guild_member(7, user_id)
+        await db.add_guild_member(7, 3)
+        await db.add_balance(4, 10 ** 6)
+        board = await db.get_leaderboard("balance", guild_id=7)
+        assert [row["user_id"] for row in board] == [user_id], board
+        assert await db.get_leaderboard("balance", guild_id=8) == []
+        rank = await db.get_rank(4, "balance", span=1)
+        assert rank["rank"] == 1 and rank["total"] == 2 and [row["user_id"] for row in rank["nearby"]] == [4, user_id], rank
+        assert (await db.get_rank(user_id, "balance", guild_id=7))["nearby"][0]["rank"] == 1
+        assert await db.get_rank(4, "balance", guild_id=7) is None
+        await db.update_guild(7, {"currency_name": "chips"})
+        assert (await db.get_guild(7))["currency_name"] == "chips"
+        assert await db.is_guild_admin(7, user_id) is False
+        await db.update_guild(7, {"admin_ids": [user_id]})
+        assert await db.is_guild_admin(7, user_id) is True
+        assert (await db.get_guild(7))["currency_name"] == "chips"
+        before = await db._pool.fetchval("SELECT sum(balance) FROM players")
+        await asyncio.gather(*[db.transfer(a, b, 7) for a, b in [(4, user_id), (user_id, 4), (4, 9)] * 20])
+        assert await db.transfer(9, 4, 10 ** 9) is None and await db.transfer(4, 4, 1) is None
+        after = await db._pool.fetchval("SELECT sum(balance) FROM players")
+        assert after == before + default_player()["balance"], (before, after)
+        # A repeated interaction returns the first result, also from another process
+        other = PostgresDatabase(dsn, schema=schema)
+        await other.start()
+        try:
+            balance = (await db.peek_player(user_id))["balance"]
+            results = await asyncio.gather(*[
+                store.settle_bet(user_id, 10, 0, interaction_id=99) for store in (db, other) * 5
+            ])
+            assert results == [balance - 10] * 10, results
+            assert await other.subtract_balance(user_id, 1, "buy", interaction_id=99) is True
+            assert (await db.peek_player(user_id))["balance"] == balance - 11
+            assert await db.reset_player(user_id, interaction_id=99) == default_player()["balance"]
+            await db.add_balance(user_id, 5)
+            assert await other.reset_player(user_id, interaction_id=99) == default_player()["balance"]
+            player = await db.get_player(user_id)
+            assert player["balance"] == default_player()["balance"] + 5 and player["games_played"] == 0, player
+        finally:
+            await other.close()
+        print("PostgreSQL backend OK")
+    finally:
+        await db._pool.execute(f'DROP SCHEMA "{schema}" CASCADE')
+        await db.close()
+
+if __name__ == "__main__":
+    # python -m utils.postgres_store migrate  -> import data/*.json into DATABASE_URL
+    # python -m utils.postgres_store check    -> run the self-check against DATABASE_URL
+    async def _main(command):
+        if command == "check":
+            await self_check()
+            return
+        db = PostgresDatabase()
+        await db.start()
+        try:
+            count = await db.import_json()
+        finally:
+            await db.close()
+        print(f"Imported {count} player(s) into PostgreSQL")
+    
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else "migrate"))
@@ -0,0 +1,164 @@
+from collections.abc import MutableMapping
+from datetime import datetime
+from operator import attrgetter
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+INT_FIELDS = ("balance", "crypto", "total_won", "total_lost", "games_played", "vote_count")
+TIME_FIELDS = (
+    "last_daily", "last_weekly", "last_monthly", "last_yearly",
+    "last_work", "last_overtime", "last_spin", "last_vote", "created_at"
+)
+# Key order of a player dict (matches default_player())
+FIELDS = (
+    "balance", "crypto", "total_won", "total_lost", "games_played",
+    "last_daily", "last_weekly", "last_monthly", "last_yearly",
+    "last_work", "last_overtime", "last_spin", "last_vote",
+    "vote_count", "created_at", "boosts", "achievements"
+)
+
+# Fields stored as plain ints (timestamps as epoch seconds or None)
+FIXED_FIELDS = INT_FIELDS + TIME_FIELDS
+
+_INT = frozenset(INT_FIELDS)
+_TIME = frozenset(TIME_FIELDS)
+_FIELDS = frozenset(FIELDS)
+_fixed_values = attrgetter(*FIXED_FIELDS)
+
+def to_epoch(value: Union[str, datetime, int, float, None]) -> Optional[int]:
+    """Convert an ISO string/datetime/number to epoch seconds (None for unset or unparsable)"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        if not isinstance(value, datetime):
+            value = datetime.fromisoformat(value)
+        return int(value.timestamp())
+    except (ValueError, TypeError, OverflowError, OSError):
+        return None
+
+def from_epoch(value: Optional[int]) -> Optional[str]:
+    """Convert epoch seconds back to the local ISO string the cogs expect"""
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value).isoformat()
+
+class PlayerRecord(MutableMapping):
+    """Compact in-memory player record with a dict-compatible view
+    
+    Fields live in ``__slots__`` instead of a per-player dict, cooldown and
+    creation timestamps are stored as integer epoch seconds and ``boosts``/
+    ``achievements`` are only allocated once they are non-empty. Keys outside
+    the standard fields go to a lazily created ``extra`` dict.
+    
+    Mapping access (``record["last_daily"]``, ``get``, ``update``, ``items``)
+    behaves like the old player dict, including ISO strings for timestamps,
+    while attribute access (``record.last_daily``) gives the raw epoch value.
+    """
+    
+    __slots__ = INT_FIELDS + TIME_FIELDS + ("_boosts", "_achievements", "_extra")
+    
+    def __init__(self):
+        for name in INT_FIELDS:
+            setattr(self, name, 0)
+        for name in TIME_FIELDS:
+            setattr(self, name, None)
+        self._boosts = None
+        self._achievements = None
+        self._extra = None
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PlayerRecord":
+        """Build a record from a player dict (snapshot, journal or default_player())"""
+        record = cls()
+        record.update(data)
+        return record
+    
+    @classmethod
+    def from_fixed(cls, values: Tuple, variable: Optional[Dict[str, Any]] = None) -> "PlayerRecord":
+        """Build a record from raw ``FIXED_FIELDS`` values plus the variable fields"""
+        record = cls.__new__(cls)
+        # Same order as FIXED_FIELDS
+        (record.balance, record.crypto, record.total_won, record.total_lost,
+         record.games_played, record.vote_count,
+         record.last_daily, record.last_weekly, record.last_monthly, record.last_yearly,
+         record.last_work, record.last_overtime, record.last_spin, record.last_vote,
+         record.created_at) = values
+        record._boosts = None
+        record._achievements = None
+        record._extra = None
+        if variable:
+            record.update(variable)
+        return record
+    
+    def fixed_values(self) -> Tuple:
+        """Raw ``FIXED_FIELDS`` values (timestamps as epoch seconds)"""
+        return _fixed_values(self)
+    
+    def variable_fields(self) -> Optional[Dict[str, Any]]:
+        """Non-empty boosts/achievements and extra keys, or None"""
+        if self._boosts is None and self._achievements is None and not self._extra:
+            return None
+        data = {}
+        if self._boosts is not None:
+            data["boosts"] = self._boosts
+        if self._achievements is not None:
+            data["achievements"] = self._achievements
+        if self._extra:
+            data.update(self._extra)
+        return data
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain player dict, as stored in snapshots and journal records"""
+        data = {name: self[name] for name in FIELDS}
+        if self._extra:
+            data.update(self._extra)
+        return data
+    
+    def __getitem__(self, key: str) -> Any:
+        if key in _INT:
+            return getattr(self, key)
+        if key in _TIME:
+            return from_epoch(getattr(self, key))
+        if key == "boosts":
+            return self._boosts if self._boosts is not None else {}
+        if key == "achievements":
+            return self._achievements if self._achievements is not None else []
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+    
+    def __setitem__(self, key: str, value: Any):
+        if key in _INT:
+            setattr(self, key, value)
+        elif key in _TIME:
+            setattr(self, key, to_epoch(value))
+        elif key == "boosts":
+            self._boosts = value or None
+        elif key == "achievements":
+            self._achievements = value or None
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+    
+    def __delitem__(self, key: str):
+        if key in _FIELDS or self._extra is None:
+            raise KeyError(key)
+        del self._extra[key]
+        if not self._extra:
+            self._extra = None
+    
+    def __contains__(self, key: object) -> bool:
+        return key in _FIELDS or (self._extra is not None and key in self._extra)
+    
+    def __iter__(self) -> Iterator[str]:
+        yield from FIELDS
+        if self._extra:
+            yield from list(self._extra)
+    
+    def __len__(self) -> int:
+        return len(FIELDS) + (len(self._extra) if self._extra else 0)
+    
+    def __repr__(self) -> str:
+        return f"PlayerRecord({self.to_dict()!r})"
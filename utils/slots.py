@@ -0,0 +1,293 @@
+import random
+import sys
+import time
+from itertools import product
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from config import SLOT_SYMBOLS, SLOT_WEIGHTS
+
+REELS = 3
+SIMULATION_BATCH = 4_000_000  # Spins drawn per NumPy batch (bounds memory to a few hundred MB)
+
+class AliasTable:
+    """Walker alias table: O(1) weighted draws after O(n) setup
+    
+    Column ``i`` is kept with probability ``keep[i]`` and otherwise replaced
+    by ``alias[i]``, so one uniform number picks a column (integer part) and
+    decides between it and its alias (fractional part).
+    """
+    
+    def __init__(self, weights: Sequence[float]):
+        count = len(weights)
+        total = float(sum(weights))
+        scaled = [weight * count / total for weight in weights]
+        self.size = count
+        self.keep = [1.0] * count
+        self.alias = list(range(count))
+        
+        # Vose's method: pair each under-full column with an over-full one
+        small = [i for i, value in enumerate(scaled) if value < 1.0]
+        large = [i for i, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            under, over = small.pop(), large.pop()
+            self.keep[under] = scaled[under]
+            self.alias[under] = over
+            scaled[over] -= 1.0 - scaled[under]
+            (small if scaled[over] < 1.0 else large).append(over)
+        # Leftovers are full columns up to rounding error
+        for i in small + large:
+            self.keep[i] = 1.0
+        self._keep_array = np.array(self.keep)
+        self._alias_array = np.array(self.alias, dtype=np.intp)
+    
+    def draw(self, rand=random.random) -> int:
+        """One weighted index"""
+        u = rand() * self.size
+        i = int(u)
+        return i if u - i < self.keep[i] else self.alias[i]
+    
+    def draw_many(self, rng: np.random.Generator, shape) -> np.ndarray:
+        """Array of weighted indices (vectorized)"""
+        u = rng.random(shape) * self.size
+        columns = u.astype(np.intp)
+        keep = self._keep_array[columns] > u - columns
+        return np.where(keep, columns, self._alias_array[columns])
+
+class SlotMachine:
+    """``SLOT_SYMBOLS``/``SLOT_WEIGHTS`` compiled once for spinning
+    
+    Each reel is drawn from an ``AliasTable``, and the winning lines of every
+    outcome (``winning_lines``; three symbols form at most one) are looked up
+    in a table indexed by ``outcome`` = the reels' symbol indices read as a
+    base-``len(names)`` number. A spin is three draws and one lookup.
+    """
+    
+    def __init__(self, symbols: Dict[str, Any] = SLOT_SYMBOLS, weights: Dict[str, int] = SLOT_WEIGHTS):
+        self.names = list(symbols)
+        self.emojis = [symbols[name]["emoji"] for name in self.names]
+        self.reel = AliasTable([weights[name] for name in self.names])
+        # outcome -> its winning (symbol, count, multiplier) lines, by the rule the RTP report uses
+        outcomes = list(product(self.names, repeat=REELS))
+        self.lines: List[List[Tuple[str, int, float]]] = [winning_lines(reels, symbols) for reels in outcomes]
+        # Multiplier per outcome, for vectorized payouts
+        self.multipliers = np.array([line_payouts(reels, symbols=symbols) for reels in outcomes])
+        self.rng = np.random.default_rng()
+    
+    def spin(self) -> Tuple[int, int, int]:
+        """Symbol indices of the three reels"""
+        draw = self.reel.draw
+        return draw(), draw(), draw()
+    
+    def outcome(self, reels: Sequence[int]) -> int:
+        """Index of a reel combination in the payout table"""
+        size = len(self.names)
+        return (reels[0] * size + reels[1]) * size + reels[2]
+    
+    def reels(self, outcome: int) -> Tuple[int, int, int]:
+        """Symbol indices of the reels of an outcome (inverse of ``outcome``)"""
+        first, rest = divmod(outcome, len(self.names) ** 2)
+        return (first, *divmod(rest, len(self.names)))
+    
+    def payout(self, reels: Sequence[int], bet_amount: int) -> Tuple[int, List[Dict[str, Any]]]:
+        """``(total_payout, winning_lines)`` for one spin at ``bet_amount``"""
+        lines = [
+            {"symbol": symbol, "count": count, "multiplier": multiplier, "payout": int(bet_amount * multiplier)}
+            for symbol, count, multiplier in self.lines[self.outcome(reels)]
+        ]
+        return sum(line["payout"] for line in lines), lines
+    
+    def spin_many(self, spins: int, bet_amount: int) -> Tuple[np.ndarray, np.ndarray]:
+        """``(outcomes, payouts)`` of ``spins`` spins drawn in one vectorized batch
+        
+        Payouts are truncated to whole coins per spin like ``payout`` (three
+        reels form at most one line, so per spin and per line agree).
+        """
+        reels = self.reel.draw_many(self.rng, (spins, REELS))
+        size = len(self.names)
+        outcomes = (reels[:, 0] * size + reels[:, 1]) * size + reels[:, 2]
+        payouts = np.floor(bet_amount * self.multipliers[outcomes]).astype(np.int64)
+        return outcomes, payouts
+    
+    def hits(self, outcomes: np.ndarray, bet_amount: int) -> List[Dict[str, Any]]:
+        """Winning lines hit in a batch of outcomes, biggest multiplier first
+        
+        One ``{symbol, count, multiplier, hits, payout}`` per line, where
+        ``payout`` is the total it paid over the batch.
+        """
+        won = outcomes[self.multipliers[outcomes] > 0]
+        totals: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        for outcome, hits in zip(*(values.tolist() for values in np.unique(won, return_counts=True))):
+            for symbol, count, multiplier in self.lines[outcome]:
+                line = totals.setdefault((symbol, count), {
+                    "symbol": symbol, "count": count, "multiplier": multiplier, "hits": 0, "payout": 0
+                })
+                line["hits"] += hits
+                line["payout"] += hits * int(bet_amount * multiplier)
+        return sorted(totals.values(), key=lambda line: line["multiplier"], reverse=True)
+
+def winning_lines(outcome: Sequence[str], symbols: Dict[str, Any] = SLOT_SYMBOLS) -> List[Tuple[str, int, float]]:
+    """``(symbol, count, multiplier)`` of every line an outcome pays
+    
+    Every symbol that shows up at least twice pays its multiplier for that
+    count. This is the one paytable rule: the game (``SlotMachine``) and the
+    RTP figures (``line_payouts``) are both built from it.
+    """
+    lines = []
+    for symbol in dict.fromkeys(outcome):
+        count = outcome.count(symbol)
+        payouts = symbols[symbol]["payouts"]
+        if count >= 2 and count in payouts:
+            lines.append((symbol, count, payouts[count]))
+    return lines
+
+def line_payouts(outcome: Sequence[str], bet: Optional[int] = None,
+                 symbols: Dict[str, Any] = SLOT_SYMBOLS) -> float:
+    """Total payout of one outcome per unit bet, from its ``winning_lines``
+    
+    With ``bet`` each line is truncated to whole coins like the game does
+    (``int(bet * multiplier)``); without it the multipliers are exact.
+    """
+    total = 0
+    for _, _, multiplier in winning_lines(outcome, symbols):
+        total += int(bet * multiplier) if bet else multiplier
+    return total / bet if bet else total
+
+def payout_table(bet: Optional[int] = None, symbols: Dict[str, Any] = SLOT_SYMBOLS,
+                 weights: Dict[str, int] = SLOT_WEIGHTS) -> tuple:
+    """``(names, probabilities, multipliers)`` for every outcome of the reels
+    
+    ``names`` lists the symbols in ``SLOT_SYMBOLS`` order, ``probabilities``
+    is each symbol's chance on one reel and ``multipliers[i, j, k]`` the
+    payout per unit bet when the reels show ``names[i]``, ``names[j]``,
+    ``names[k]``.
+    """
+    names = list(symbols)
+    probabilities = np.array([weights[name] for name in names], dtype=np.float64)
+    probabilities /= probabilities.sum()
+    multipliers = np.empty((len(names),) * REELS)
+    for outcome in product(range(len(names)), repeat=REELS):
+        multipliers[outcome] = line_payouts([names[i] for i in outcome], bet, symbols)
+    return names, probabilities, multipliers
+
+def outcome_probabilities(probabilities: np.ndarray) -> np.ndarray:
+    """Joint probability of every outcome (independent reels), same shape as the payout table"""
+    joint = probabilities
+    for _ in range(REELS - 1):
+        joint = np.multiply.outer(joint, probabilities)
+    return joint
+
+def exact_stats(bet: Optional[int] = None, symbols: Dict[str, Any] = SLOT_SYMBOLS,
+                weights: Dict[str, int] = SLOT_WEIGHTS) -> Dict[str, Any]:
+    """Exact return-to-player, hit frequency and variance from all outcomes
+    
+    Figures are per unit bet: ``rtp`` is the expected payout, ``variance``
+    the variance of the payout (and so of the profit) of one spin.
+    ``distribution`` maps each distinct payout to its probability.
+    """
+    _, probabilities, multipliers = payout_table(bet, symbols, weights)
+    joint = outcome_probabilities(probabilities).ravel()
+    payouts = multipliers.ravel()
+    
+    rtp = float(joint @ payouts)
+    variance = float(joint @ payouts ** 2) - rtp ** 2
+    distribution: Dict[float, float] = {}
+    for payout, probability in zip(payouts.tolist(), joint.tolist()):
+        distribution[payout] = distribution.get(payout, 0.0) + probability
+    return {
+        "outcomes": payouts.size,
+        "rtp": rtp,
+        "house_edge": 1 - rtp,
+        "hit_frequency": float(joint[payouts > 0].sum()),
+        "win_frequency": float(joint[payouts > 1].sum()),
+        "variance": variance,
+        "std_dev": variance ** 0.5,
+        "max_payout": float(payouts.max()),
+        "distribution": dict(sorted(distribution.items()))
+    }
+
+def simulate(spins: int = 10 ** 8, session: int = 100, seed: Optional[int] = None,
+             bet: Optional[int] = None, symbols: Dict[str, Any] = SLOT_SYMBOLS,
+             weights: Dict[str, int] = SLOT_WEIGHTS,
+             percentiles: Sequence[float] = (0.1, 1, 5, 25, 50, 75, 95, 99, 99.9)) -> Dict[str, Any]:
+    """Monte Carlo of ``spins`` spins, drawn in NumPy batches
+    
+    Each spin draws one of the outcomes with its joint probability and looks
+    its payout up in the table. The spins are also cut into sessions of
+    ``session`` spins to show the tails players actually see: percentiles of
+    the session profit (per unit bet) and the chance a session ends ahead.
+    """
+    if session <= 0 or spins < session:
+        raise ValueError(f"need a positive session length and at least one session of spins (spins={spins}, session={session})")
+    
+    _, probabilities, multipliers = payout_table(bet, symbols, weights)
+    cumulative = np.cumsum(outcome_probabilities(probabilities).ravel())
+    cumulative[-1] = 1.0
+    payouts = multipliers.ravel()
+    rng = np.random.default_rng(seed)
+    
+    spins -= spins % session
+    batch = max(session, SIMULATION_BATCH - SIMULATION_BATCH % session)
+    total = total_squares = 0.0
+    hits = 0
+    best = 0.0
+    session_profits: List[np.ndarray] = []
+    started = time.perf_counter()
+    remaining = spins
+    while remaining:
+        size = min(batch, remaining)
+        remaining -= size
+        spin_payouts = payouts[np.searchsorted(cumulative, rng.random(size), side="right")]
+        total += spin_payouts.sum()
+        total_squares += np.square(spin_payouts).sum()
+        hits += int(np.count_nonzero(spin_payouts))
+        best = max(best, float(spin_payouts.max()))
+        session_profits.append(spin_payouts.reshape(-1, session).sum(axis=1) - session)
+    
+    profits = np.concatenate(session_profits)
+    rtp = total / spins
+    variance = total_squares / spins - rtp ** 2
+    return {
+        "spins": spins,
+        "seconds": time.perf_counter() - started,
+        "rtp": rtp,
+        "rtp_std_error": (variance / spins) ** 0.5,
+        "hit_frequency": hits / spins,
+        "variance": variance,
+        "max_payout": best,
+        "session": session,
+        "sessions": profits.size,
+        "session_profit_percentiles": dict(zip(percentiles, np.percentile(profits, percentiles).tolist())),
+        "session_ahead": float(np.count_nonzero(profits > 0)) / profits.size,
+        "session_worst": float(profits.min()),
+        "session_best": float(profits.max())
+    }
+
+def report(spins: int, session: int, seed: Optional[int] = None):
+    """Print the exact figures and a Monte Carlo run for the configured slot machine"""
+    exact = exact_stats()
+    print(f"Exact ({exact['outcomes']} outcomes, per unit bet)")
+    print(f"  RTP            {exact['rtp']:.6%}  (house edge {exact['house_edge']:.4%})")
+    print(f"  Hit frequency  {exact['hit_frequency']:.4%}  (payout above the bet {exact['win_frequency']:.4%})")
+    print(f"  Variance       {exact['variance']:.4f}  (std dev {exact['std_dev']:.4f})")
+    print("  Payout distribution:")
+    for payout, probability in exact["distribution"].items():
+        print(f"    {payout:>8g}x  {probability:>10.6%}  (1 in {1 / probability:,.0f})")
+    
+    result = simulate(spins, session, seed)
+    print(f"\nMonte Carlo ({result['spins']:,} spins in {result['seconds']:.1f}s)")
+    print(f"  RTP            {result['rtp']:.6%} +/- {result['rtp_std_error']:.6%}")
+    print(f"  Hit frequency  {result['hit_frequency']:.4%}")
+    print(f"  Variance       {result['variance']:.4f}")
+    print(f"  Biggest payout {result['max_payout']:g}x")
+    print(f"  Sessions of {session} spins ({result['sessions']:,}): "
+          f"{result['session_ahead']:.2%} end ahead, worst {result['session_worst']:+g}, best {result['session_best']:+g}")
+    for percentile, profit in result["session_profit_percentiles"].items():
+        print(f"    p{percentile:<5g} {profit:+10.2f} bets")
+
+if __name__ == "__main__":
+    # python -m utils.slots [spins] [session length] [seed]
+    report(
+        int(float(sys.argv[1])) if len(sys.argv) > 1 else 10 ** 8,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 100,
+        int(sys.argv[3]) if len(sys.argv) > 3 else None
+    )
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import os
+from typing import IO, Any, Dict, Iterator, List, Optional, TextIO, Tuple
+from config import DB_SNAPSHOT_GENERATIONS
+
+def _encode_default(obj: Any) -> Any:
+    """JSON fallback for record objects that know how to turn into a dict"""
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is None:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return to_dict()
+
+def iter_json_object(f: TextIO, chunk_size: int = 1 << 20) -> Iterator[Tuple[str, Any]]:
+    """Yield the ``(key, value)`` pairs of a top-level JSON object one at a time
+    
+    The file is read ``chunk_size`` characters at a time and each value is
+    decoded on its own, so memory stays at one chunk plus one record instead
+    of the whole text and the whole parsed tree.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+    
+    def fill() -> bool:
+        """Append the next chunk to the buffer, False at end of file"""
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+    
+    def next_char() -> str:
+        """Skip whitespace and return the next character without consuming it"""
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not fill():
+                raise ValueError("unexpected end of snapshot")
+    
+    def decode() -> Any:
+        """Decode the value at the current position, reading more input as needed"""
+        nonlocal pos
+        next_char()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if fill():
+                    continue
+                raise
+            # A number cut by the chunk boundary parses as a shorter number
+            # ("1.5e10" -> "1"), so only accept it once a delimiter follows
+            truncated = end == len(buf) or (
+                isinstance(value, (int, float)) and buf[end] not in ",}] \t\r\n"
+            )
+            if truncated and fill():
+                continue
+            pos = end
+            return value
+    
+    def expect(char: str):
+        nonlocal pos
+        if next_char() != char:
+            raise ValueError(f"expected {char!r} at offset {pos} of the current chunk")
+        pos += 1
+    
+    expect("{")
+    if next_char() == "}":
+        return
+    while True:
+        key = decode()
+        if not isinstance(key, str):
+            raise ValueError("snapshot keys must be strings")
+        expect(":")
+        yield key, decode()
+        if next_char() == "}":
+            return
+        expect(",")
+
+class SnapshotWriter:
+    """Crash-safe JSON snapshot files with rotating generations
+    
+    ``write`` serializes to ``<path>.tmp``, fsyncs it and atomically renames it
+    over ``path``, so a crash never leaves a truncated snapshot behind. The
+    previous snapshots are kept as ``<path>.1`` (newest) ... ``<path>.N-1``
+    and ``load`` falls back to the newest one that parses.
+    
+    ``save`` runs the whole write in a worker thread. Records are encoded one
+    at a time from a point-in-time copy of the mapping's items, so the event
+    loop keeps running (and mutating the live data) while a large snapshot is
+    being written.
+    """
+    
+    CHUNK_RECORDS = 1000  # Records encoded per write() call
+    
+    def __init__(self, generations: int = DB_SNAPSHOT_GENERATIONS):
+        self.generations = max(1, generations)
+    
+    def generation_paths(self, path: str) -> List[str]:
+        """Snapshot paths from newest to oldest"""
+        return [path] + [f"{path}.{i}" for i in range(1, self.generations)]
+    
+    async def save(self, path: str, data: Dict[str, Any], codec=None):
+        """Write a snapshot without blocking the event loop"""
+        await asyncio.to_thread(self.write, path, data, codec)
+    
+    def write(self, path: str, data: Dict[str, Any], codec=None):
+        """Atomically replace ``path`` with a snapshot of ``data``
+        
+        ``codec`` (e.g. ``BinarySnapshot``) writes a binary file with
+        ``codec.dump(f, items)`` instead of JSON.
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb" if codec is not None else "w", encoding=None if codec is not None else "utf-8") as f:
+            if codec is not None:
+                codec.dump(f, list(data.items()))
+            else:
+                self._write_records(f, list(data.items()))
+            f.flush()
+            os.fsync(f.fileno())
+        
+        self._rotate(path)
+        os.replace(tmp_path, path)
+        self._fsync_dir(path)
+    
+    def _write_records(self, f, items):
+        """Stream a compact JSON object one record at a time"""
+        dumps = json.JSONEncoder(separators=(",", ":"), default=_encode_default).encode
+        f.write("{")
+        for start in range(0, len(items), self.CHUNK_RECORDS):
+            chunk = items[start:start + self.CHUNK_RECORDS]
+            parts = [f"{dumps(key)}:{dumps(value)}" for key, value in chunk]
+            if start:
+                f.write(",")
+            f.write(",".join(parts))
+        f.write("}")
+    
+    def _rotate(self, path: str):
+        """Shift existing generations down by one, dropping the oldest"""
+        paths = self.generation_paths(path)
+        for newer, older in zip(reversed(paths[:-1]), reversed(paths[1:])):
+            if os.path.exists(newer):
+                os.replace(newer, older)
+    
+    @staticmethod
+    def _fsync_dir(path: str):
+        """Make the rename durable (no-op where directories can't be opened)"""
+        try:
+            fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+    
+    def newest(self, path: str) -> Optional[str]:
+        """Newest existing generation of ``path``, or None"""
+        for candidate in self.generation_paths(path):
+            if os.path.exists(candidate):
+                return candidate
+        return None
+    
+    @staticmethod
+    def open_records(path: str, codec=None) -> Tuple[IO, Iterator[Tuple[str, Any]]]:
+        """Open one snapshot file for streaming, return ``(file, (key, value) iterator)``
+        
+        The caller closes the file; ``file.tell()`` on a binary file (or
+        ``file.buffer.tell()`` on JSON) tells how far the stream has read.
+        """
+        if codec is not None:
+            f = open(path, "rb")
+            return f, codec.iter_load(f)
+        f = open(path, "r", encoding="utf-8")
+        return f, iter_json_object(f)
+    
+    def load(self, path: str, codec=None) -> Optional[Dict[str, Any]]:
+        """Load the newest readable generation, or None if there is none"""
+        return self.load_generation(path, codec)[0]
+    
+    def load_generation(self, path: str, codec=None) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+        """Like ``load()``, also return which generation was read (0 is the newest)"""
+        for generation, candidate in enumerate(self.generation_paths(path)):
+            if not os.path.exists(candidate):
+                continue
+            try:
+                if codec is not None:
+                    with open(candidate, "rb") as f:
+                        data = codec.load(f)
+                else:
+                    with open(candidate, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Snapshot {candidate} is unreadable ({e}), trying an older one")
+                continue
+            if candidate != path:
+                print(f"Loaded fallback snapshot {candidate}")
+            return data, generation
+        return None, None
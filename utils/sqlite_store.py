@@ -0,0 +1,561 @@
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from config import SQLITE_PATH
+from utils.cache import GuildConfigCache
+from utils.idempotency import IdempotencyTable, MISSING, idempotency_key
+from utils.ledger import Ledger
+from utils.manager import (
+    default_player, default_guild, bet_stats, reset_fields,
+    HOT_COLUMNS, TEXT_COLUMNS, JSON_COLUMNS, PLAYER_COLUMNS, INDEXED_COLUMNS
+)
+
+SCHEMA = [
+    f"""CREATE TABLE IF NOT EXISTS players (
+        user_id INTEGER PRIMARY KEY,
+        {", ".join(f"{c} INTEGER NOT NULL DEFAULT 0" for c in HOT_COLUMNS)},
+        {", ".join(f"{c} TEXT" for c in TEXT_COLUMNS)},
+        boosts TEXT NOT NULL DEFAULT '{{}}',
+        achievements TEXT NOT NULL DEFAULT '[]',
+        extra TEXT NOT NULL DEFAULT '{{}}'
+    )""",
+    """CREATE TABLE IF NOT EXISTS guilds (
+        guild_id INTEGER PRIMARY KEY,
+        data TEXT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS guild_members (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        PRIMARY KEY (guild_id, user_id)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS idempotency (
+        key TEXT PRIMARY KEY,
+        expires REAL NOT NULL,
+        result TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency (expires)",
+] + [
+    f"CREATE INDEX IF NOT EXISTS idx_players_{c} ON players ({c} DESC)" for c in INDEXED_COLUMNS
+]
+
+class SQLiteDatabase:
+    """Embedded SQLite store implementing the ``Database`` API
+    
+    Hot numeric fields are real (indexed) columns so balance changes are
+    single-row updates and leaderboards are index scans; cooldowns are text
+    columns and ``boosts``/``achievements`` (plus any unknown keys) are JSON.
+    The connection runs in WAL mode and every call executes on one dedicated
+    worker thread, which keeps the event loop free and makes each method a
+    single serialized transaction.
+    
+    Guild configurations are cached in memory (``utils.cache.GuildConfigCache``)
+    and only reloaded after ``update_guild``/``initialize_guild`` change them.
+    
+    Committed balance changes are recorded in ``ledger`` (if set), like the
+    JSON store does. Money-moving calls are idempotent per interaction id and
+    reason: the result is written to the ``idempotency`` table in the same
+    transaction and kept in memory (``utils.idempotency``), so a repeated call
+    returns it without touching the players.
+    
+    Values are stored as SQLite INTEGERs, so balances must fit in 64 bits.
+    """
+    
+    def __init__(self, path: str = SQLITE_PATH, ledger: Optional[Ledger] = None):
+        self.path = path
+        self.ledger = ledger
+        self._idempotency = IdempotencyTable()
+        self._last_purge = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._guild_cache = GuildConfigCache()
+    
+    async def _run(self, func, *args):
+        """Run ``func(conn, *args)`` on the database thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, func, args)
+    
+    def _call(self, func, args):
+        if self._conn is None:
+            self._connect()
+        with self._conn:
+            return func(self._conn, *args)
+    
+    def _connect(self):
+        """Open the connection and create the schema (database thread)"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+    
+    async def start(self):
+        """Open the database"""
+        await self._run(lambda conn: None)
+    
+    async def close(self):
+        """Close the connection and stop the worker thread"""
+        def _close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        
+        await asyncio.get_running_loop().run_in_executor(self._executor, _close)
+        self._executor.shutdown(wait=True)
+    
+    @staticmethod
+    def _row_to_player(row: sqlite3.Row) -> Dict[str, Any]:
+        player = {column: row[column] for column in HOT_COLUMNS + TEXT_COLUMNS}
+        for column in JSON_COLUMNS:
+            player[column] = json.loads(row[column])
+        player.update(json.loads(row["extra"]))
+        return player
+    
+    @staticmethod
+    def _split_update(data: Dict[str, Any]):
+        """Split an update dict into column values and extra (JSON) keys"""
+        columns = {}
+        extra = {}
+        for key, value in data.items():
+            if key in JSON_COLUMNS:
+                columns[key] = json.dumps(value)
+            elif key in PLAYER_COLUMNS:
+                columns[key] = value
+            else:
+                extra[key] = value
+        return columns, extra
+    
+    @classmethod
+    def _insert_player(cls, conn: sqlite3.Connection, user_id: int, data: Dict[str, Any]):
+        columns, extra = cls._split_update(data)
+        names = ["user_id"] + list(columns) + ["extra"]
+        values = [user_id] + list(columns.values()) + [json.dumps(extra)]
+        conn.execute(
+            f"INSERT OR IGNORE INTO players ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+            values
+        )
+    
+    @classmethod
+    def _ensure_player(cls, conn: sqlite3.Connection, user_id: int):
+        cls._insert_player(conn, user_id, default_player())
+    
+    @classmethod
+    def _apply_update(cls, conn: sqlite3.Connection, user_id: int, data: Dict[str, Any]):
+        columns, extra = cls._split_update(data)
+        if columns:
+            assignments = ", ".join(f"{name} = ?" for name in columns)
+            conn.execute(
+                f"UPDATE players SET {assignments} WHERE user_id = ?",
+                list(columns.values()) + [user_id]
+            )
+        if extra:
+            row = conn.execute("SELECT extra FROM players WHERE user_id = ?", (user_id,)).fetchone()
+            merged = json.loads(row["extra"])
+            merged.update(extra)
+            conn.execute("UPDATE players SET extra = ? WHERE user_id = ?", (json.dumps(merged), user_id))
+    
+    async def get_player(self, user_id: int) -> Dict[str, Any]:
+        """Get player data, create if doesn't exist"""
+        def _get(conn):
+            self._ensure_player(conn, user_id)
+            row = conn.execute("SELECT * FROM players WHERE user_id = ?", (user_id,)).fetchone()
+            return self._row_to_player(row)
+        
+        return await self._run(_get)
+    
+    async def peek_player(self, user_id: int) -> Dict[str, Any]:
+        """Get player data without creating a record (unknown ids get unsaved defaults)"""
+        def _peek(conn):
+            row = conn.execute("SELECT * FROM players WHERE user_id = ?", (user_id,)).fetchone()
+            return self._row_to_player(row) if row is not None else default_player()
+        
+        return await self._run(_peek)
+    
+    async def update_player(self, user_id: int, data: Dict[str, Any]):
+        """Update player data"""
+        def _update(conn):
+            self._ensure_player(conn, user_id)
+            self._apply_update(conn, user_id, data)
+        
+        await self._run(_update)
+    
+    async def _run_once(self, key: Optional[str], func) -> tuple:
+        """Run ``func(conn)`` unless ``key`` already has a stored result, return ``(result, applied)``
+        
+        Results other than None/False are stored under ``key`` in the same
+        transaction, and in memory so repeats usually skip the database.
+        """
+        if key is None:
+            return await self._run(func), True
+        result = self._idempotency.get(key)
+        if result is not MISSING:
+            return result, False
+        
+        result, expires, applied = await self._run(self._apply_once, key, func)
+        if result is not None and result is not False:
+            self._idempotency.put(key, result, expires)
+        return result, applied
+    
+    def _apply_once(self, conn: sqlite3.Connection, key: str, func) -> tuple:
+        """``_run_once`` transaction (database thread)"""
+        now = time.time()
+        row = conn.execute("SELECT expires, result FROM idempotency WHERE key = ? AND expires > ?", (key, now)).fetchone()
+        if row is not None:
+            return json.loads(row["result"]), row["expires"], False
+        
+        if now - self._last_purge >= self._idempotency.ttl:
+            self._last_purge = now
+            conn.execute("DELETE FROM idempotency WHERE expires <= ?", (now,))
+        
+        result = func(conn)
+        expires = now + self._idempotency.ttl
+        if result is not None and result is not False:
+            conn.execute(
+                "INSERT OR REPLACE INTO idempotency (key, expires, result) VALUES (?, ?, ?)",
+                (key, expires, json.dumps(result))
+            )
+        return result, expires, True
+    
+    def idempotency_stats(self) -> Dict[str, int]:
+        """Interaction results cached in memory and how many repeated calls they answered"""
+        return self._idempotency.stats()
+    
+    async def add_balance(self, user_id: int, amount: int, reason: str = "credit",
+                          game: Optional[str] = None, interaction_id: Optional[int] = None) -> int:
+        """Add to player balance, return new balance"""
+        def _add(conn):
+            self._ensure_player(conn, user_id)
+            conn.execute("UPDATE players SET balance = balance + ? WHERE user_id = ?", (amount, user_id))
+            return conn.execute("SELECT balance FROM players WHERE user_id = ?", (user_id,)).fetchone()[0]
+        
+        balance, applied = await self._run_once(idempotency_key(interaction_id, reason), _add)
+        if applied and self.ledger is not None:
+            self.ledger.record(user_id, amount, reason, game, interaction_id)
+        return balance
+    
+    async def subtract_balance(self, user_id: int, amount: int, reason: str = "debit",
+                               game: Optional[str] = None, interaction_id: Optional[int] = None) -> bool:
+        """Subtract from player balance, return success"""
+        def _subtract(conn):
+            return self._debit(conn, user_id, amount)
+        
+        success, applied = await self._run_once(idempotency_key(interaction_id, reason), _subtract)
+        if success and applied and self.ledger is not None:
+            self.ledger.record(user_id, -amount, reason, game, interaction_id)
+        return success
+    
+    @classmethod
+    def _debit(cls, conn: sqlite3.Connection, user_id: int, amount: int) -> bool:
+        """Subtract ``amount`` if the balance covers it, return success"""
+        cursor = conn.execute(
+            "UPDATE players SET balance = balance - ? WHERE user_id = ? AND balance >= ?",
+            (amount, user_id, amount)
+        )
+        if cursor.rowcount == 0 and default_player()["balance"] >= amount:
+            # Unknown player: create it only now that the debit will succeed
+            cls._ensure_player(conn, user_id)
+            cursor = conn.execute(
+                "UPDATE players SET balance = balance - ? WHERE user_id = ? AND balance >= ?",
+                (amount, user_id, amount)
+            )
+        return cursor.rowcount == 1
+    
+    async def transfer(self, sender_id: int, recipient_id: int, amount: int, reason: str = "transfer",
+                       interaction_id: Optional[int] = None) -> Optional[int]:
+        """Move ``amount`` from one player to another in one transaction
+        
+        Returns the sender's new balance, or None if the amount is not
+        positive, both ids are the same or the sender cannot cover it.
+        """
+        if amount <= 0 or sender_id == recipient_id:
+            return None
+        
+        def _transfer(conn):
+            if not self._debit(conn, sender_id, amount):
+                return None
+            self._ensure_player(conn, recipient_id)
+            conn.execute("UPDATE players SET balance = balance + ? WHERE user_id = ?", (amount, recipient_id))
+            return conn.execute("SELECT balance FROM players WHERE user_id = ?", (sender_id,)).fetchone()[0]
+        
+        balance, applied = await self._run_once(idempotency_key(interaction_id, reason), _transfer)
+        if balance is not None and applied and self.ledger is not None:
+            self.ledger.record(sender_id, -amount, reason, interaction_id=interaction_id)
+            self.ledger.record(recipient_id, amount, reason, interaction_id=interaction_id)
+        return balance
+    
+    async def settle_bet(self, user_id: int, stake: int, payout: int,
+                         stats_delta: Optional[Dict[str, int]] = None, reason: str = "bet",
+                         game: Optional[str] = None, interaction_id: Optional[int] = None) -> Optional[int]:
+        """Debit the stake, credit the payout and count the game in one transaction
+        
+        Returns the new balance, or None if the player cannot cover the stake.
+        """
+        if stake < 0 or payout < 0:
+            return None
+        
+        def _settle(conn):
+            row = conn.execute("SELECT * FROM players WHERE user_id = ?", (user_id,)).fetchone()
+            player = self._row_to_player(row) if row is not None else default_player()
+            if player["balance"] < stake:
+                return None
+            
+            self._ensure_player(conn, user_id)
+            changes = {"balance": player["balance"] - stake + payout}
+            for field, amount in bet_stats(stake, payout, stats_delta).items():
+                changes[field] = player.get(field, 0) + amount
+            self._apply_update(conn, user_id, changes)
+            return changes["balance"]
+        
+        balance, applied = await self._run_once(idempotency_key(interaction_id, reason), _settle)
+        if balance is not None and applied and self.ledger is not None:
+            self.ledger.record(user_id, payout - stake, reason, game, interaction_id)
+        return balance
+    
+    async def reset_player(self, user_id: int, reason: str = "reset",
+                           interaction_id: Optional[int] = None) -> int:
+        """Reset a player's balances, stats, cooldowns and items in one transaction, return the new balance"""
+        changes = reset_fields()
+        deltas = []
+        
+        def _reset(conn):
+            self._ensure_player(conn, user_id)
+            balance = conn.execute("SELECT balance FROM players WHERE user_id = ?", (user_id,)).fetchone()[0]
+            self._apply_update(conn, user_id, changes)
+            deltas.append(changes["balance"] - balance)
+            return changes["balance"]
+        
+        balance, applied = await self._run_once(idempotency_key(interaction_id, reason), _reset)
+        if applied and self.ledger is not None:
+            self.ledger.record(user_id, deltas[0], reason, interaction_id=interaction_id)
+        return balance
+    
+    async def add_guild_member(self, guild_id: int, user_id: int):
+        """Remember that a player plays in a guild (skipped if the player doesn't exist)"""
+        def _add(conn):
+            conn.execute(
+                "INSERT OR IGNORE INTO guild_members (guild_id, user_id) "
+                "SELECT ?, user_id FROM players WHERE user_id = ?",
+                (guild_id, user_id)
+            )
+        
+        await self._run(_add)
+    
+    async def get_leaderboard(self, metric: str = "balance", limit: int = 10,
+                              guild_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get leaderboard data (only the members of ``guild_id`` if given)"""
+        if metric not in HOT_COLUMNS:
+            return []
+        
+        def _leaderboard(conn):
+            if guild_id is None:
+                rows = conn.execute(
+                    f"SELECT user_id, {metric} AS value, balance, games_played FROM players "
+                    f"ORDER BY {metric} DESC LIMIT ?",
+                    (limit,)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    f"SELECT p.user_id, p.{metric} AS value, p.balance, p.games_played "
+                    f"FROM guild_members m JOIN players p ON p.user_id = m.user_id "
+                    f"WHERE m.guild_id = ? ORDER BY p.{metric} DESC LIMIT ?",
+                    (guild_id, limit)
+                ).fetchall()
+            return [dict(row) for row in rows]
+        
+        return await self._run(_leaderboard)
+    
+    async def get_rank(self, user_id: int, metric: str = "balance", guild_id: Optional[int] = None,
+                       span: int = 1) -> Optional[Dict[str, Any]]:
+        """A player's leaderboard position with the ``span`` players above and below
+        
+        Same result as ``Database.get_rank``. The position is a count over
+        the metric index, so it costs O(rank) rather than O(log n).
+        """
+        if metric not in HOT_COLUMNS:
+            return None
+        
+        if guild_id is None:
+            source, scope, args = "players p", "1", ()
+        else:
+            source = "guild_members m JOIN players p ON p.user_id = m.user_id"
+            scope, args = "m.guild_id = ?", (guild_id,)
+        ahead = f"(p.{metric} > ? OR (p.{metric} = ? AND p.user_id < ?))"
+        behind = f"(p.{metric} < ? OR (p.{metric} = ? AND p.user_id > ?))"
+        
+        def _rank(conn):
+            row = conn.execute(
+                f"SELECT p.{metric} FROM {source} WHERE {scope} AND p.user_id = ?", args + (user_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            value = row[0]
+            key = args + (value, value, user_id)
+            
+            rank = conn.execute(f"SELECT COUNT(*) FROM {source} WHERE {scope} AND {ahead}", key).fetchone()[0] + 1
+            total = conn.execute(f"SELECT COUNT(*) FROM {source} WHERE {scope}", args).fetchone()[0]
+            above = conn.execute(
+                f"SELECT p.user_id, p.{metric} AS value FROM {source} WHERE {scope} AND {ahead} "
+                f"ORDER BY p.{metric} ASC, p.user_id DESC LIMIT ?",
+                key + (span,)
+            ).fetchall()
+            below = conn.execute(
+                f"SELECT p.user_id, p.{metric} AS value FROM {source} WHERE {scope} AND {behind} "
+                f"ORDER BY p.{metric} DESC, p.user_id ASC LIMIT ?",
+                key + (span,)
+            ).fetchall()
+            
+            rows = list(reversed(above)) + [{"user_id": user_id, "value": value}] + list(below)
+            first = rank - len(above)
+            nearby = [
+                {"rank": first + i, "user_id": row["user_id"], "value": row["value"]}
+                for i, row in enumerate(rows)
+            ]
+            return {"rank": rank, "total": total, "value": value, "nearby": nearby}
+        
+        return await self._run(_rank)
+    
+    async def get_guild(self, guild_id: int) -> Dict[str, Any]:
+        """Get guild configuration (cached and shared, treat as read-only)"""
+        guild = self._guild_cache.get(guild_id)
+        if guild is not None:
+            return guild
+        
+        generation = self._guild_cache.generation
+        
+        def _get(conn):
+            row = conn.execute("SELECT data FROM guilds WHERE guild_id = ?", (guild_id,)).fetchone()
+            if row is not None:
+                return json.loads(row["data"])
+            guild = default_guild()
+            conn.execute("INSERT INTO guilds (guild_id, data) VALUES (?, ?)", (guild_id, json.dumps(guild)))
+            return guild
+        
+        guild = await self._run(_get)
+        self._guild_cache.put(guild_id, guild, generation)
+        return guild
+    
+    async def is_guild_admin(self, guild_id: int, user_id: int) -> bool:
+        """Whether ``user_id`` is one of the guild's bot admins (a cached set lookup)"""
+        admins = self._guild_cache.admins(guild_id)
+        if admins is None:
+            admins = frozenset((await self.get_guild(guild_id)).get("admin_ids", []))
+        return user_id in admins
+    
+    async def initialize_guild(self, guild_id: int):
+        """Initialize guild with default settings"""
+        def _init(conn):
+            conn.execute(
+                "INSERT OR REPLACE INTO guilds (guild_id, data) VALUES (?, ?)",
+                (guild_id, json.dumps(default_guild()))
+            )
+        
+        await self._run(_init)
+        self._guild_cache.invalidate(guild_id)
+    
+    async def update_guild(self, guild_id: int, data: Dict[str, Any]):
+        """Update guild configuration"""
+        def _update(conn):
+            row = conn.execute("SELECT data FROM guilds WHERE guild_id = ?", (guild_id,)).fetchone()
+            guild = json.loads(row["data"]) if row is not None else default_guild()
+            guild.update(data)
+            conn.execute(
+                "INSERT OR REPLACE INTO guilds (guild_id, data) VALUES (?, ?)",
+                (guild_id, json.dumps(guild))
+            )
+        
+        await self._run(_update)
+        self._guild_cache.invalidate(guild_id)
+    
+    async def import_json(self, players_file: str = "data/players.json",
+                          guilds_file: str = "data/guilds.json") -> int:
+        """Import players/guilds from the JSON store, return the number of players"""
+        def _load(path):
+            if not os.path.exists(path):
+                return {}
+            with open(path, "r") as f:
+                return json.load(f)
+        
+        players = _load(players_file)
+        guilds = _load(guilds_file)
+        
+        def _import(conn):
+            for user_id, data in players.items():
+                record = default_player()
+                record.update(data)
+                player_guilds = record.pop("guilds", [])
+                conn.execute("DELETE FROM players WHERE user_id = ?", (int(user_id),))
+                self._insert_player(conn, int(user_id), record)
+                conn.executemany(
+                    "INSERT OR IGNORE INTO guild_members (guild_id, user_id) VALUES (?, ?)",
+                    [(int(guild_id), int(user_id)) for guild_id in player_guilds]
+                )
+            for guild_id, data in guilds.items():
+                conn.execute(
+                    "INSERT OR REPLACE INTO guilds (guild_id, data) VALUES (?, ?)",
+                    (int(guild_id), json.dumps(data))
+                )
+            return len(players)
+        
+        count = await self._run(_import)
+        self._guild_cache.clear()
+        return count
+
+async def self_check():
+    """Round-trip a small JSON dataset through ``import_json`` into a throwaway database"""
+    with tempfile.TemporaryDirectory() as directory:
+        players_file = os.path.join(directory, "players.json")
+        guilds_file = os.path.join(directory, "guilds.json")
+        with open(players_file, "w") as f:
+            json.dump({
+                "1": {"balance": 5000, "games_played": 3, "guilds": [7, 8], "boosts": {"x": 1}, "note": "ok"},
+                "2": {"balance": 20, "guilds": [7]},
+                "3": {"balance": 900}
+            }, f)
+        with open(guilds_file, "w") as f:
+            json.dump({"7": {**default_guild(), "currency_name": "chips"}, "9": default_guild()}, f)
+        
+        db = SQLiteDatabase(os.path.join(directory, "casino.db"))
+        await db.start()
+        try:
+            assert await db.import_json(players_file, guilds_file) == 3
+            player = await db.get_player(1)
+            assert player["balance"] == 5000 and player["games_played"] == 3, player
+            assert player["boosts"] == {"x": 1} and player["note"] == "ok", player
+            assert (await db.get_player(3))["balance"] == 900
+            assert (await db.get_guild(7))["currency_name"] == "chips"
+            assert (await db.get_guild(9))["currency_name"] == default_guild()["currency_name"]
+            board = await db.get_leaderboard("balance", guild_id=7)
+            assert [row["user_id"] for row in board] == [1, 2], board
+            assert [row["user_id"] for row in await db.get_leaderboard("balance", guild_id=8)] == [1]
+            # Importing again replaces rather than duplicates
+            assert await db.import_json(players_file, guilds_file) == 3
+            assert len(await db.get_leaderboard("balance", guild_id=7)) == 2
+            # An empty export imports nothing
+            assert await db.import_json(os.path.join(directory, "none.json"), guilds_file) == 0
+        finally:
+            await db.close()
+    print("SQLite import OK")
+
+if __name__ == "__main__":
+    # python -m utils.sqlite_store        -> import data/*.json into the SQLite database
+    # python -m utils.sqlite_store check  -> round-trip a sample import in a temporary directory
+    async def _main(command):
+        if command == "check":
+            await self_check()
+            return
+        db = SQLiteDatabase()
+        count = await db.import_json()
+        await db.close()
+        print(f"Imported {count} player(s) into {db.path}")
+    
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else "migrate"))